@@ -0,0 +1,326 @@
+"""Benchmark the HFO detectors on simulated recordings.
+
+For every combination of detector, number of channels, duration and
+sampling rate, a recording of pink noise with HFOs is simulated with
+:mod:`mne_hfo.simulate` and each stage of ``fit`` is run on its own:
+
+- ``validate``: checking the input and getting the data array,
+- ``statistic``: filtering and computing the HFO statistic,
+- ``threshold``: thresholding the statistic into detections,
+- ``post_process``: merging detections into the events of each channel,
+- ``events``: creating the table of HFO events and its Annotations,
+
+followed by a whole ``fit``. The wall time is the fastest of
+``--repeat`` runs, and the peak memory allocated by each stage is
+measured in an extra run with :mod:`tracemalloc`, which slows down
+Python code, so it is never timed.
+
+Results are written to a JSON file, along with the versions of the
+package and its dependencies, and can be compared with those of another
+commit, e.g.::
+
+    python benchmarks/bench_detectors.py --n-chs 16 64 --durations 60 \\
+        --output main.json
+    git checkout my-branch
+    python benchmarks/bench_detectors.py --n-chs 16 64 --durations 60 \\
+        --output my-branch.json --compare main.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import mne
+import numpy as np
+import scipy
+from mne import create_info
+from mne.io import RawArray
+
+import mne_hfo
+from mne_hfo import (HilbertDetector, LineLengthDetector,
+                     MultiBandDetector, RMSDetector)
+from mne_hfo.events import _concatenate_ch_events
+from mne_hfo.simulate import simulate_hfo, simulate_pink_noise
+
+DETECTORS = {
+    'rms': RMSDetector,
+    'line_length': LineLengthDetector,
+    'hilbert': HilbertDetector,
+    'multi_band': MultiBandDetector,
+}
+STAGES = ['validate', 'statistic', 'threshold', 'post_process', 'events',
+          'fit']
+
+
+def simulate_recording(n_chs, duration, sfreq, hfo_rate, random_state=0):
+    """Simulate a recording of pink noise with HFOs on all channels.
+
+    Parameters
+    ----------
+    n_chs : int
+        The number of channels.
+    duration : float
+        The duration of the recording in seconds.
+    sfreq : float
+        The sampling rate in Hz.
+    hfo_rate : float
+        The mean number of HFOs per second on each channel. The onsets
+        are drawn uniformly at random.
+    random_state : int
+        The seed of the simulation.
+
+    Returns
+    -------
+    raw : mne.io.RawArray
+        The simulated recording.
+    n_hfos : int
+        The number of HFOs added to the recording.
+    """
+    rng = np.random.RandomState(random_state)
+    n_times = int(duration * sfreq)
+    data = np.empty((n_chs, n_times))
+    n_hfos = 0
+    for idx in range(n_chs):
+        noise = simulate_pink_noise(n_times,
+                                    random_state=rng.randint(2 ** 31))
+        data[idx] = noise / noise.std()
+
+        # HFOs well below the Nyquist frequency, 3 times the noise level
+        freq_max = max(min(500, int(sfreq / 4)), 81)
+        n_ch_hfos = rng.poisson(hfo_rate * duration)
+        for _ in range(n_ch_hfos):
+            hfo, _ = simulate_hfo(fs=sfreq, freq=rng.randint(80, freq_max),
+                                  random_state=rng.randint(2 ** 31))
+            if len(hfo) >= n_times:
+                continue
+            start = rng.randint(0, n_times - len(hfo))
+            data[idx, start:start + len(hfo)] += \
+                3 * hfo / np.abs(hfo).max()
+            n_hfos += 1
+
+    info = create_info(ch_names=[f'ch{idx}' for idx in range(n_chs)],
+                       sfreq=sfreq, ch_types='seeg')
+    raw = RawArray(data, info=info, verbose=False)
+    return raw, n_hfos
+
+
+def _run_stages(detector, raw):
+    """Run each stage of ``fit``, returning a function per stage.
+
+    The stages run one after the other on the output of the previous
+    one, so each returned function can be timed on its own.
+    """
+    state = dict()
+
+    def validate():
+        state['X'], _ = detector._check_input_raw(raw, None)
+        # sets the frequency bands of the detector
+        detector._create_empty_event_arr(None)
+
+    def statistic():
+        X = state['X']
+        if detector._batched:
+            state['statistic'] = detector._compute_hfo_statistic(X)
+        else:
+            state['statistic'] = [detector._compute_hfo_statistic(sig)
+                                  for sig in X]
+
+    def threshold():
+        if detector._batched:
+            state['detections'] = detector._threshold_statistic(
+                state['statistic'])
+        else:
+            state['detections'] = [detector._threshold_statistic(statistic)
+                                   for statistic in state['statistic']]
+
+    def post_process():
+        state['ch_events'] = [
+            detector._make_ch_events(detector._post_process_ch_hfos(
+                detections)) for detections in state['detections']]
+
+    def events():
+        hfo_events = _concatenate_ch_events(
+            state['ch_events'], detector.ch_names, detector.sfreq)
+        hfo_events.to_annotations()
+        state['n_events'] = len(hfo_events)
+
+    def fit():
+        detector.fit(raw)
+
+    return state, dict(validate=validate, statistic=statistic,
+                       threshold=threshold, post_process=post_process,
+                       events=events, fit=fit)
+
+
+def benchmark_detector(detector, raw, repeat=3, memory=True):
+    """Measure the wall time and peak memory of each stage of ``fit``.
+
+    Parameters
+    ----------
+    detector : Detector
+        The detector to benchmark.
+    raw : mne.io.Raw
+        The recording to fit.
+    repeat : int
+        The number of timed runs of each stage, of which the fastest is
+        kept.
+    memory : bool
+        Whether to measure the peak memory of each stage in an extra run.
+
+    Returns
+    -------
+    stages : dict
+        The ``wall_time`` (in seconds), ``throughput`` (in samples per
+        second per channel) and ``peak_memory`` (in MB, or None if not
+        measured) of each stage.
+    n_events : int
+        The number of HFO events detected.
+    """
+    n_times = raw.n_times
+    wall_times = {stage: [] for stage in STAGES}
+    peak_memory = dict.fromkeys(STAGES)
+    for run in range(repeat + int(memory)):
+        traced = memory and run == repeat
+        state, stage_funcs = _run_stages(detector, raw)
+        for stage in STAGES:
+            if traced:
+                tracemalloc.start()
+                stage_funcs[stage]()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                peak_memory[stage] = peak / 1e6
+            else:
+                start = time.perf_counter()
+                stage_funcs[stage]()
+                wall_times[stage].append(time.perf_counter() - start)
+
+    stages = dict()
+    for stage in STAGES:
+        wall_time = min(wall_times[stage])
+        stages[stage] = dict(
+            wall_time=wall_time,
+            throughput=n_times / wall_time if wall_time > 0 else None,
+            peak_memory=peak_memory[stage])
+    return stages, state['n_events']
+
+
+def _get_metadata():
+    """Describe the code and machine the benchmarks ran on."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'mne_hfo': mne_hfo.__version__,
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'mne': mne.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def compare_results(results, baseline_results, stage='fit'):
+    """Print the change in wall time of one stage between two runs.
+
+    Parameters
+    ----------
+    results : dict
+        The benchmark results.
+    baseline_results : dict
+        The benchmark results to compare against, e.g. of the main
+        branch.
+    stage : str
+        The stage to compare.
+    """
+    def _key(result):
+        return (result['detector'], result['n_chs'], result['duration'],
+                result['sfreq'], result['hfo_rate'])
+
+    baseline = {_key(result): result for result in
+                baseline_results['results']}
+    print(f'\nWall time of "{stage}" against commit '
+          f'{baseline_results["metadata"]["commit"]}:')
+    for result in results['results']:
+        if _key(result) not in baseline:
+            continue
+        new_time = result['stages'][stage]['wall_time']
+        old_time = baseline[_key(result)]['stages'][stage]['wall_time']
+        detector, n_chs, duration, sfreq, _ = _key(result)
+        print(f'{detector:>12} {n_chs:>4} chs {duration:>7g} s '
+              f'{sfreq:>7g} Hz: {old_time:8.3f} s -> {new_time:8.3f} s '
+              f'({new_time / old_time:5.2f}x)')
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--detectors', nargs='+', default=['rms',
+                                                           'line_length'],
+                        choices=list(DETECTORS))
+    parser.add_argument('--n-chs', nargs='+', type=int, default=[1, 16])
+    parser.add_argument('--durations', nargs='+', type=float,
+                        default=[10.], help='In seconds.')
+    parser.add_argument('--sfreqs', nargs='+', type=float,
+                        default=[2000.], help='In Hz.')
+    parser.add_argument('--hfo-rates', nargs='+', type=float, default=[1.],
+                        help='Mean number of HFOs per second per channel.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--n-jobs', type=int, default=1,
+                        help='n_jobs of the detectors.')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Do not measure peak memory.')
+    parser.add_argument('--output', type=Path,
+                        default=Path('benchmark_results.json'))
+    parser.add_argument('--compare', type=Path, default=None,
+                        help='Results of another run to compare against.')
+    args = parser.parse_args(argv)
+
+    results = dict(metadata=_get_metadata(), results=[])
+    for n_chs in args.n_chs:
+        for duration in args.durations:
+            for sfreq in args.sfreqs:
+                for hfo_rate in args.hfo_rates:
+                    raw, n_hfos = simulate_recording(n_chs, duration,
+                                                     sfreq, hfo_rate)
+                    for name in args.detectors:
+                        Detector = DETECTORS[name]
+                        kwargs = dict(n_jobs=args.n_jobs)
+                        if Detector is not HilbertDetector:
+                            kwargs['sfreq'] = sfreq
+                        detector = Detector(**kwargs)
+                        with mne.utils.use_log_level('error'):
+                            stages, n_events = benchmark_detector(
+                                detector, raw, repeat=args.repeat,
+                                memory=not args.no_memory)
+                        results['results'].append(dict(
+                            detector=name, n_chs=n_chs, duration=duration,
+                            sfreq=sfreq, hfo_rate=hfo_rate,
+                            n_times=int(raw.n_times), n_hfos=n_hfos,
+                            n_events=n_events, stages=stages))
+                        print(f'{name:>12} {n_chs:>4} chs {duration:>7g} s '
+                              f'{sfreq:>7g} Hz: fit in '
+                              f'{stages["fit"]["wall_time"]:.3f} s, '
+                              f'{stages["fit"]["throughput"]:.3g} '
+                              f'samples/s/channel')
+
+    with open(args.output, 'w') as fout:
+        json.dump(results, fout, indent=4)
+    print(f'Wrote results to {args.output}')
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as fin:
+            compare_results(results, json.load(fin))
+
+
+if __name__ == '__main__':
+    main()
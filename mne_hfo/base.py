@@ -1,28 +1,41 @@
-from typing import Union
+import os
+import tempfile
+import weakref
+import zlib
+from functools import partial
+from typing import Callable, Optional, Union
 
 import mne
 import numpy as np
 import pandas as pd
+import scipy.signal
 from joblib import Parallel, delayed, cpu_count
 from mne.utils import warn
 from sklearn.base import BaseEstimator
+from sklearn.exceptions import NotFittedError
 from sklearn.utils.validation import check_is_fitted
 from tqdm import tqdm
 
-from mne import Annotations
-
 from mne_hfo.config import MINIMUM_SUGGESTED_SFREQ
-from mne_hfo.io import create_annotations_df
-from mne_hfo.score import accuracy, false_negative_rate, \
-    true_positive_rate, precision, false_discovery_rate
-from mne_hfo.sklearn import _make_ydf_sklearn
-from mne_hfo.utils import (apply_std, compute_rms,
-                           compute_line_length, compute_hilbert, apply_hilbert,
-                           merge_contiguous_freq_bands)
+from mne_hfo.events import (HFOEventTable, _append_events,
+                            _concatenate_ch_events)
+from mne_hfo.profiling import _StageRecorder
+from mne_hfo.score import compute_score_report
+from mne_hfo.sklearn import _convert_y_sklearn_to_annot_df
+from mne_hfo.utils import (apply_std, compute_sliding_window_stat,
+                           compute_hilbert, apply_hilbert,
+                           merge_contiguous_freq_bands, _remove_file,
+                           _update_baseline)
 
 ACCEPTED_THRESHOLD_METHODS = ['std', 'hilbert']
 ACCEPTED_MERGE_METHODS = ['time-windows', 'freq-bands']
 ACCEPTED_HFO_METHODS = ['line_length', 'rms', 'hilbert']
+ACCEPTED_EVENT_ARR_STORAGES = ['float64', 'float32', 'memmap', None]
+ACCEPTED_DTYPES = ['float64', 'float32']
+ACCEPTED_SCORING_FUNCS = ['accuracy', 'tpr', 'precision', 'fnr', 'fdr', 'f1']
+# parameters that do not change the HFO events detected by fit
+EVENT_INDEPENDENT_PARAMS = ['event_arr_storage', 'n_jobs', 'profile',
+                            'verbose']
 
 
 class Detector(BaseEstimator):
@@ -49,30 +62,105 @@ class Detector(BaseEstimator):
     overlap: float
         Fraction of the window overlap (0 to 1).
     scoring_func : str
-        Either ``'f1'``, or ``'r2'``.
+        The metric returned by ``score``. One of ``'accuracy'``,
+        ``'tpr'``, ``'precision'``, ``'fnr'``, ``'fdr'`` or ``'f1'``.
     verbose: bool
+    chunk_duration : float | None
+        If not None, ``fit`` on a :class:`mne.io.Raw` reads the data in
+        chunks of this many seconds, instead of loading the whole
+        recording. Only supported by detectors that set ``_batched``.
+    event_arr_storage : str | None
+        How to store the HFO statistic in ``hfo_event_arr_``. One of
+        ``'float64'`` (default), ``'float32'`` to halve its memory,
+        ``'memmap'`` to write it to a temporary file on disk, or None
+        to not keep it at all.
+    baseline_halflife : float | None
+        The half-life in seconds of the baseline of ``partial_fit``. If
+        None (default), all windows of the stream weigh the same.
+    baseline_duration : float | None
+        If not None, the threshold is computed from the baseline of this
+        many seconds around each window, instead of the whole recording,
+        so that it follows slow changes over multi-hour recordings.
+    baseline_mode : str
+        How the baseline of each window is chosen if
+        ``baseline_duration`` is not None. Either ``'segmented'``
+        (default), for consecutive epochs of ``baseline_duration``
+        seconds, or ``'rolling'``, for the ``baseline_duration`` seconds
+        centered on each window.
+    profile : bool | callable
+        If True, ``fit`` records the wall time, CPU time and item counts
+        of each of its stages in ``fit_profile_``. If a callable, it is
+        also called with the record of each stage, a dictionary, as soon
+        as the stage finished. Default is False, which costs nearly
+        nothing.
+    dtype : str
+        The floating point precision ``fit`` computes in, ``'float64'``
+        (default) or ``'float32'``. Single precision halves the memory of
+        the data and speeds up filtering, the statistic and the Hilbert
+        envelopes, while means and standard deviations are still
+        accumulated in double precision. The statistic then matches that
+        of double precision to a relative tolerance of about ``1e-5``,
+        so events can only differ where the statistic is that close to
+        the threshold.
+
+    Notes
+    -----
+    Detectors that set ``_batched = True`` implement the statistic and
+    threshold steps for a (n_chs, n_times) array, so that ``fit`` runs
+    them once per block of channels, rather than once per channel.
+    Those that also set the sliding window statistic ``_window_stat``
+    support streaming with ``partial_fit``.
     """
 
+    # whether _compute_hfo_statistic and _threshold_statistic accept
+    # a block of channels
+    _batched = False
+
+    # sliding window statistic of the detector, see
+    # mne_hfo.utils.compute_sliding_window_stat
+    _window_stat = None
+
+    # method used to band-pass filter the data, see mne.filter.filter_data
+    _filter_method = 'fir'
+
     def __init__(self, threshold: Union[int, float],
                  win_size: Union[int, None], overlap: Union[float, None],
                  scoring_func: str, n_jobs: int,
-                 verbose: bool):
+                 verbose: bool, chunk_duration: Optional[float] = None,
+                 event_arr_storage: Optional[str] = 'float64',
+                 baseline_halflife: Optional[float] = None,
+                 baseline_duration: Optional[float] = None,
+                 baseline_mode: str = 'segmented',
+                 profile: Union[bool, Callable] = False,
+                 dtype: str = 'float64'):
         self.win_size = win_size
         self.threshold = threshold
         self.overlap = overlap
         self.scoring_func = scoring_func
         self.verbose = verbose
         self.n_jobs = n_jobs
-
-    def _create_empty_event_arr(self):
+        self.chunk_duration = chunk_duration
+        self.event_arr_storage = event_arr_storage
+        self.baseline_halflife = baseline_halflife
+        self.baseline_duration = baseline_duration
+        self.baseline_mode = baseline_mode
+        self.profile = profile
+        self.dtype = dtype
+
+    def _create_empty_event_arr(self, storage='float64'):
         """Create an empty HFO event array.
 
         Assumes there is only one set of frequency cutoffs (i.e. one
         frequency band) right now.
 
+        Parameters
+        ----------
+        storage : str | None
+            How to store the array. See ``event_arr_storage``.
+
         Returns
         -------
-        hfo_event_arr : np.ndarray (n_chs, n_windows, n_bands)
+        hfo_event_arr : np.ndarray (n_chs, n_windows, n_bands) | None
             An array that consists of channels X windows X
             frequency bands.
         """
@@ -85,9 +173,28 @@ class Detector(BaseEstimator):
         else:
             self.freq_cutoffs = np.array([30, 500])
         n_bands = len(self.freq_cutoffs) - 1
-        hfo_event_arr = np.empty((self.n_chs, n_windows, n_bands))
+        hfo_event_arr = self._allocate_event_arr(
+            (self.n_chs, n_windows, n_bands), storage)
         return hfo_event_arr
 
+    def _allocate_event_arr(self, shape, storage):
+        """Allocate the HFO event array according to ``storage``."""
+        if storage not in ACCEPTED_EVENT_ARR_STORAGES:
+            raise ValueError(f'Event array storage {storage} is not '
+                             f'supported. Please use one of '
+                             f'{ACCEPTED_EVENT_ARR_STORAGES}.')
+        if storage is None:
+            return None
+        if storage == 'memmap':
+            fid, fname = tempfile.mkstemp(prefix='mne_hfo_', suffix='.dat')
+            os.close(fid)
+            hfo_event_arr = np.memmap(fname, dtype='float64', mode='w+',
+                                      shape=shape)
+            # remove the file once the array is garbage collected
+            weakref.finalize(hfo_event_arr, _remove_file, fname)
+            return hfo_event_arr
+        return np.empty(shape, dtype=storage)
+
     def _compute_hfo_statistic(self, X):
         """Compute HFO statistic.
 
@@ -188,15 +295,34 @@ class Detector(BaseEstimator):
             #                  f'accepted into HFO detectors.')
 
         # use sklearn's validation of data
+        self._check_dtype()
         if y is None:
-            X = self._validate_data(X, dtype='float64')
+            X = self._validate_data(X, dtype=self.dtype)
         else:
             X, y = self._validate_data(X, y, accept_sparse=False,
-                                       dtype='float64',
+                                       dtype=self.dtype,
                                        multi_output=True,
                                        accept_large_sparse=False)
 
         self.n_chs, self.n_times = X.shape
+        self._check_n_times()
+        return X, y
+
+    def _check_input_raw_chunked(self, X):
+        """Set the data attributes of a Raw, without loading its data."""
+        self._check_dtype()
+        self.sfreq = X.info['sfreq']
+        self.ch_names = X.ch_names
+        self.n_chs, self.n_times = len(X.ch_names), X.n_times
+        self._check_n_times()
+        return X
+
+    def _check_dtype(self):
+        if self.dtype not in ACCEPTED_DTYPES:
+            raise ValueError(f'Data type {self.dtype} is not supported. '
+                             f'Please use one of {ACCEPTED_DTYPES}.')
+
+    def _check_n_times(self):
         n_windows = self._compute_n_wins(self.win_size,
                                          self.step_size,
                                          self.n_times)
@@ -205,7 +331,8 @@ class Detector(BaseEstimator):
             raise ValueError(f'Negative dimensions are not allowed. '
                              f'This is probably due to there being '
                              f'n_features=1 (sample point) in the dataset. '
-                             f'Current data segment has shape {X.shape}. '
+                             f'Current data segment has shape '
+                             f'{(self.n_chs, self.n_times)}. '
                              f'Pass in a longer data segment.')
 
         # if the number of time points is smaller then the window size
@@ -215,8 +342,6 @@ class Detector(BaseEstimator):
                              f'points, which is less then {self.win_size} '
                              f'window size. Please pass in a longer segment.')
 
-        return X, y
-
     def fit_predict(self, X, y=None):
         """Perform fit on X and returns labels for X.
 
@@ -236,7 +361,8 @@ class Detector(BaseEstimator):
             1 for inliers, -1 for outliers.
         """
         # override for transductive outlier detectors like LocalOulierFactor
-        return self.fit(X).predict(X)
+        self.fit(X)
+        return self.hfo_events_.to_sklearn()
 
     def score(self, X, y, sample_weight=None):
         """
@@ -255,29 +381,116 @@ class Detector(BaseEstimator):
         -------
         score : float
             The score relative to true annotations we want.
+
+        Notes
+        -----
+        All the metrics of the matching are stored in the
+        ``score_report_`` attribute, see
+        :func:`mne_hfo.score.compute_score_report`.
+
+        If the detector was already fit on ``X`` with the same parameters,
+        the stored HFO events are scored without fitting again.
         """
+        if self.scoring_func not in ACCEPTED_SCORING_FUNCS:
+            raise ValueError(f'Scoring function {self.scoring_func} is '
+                             f'not implemented. Please use one of '
+                             f'{ACCEPTED_SCORING_FUNCS}.')
+
         # y_true should be an annotations DataFrame actually
-        # fit and predict
-        y_pred = self.fit_predict(X, y)
-
-        # match predictions with reference dataframe
-        # call `match_detections`. This should
-        # return y_true, y_pred, which are just lists of 0s and 1s
-        # representing overlap detection or not
-
-        # compute score
-        if self.scoring_func == "accuracy":
-            score = accuracy(y, y_pred)
-        elif self.scoring_func == "fnr":
-            score = false_negative_rate(y, y_pred)
-        elif self.scoring_func == "tpr":
-            score = true_positive_rate(y, y_pred)
-        elif self.scoring_func == "precision":
-            score = precision(y, y_pred)
-        elif self.scoring_func == "fdr":
-            score = false_discovery_rate(y, y_pred)
+        # predict, which only fits if X was not fit already
+        try:
+            check_is_fitted(self)
+        except NotFittedError:
+            y_pred = self.fit_predict(X, y)
+        else:
+            y_pred = self.predict(X)
+
+        # match predictions with reference dataframe once, and compute
+        # all the metrics from the matching
+        self.score_report_ = compute_score_report(y, y_pred)
+        score = self.score_report_[self.scoring_func]
         return score
 
+    def threshold_path(self, X, thresholds, y=None):
+        """Detect HFOs for many thresholds from one fit of the statistic.
+
+        The HFO statistic (e.g. the RMS of each window, or the Hilbert
+        envelope of each frequency band) does not depend on the
+        threshold, so it is computed once and only thresholding and
+        merging of events is repeated for each threshold.
+
+        Parameters
+        ----------
+        X : mne.io.Raw | pd.DataFrame | np.ndarray
+            Channel data to detect HFOs on.
+        thresholds : array-like of float
+            The thresholds to detect HFOs with, in place of ``threshold``.
+        y : pd.DataFrame | list of list of tuple | None
+            The true HFO events, as an annotations DataFrame or in the
+            scikit-learn compatible format. If None (default), the
+            detections are not scored.
+
+        Returns
+        -------
+        hfo_events : list of HFOEventTable
+            The HFO events detected with each threshold.
+        scores : pd.DataFrame | None
+            The counts and metrics over all channels of
+            :func:`mne_hfo.score.compute_score_report` for each threshold,
+            indexed by the threshold. None if ``y`` is None.
+
+        Notes
+        -----
+        The detector is fit on ``X`` with its own ``threshold``, and keeps
+        this fit afterwards.
+        """
+        thresholds = np.atleast_1d(thresholds)
+
+        # the statistic is needed in memory for all thresholds
+        event_arr_storage = self.event_arr_storage
+        if event_arr_storage is None:
+            self.event_arr_storage = 'float64'
+        try:
+            self.fit(X)
+            hfo_event_arr = self.hfo_event_arr_
+        finally:
+            self.event_arr_storage = event_arr_storage
+        if event_arr_storage is None:
+            self.hfo_event_arr_ = None
+
+        threshold = self.threshold
+        hfo_events = []
+        try:
+            for thresh in thresholds:
+                self.threshold = thresh
+                if self._batched:
+                    ch_hfo_events = self._detect_from_statistic(
+                        hfo_event_arr)
+                else:
+                    ch_hfo_events = [
+                        self._make_ch_events(self._post_process_ch_hfos(
+                            self._threshold_statistic(ch_statistic)))
+                        for ch_statistic in hfo_event_arr]
+                hfo_events.append(_concatenate_ch_events(
+                    ch_hfo_events, self.ch_names, self.sfreq))
+        finally:
+            self.threshold = threshold
+
+        if y is None:
+            return hfo_events, None
+
+        # match the true HFOs with the detections of each threshold
+        if not isinstance(y, pd.DataFrame):
+            y = _convert_y_sklearn_to_annot_df(y)
+        scores = []
+        for events in hfo_events:
+            report = compute_score_report(y, events.to_data_frame())
+            report.pop('channels')
+            scores.append(report)
+        scores = pd.DataFrame(scores, index=pd.Index(thresholds,
+                                                      name='threshold'))
+        return hfo_events, scores
+
     @property
     def hfo_annotations(self):
         """HFO Annotations.
@@ -288,18 +501,66 @@ class Detector(BaseEstimator):
             `mne.Annotations` object with ``onset``, ``duration``
             and specified ``ch_name`` for each HFO event detected.
         """
+        if self.hfo_annotations_ is None:
+            # created on access when streaming with partial_fit
+            self.hfo_annotations_ = self.hfo_events_.to_annotations()
+            self.chs_hfos_ = self.hfo_annotations_
         return self.hfo_annotations_
 
+    @property
+    def hfo_events(self):
+        """HFO events.
+
+        Returns
+        -------
+        hfo_events : instance of HFOEventTable
+            The table of start and stop samples, channel, label, peak
+            amplitude and frequency band of each HFO event detected.
+        """
+        return self.hfo_events_
+
+    @property
+    def fit_profile(self):
+        """Profile of the stages of the last fit.
+
+        Only available if ``profile`` was set during ``fit``.
+
+        Returns
+        -------
+        fit_profile : pd.DataFrame
+            One row per stage run on a channel or block of channels, in
+            the order they finished. The ``stage`` is one of
+            ``'validate'``, ``'statistic'``, ``'threshold'``,
+            ``'merge'`` or ``'events'``, ``channels`` are the names of
+            the channels it ran on, ``wall_time`` and ``cpu_time`` are
+            in seconds, and the ``n_samples``, ``n_windows``,
+            ``n_bands``, ``n_detections`` (before merging) and
+            ``n_events`` (after merging) counts are missing if they do
+            not apply to the stage.
+        """
+        if getattr(self, 'fit_profile_', None) is None:
+            raise RuntimeError('The stages of fit were not profiled. Set '
+                               '"profile" to True to profile them.')
+        return self.fit_profile_
+
     @property
     def hfo_event_arr(self):
         """HFO event array.
 
+        Only available if ``event_arr_storage`` was not None during
+        ``fit``.
+
         Returns
         -------
         hfo_event_arr : np.ndarray
             Array that is (n_chs, n_samples), which has a
             value of ``1`` if there is an HFO in that sample.
         """
+        if self.hfo_event_arr_ is None:
+            raise RuntimeError('The HFO event array was not stored during '
+                               'fit. Set "event_arr_storage" to one of '
+                               f'{ACCEPTED_EVENT_ARR_STORAGES[:-1]} to '
+                               'keep it.')
         return self.hfo_event_arr_
 
     @property
@@ -332,19 +593,7 @@ class Detector(BaseEstimator):
             return self.hfo_annotations.to_data_frame()
         elif format == 'bids':
             # format as an annots.tsv DataFrame
-            annots = self.hfo_annotations
-            onset = annots.onset
-            duration = annots.duration
-            label = annots.description
-
-            # each annotation only has one channel associated with it
-            ch_names = [ch[0] for ch in annots.ch_names]
-
-            # create an annotations.tsv dataframe
-            df = create_annotations_df(
-                onset, duration, ch_names,
-                annotation_label=label, sfreq=self.sfreq)
-            return df
+            return self.hfo_events_.to_data_frame()
 
     def fit(self, X, y=None):
         """Fit the model according to the optionally given training data.
@@ -368,8 +617,36 @@ class Detector(BaseEstimator):
         Notes
         -----
         All detectors use a sliding window to compute HFOs in windows.
+
+        If ``chunk_duration`` is set and ``X`` is a Raw, the statistic is
+        computed chunk by chunk (see ``chunk_duration``), so peak memory
+        is bounded by the chunk size plus the statistic of each window.
+        The threshold is applied once over the statistic of the whole
+        recording, so events crossing a chunk border are not split.
         """
-        X, y = self._check_input_raw(X, y)
+        return self._fit(X, y)
+
+    def _fit(self, X, y=None, X_valid=None):
+        """Fit the model, see ``fit``.
+
+        ``X_valid`` is the data array of X, if it was already validated by
+        ``_check_input_raw``.
+        """
+        # a fit starts over from any stream of partial_fit
+        self._stream_state = None
+
+        recorder = self._make_recorder()
+        chunked = self._is_chunked(X)
+        with recorder.stage('validate') as record:
+            if chunked:
+                X = self._check_input_raw_chunked(X)
+            elif X_valid is not None:
+                X = X_valid
+            else:
+                X, y = self._check_input_raw(X, y)
+            if record is not None:
+                record.update(channels=list(self.ch_names),
+                              n_samples=self.n_chs * self.n_times)
 
         sfreq = self.sfreq
         if sfreq < MINIMUM_SUGGESTED_SFREQ:
@@ -377,77 +654,507 @@ class Detector(BaseEstimator):
                  f'below the suggested rate of {MINIMUM_SUGGESTED_SFREQ}. '
                  f'Please use with caution.')
 
-        # store HFO events as list of mne.annotations
+        # store HFO events of each channel as dictionaries of arrays
         hfo_description = 'hfo'
-        hfo_annotations = []
-
-        self.hfo_event_arr_ = self._create_empty_event_arr()
-        if self.n_jobs == 1:
+        ch_hfo_events = []
+
+        # the statistic is only kept according to event_arr_storage, but
+        # fitting in chunks needs all of it to compute the threshold
+        storage = self.event_arr_storage
+        if chunked and storage is None:
+            storage = 'float64'
+        hfo_event_arr = self._create_empty_event_arr(storage)
+        if self.n_jobs == -1:
+            n_jobs = cpu_count()
+        else:
+            n_jobs = self.n_jobs
+
+        if chunked:
+            if not self._batched:
+                raise ValueError(f'{self.__class__.__name__} does not '
+                                 f'support fitting in chunks. Set '
+                                 f'chunk_duration to None.')
+            self._compute_chunked_statistic(X, hfo_event_arr, recorder)
+            ch_hfo_events = self._detect_from_statistic(
+                hfo_event_arr, list(self.ch_names), recorder)
+            if self.event_arr_storage is None:
+                hfo_event_arr = None
+        elif self._batched:
+            # split channels into one block per job, so that each block
+            # is filtered, windowed and thresholded as one 2D array
+            ch_blocks = np.array_split(np.arange(self.n_chs),
+                                       min(n_jobs, self.n_chs))
+            if n_jobs == 1:
+                block_results = [self._fit_block(
+                    X[ch_block, :], self._block_ch_names(ch_block))
+                    for ch_block in ch_blocks]
+            else:
+                block_results = Parallel(n_jobs=n_jobs)(
+                    delayed(self._fit_block)(
+                        X[ch_block, :], self._block_ch_names(ch_block))
+                    for ch_block in tqdm(ch_blocks)
+                )
+            for ch_block, (ch_hfos, statistics, records) in zip(
+                    ch_blocks, block_results):
+                ch_hfo_events.extend(ch_hfos)
+                recorder.extend(records)
+                if hfo_event_arr is not None:
+                    hfo_event_arr[ch_block, ...] = statistics
+        elif n_jobs == 1:
             for idx in tqdm(range(self.n_chs)):
                 sig = X[idx, :]
-                ch_name = self.ch_names[idx]
 
                 # compute HFOs for this channel
-                ch_hfo_events, statistic = self._fit_channel(
-                    sig, sfreq, ch_name, hfo_description=hfo_description)
+                ch_hfos, statistic, records = self._fit_channel(
+                    sig, self.ch_names[idx])
 
-                # create list of annotations
-                hfo_annotations.append(ch_hfo_events)
-                self.hfo_event_arr[idx, :, :] = statistic
+                # create list of HFO events
+                ch_hfo_events.append(ch_hfos)
+                recorder.extend(records)
+                if hfo_event_arr is not None:
+                    hfo_event_arr[idx, :, :] = statistic
 
         else:
-            if self.n_jobs == -1:
-                n_jobs = cpu_count()
-            else:
-                n_jobs = self.n_jobs
-
             # run joblib parallelization over channels
-            ch_hfos, statistics = zip(*Parallel(n_jobs=n_jobs)(
-                delayed(self._fit_channel)(
-                    X[idx, :], sfreq, self.ch_names[idx], hfo_description
-                ) for idx in tqdm(range(self.n_chs))
+            ch_hfos, statistics, records = zip(*Parallel(n_jobs=n_jobs)(
+                delayed(self._fit_channel)(X[idx, :], self.ch_names[idx])
+                for idx in tqdm(range(self.n_chs))
             ))
             for idx in range(len(ch_hfos)):
-                # chs_hfos[self.ch_names[idx]] = ch_hfos[idx]
-                hfo_annotations.append(ch_hfos[idx])
-                self.hfo_event_arr[idx, :, :] = statistics[idx]
-
-        # merge HFO annotation list into one Annotations data structure
-        all_hfo_annots = hfo_annotations[0]
-        for idx in range(1, len(hfo_annotations)):
-            all_hfo_annots += hfo_annotations[idx]
-
-        # assign annotations object
+                ch_hfo_events.append(ch_hfos[idx])
+                recorder.extend(records[idx])
+                if hfo_event_arr is not None:
+                    hfo_event_arr[idx, :, :] = statistics[idx]
+        self.hfo_event_arr_ = hfo_event_arr
+
+        with recorder.stage('events', list(self.ch_names)) as record:
+            # create one table of HFO events from all channels
+            self.hfo_events_ = _concatenate_ch_events(
+                ch_hfo_events, self.ch_names, sfreq,
+                labels=hfo_description)
+
+            # assign annotations object
+            all_hfo_annots = self.hfo_events_.to_annotations()
+            if record is not None:
+                record['n_events'] = len(self.hfo_events_)
         self.hfo_annotations_ = all_hfo_annots
         self.chs_hfos_ = all_hfo_annots
+        self.fit_profile_ = recorder.to_data_frame() if recorder.enabled \
+            else None
+
+        # the data and parameters the HFO events were detected with
+        self._store_fit_data(None if chunked else X)
+        return self
+
+    def partial_fit(self, X, y=None):
+        """Detect HFOs in the next block of samples of a data stream.
+
+        Successive calls consume successive blocks of samples of the same
+        channels. The band-pass filter state, the samples of incomplete
+        windows, the baseline of the statistic and the HFO events still
+        going on at the end of the block are carried over to the next
+        call.
+
+        Parameters
+        ----------
+        X : mne.io.Raw | np.ndarray of shape (n_chs, n_times)
+            The next block of samples of all channels. If an array,
+            ``sfreq`` needs to be set.
+        y : None
+            Not used, present for API consistency by convention.
+
+        Returns
+        -------
+        self : Detector
+            The detector. ``new_hfo_events_`` holds the HFO events that
+            ended in this block, and ``hfo_events_`` all HFO events of
+            the stream so far, in the order they ended.
+
+        Notes
+        -----
+        Unlike ``fit``, the data is band-pass filtered with a causal 4th
+        order Butterworth filter, so events are delayed by the group
+        delay of the filter, a few milliseconds for HFO bands.
+
+        The threshold is ``threshold`` standard deviations above the mean
+        statistic of all windows so far, including the windows of this
+        block. With ``baseline_halflife``, the weight of each window
+        halves for every ``baseline_halflife`` seconds that follow it.
+
+        An HFO event is emitted by the call that completes the first
+        window after the event, so the latency is at most the block
+        duration plus one window.
+        """
+        if not self._batched or self._window_stat is None:
+            raise RuntimeError(f'{self.__class__.__name__} does not '
+                               f'support streaming with partial_fit.')
+        state = getattr(self, '_stream_state', None)
+        X = self._check_input_stream(X, first_block=state is None)
+        if state is None:
+            state = self._start_stream()
+            self._stream_state = state
+
+        # filter the block, continuing from the end of the last block
+        if state['sos'] is not None:
+            X, state['zi'] = scipy.signal.sosfilt(state['sos'], X, axis=-1,
+                                                  zi=state['zi'])
+        buffer = np.concatenate((state['buffer'], X), axis=-1)
+
+        # only compute the windows of which all samples have arrived
+        win_size, step_size = self.win_size, self.step_size
+        n_windows = max((buffer.shape[-1] - win_size) // step_size + 1, 0)
+        first_win = state['buffer_start'] // step_size
+        starts, stops, ch_inds = (np.empty(0, dtype=int),) * 3
+        if n_windows:
+            statistic = compute_sliding_window_stat(
+                buffer[:, :(n_windows - 1) * step_size + win_size],
+                win_size=win_size, step_size=step_size,
+                method=self._window_stat)
+            starts, stops, ch_inds = self._detect_stream_events(statistic,
+                                                                first_win)
+        state['buffer'] = buffer[:, n_windows * step_size:]
+        state['buffer_start'] += n_windows * step_size
+        self.n_samples_seen_ += X.shape[-1]
+
+        order = np.lexsort((ch_inds, stops - starts, starts))
+        self.new_hfo_events_ = HFOEventTable(
+            starts[order], stops[order], ch_inds[order], self.ch_names,
+            self.sfreq)
+        if len(self.new_hfo_events_):
+            self.hfo_events_ = _append_events(self.hfo_events_,
+                                              self.new_hfo_events_)
+            # the Annotations are only created when they are accessed
+            self.hfo_annotations_ = None
+            self.chs_hfos_ = None
         return self
 
-    def _fit_channel(self, sig, sfreq, ch_name, hfo_description='hfo'):
-        """Compute a list of HFO events for channel."""
+    def _check_input_stream(self, X, first_block):
+        """Check a block of a stream and set the data attributes."""
+        if isinstance(X, mne.io.BaseRaw):
+            sfreq, ch_names = X.info['sfreq'], X.ch_names
+            X = X.get_data()
+        else:
+            X = np.atleast_2d(np.asarray(X, dtype='float64'))
+            sfreq, ch_names = self.sfreq, None
+            if sfreq is None:
+                raise ValueError('Set "sfreq" to stream data arrays '
+                                 'with partial_fit.')
+        if X.ndim != 2:
+            raise ValueError(f'Blocks of a stream need to be of shape '
+                             f'(n_chs, n_times), not {X.shape}.')
+
+        if first_block:
+            if ch_names is None:
+                ch_names = np.arange(len(X)).astype(str)
+            self.sfreq = sfreq
+            self.ch_names = ch_names
+            self.n_chs = len(X)
+            self.n_samples_seen_ = 0
+        elif len(X) != self.n_chs or sfreq != self.sfreq:
+            raise ValueError(f'All blocks of a stream need to have the '
+                             f'same channels and sampling rate. Expected '
+                             f'{self.n_chs} channels at {self.sfreq} Hz, '
+                             f'got {len(X)} channels at {sfreq} Hz.')
+        return X
+
+    def _start_stream(self):
+        """Create the state carried over between blocks of a stream."""
+        filter_band = getattr(self, 'filter_band', None)
+        sos = None
+        zi = None
+        if filter_band is not None:
+            sos = scipy.signal.butter(4, filter_band, btype='bandpass',
+                                      fs=self.sfreq, output='sos')
+            zi = np.zeros((len(sos), self.n_chs, 2))
+
+        # the stream has no fit on the whole data to reuse
+        self.hfo_event_arr_ = None
+        self._store_fit_data(None)
+        self.hfo_events_ = HFOEventTable([], [], [], self.ch_names,
+                                         self.sfreq)
+        self.hfo_annotations_ = None
+        self.chs_hfos_ = None
+        return dict(
+            sos=sos, zi=zi,
+            # filtered samples from the start of the next window
+            buffer=np.empty((self.n_chs, 0)), buffer_start=0,
+            # running moments of the statistic of each channel
+            weight=np.zeros(self.n_chs), mean=np.zeros(self.n_chs),
+            m2=np.zeros(self.n_chs),
+            # first window of the event going on in each channel, if any
+            open_wins=np.full(self.n_chs, -1))
+
+    def _detect_stream_events(self, statistic, first_win):
+        """Update the baseline and threshold a block of stream windows."""
+        state = self._stream_state
+        decay = 1.
+        if self.baseline_halflife is not None:
+            decay = 0.5 ** (self.step_size / self.sfreq /
+                            self.baseline_halflife)
+        state['weight'], state['mean'], state['m2'] = _update_baseline(
+            state['weight'], state['mean'], state['m2'], statistic, decay)
+        self.baseline_mean_ = state['mean']
+        self.baseline_std_ = np.sqrt(state['m2'] / state['weight'])
+        det_th = self.baseline_mean_ + self.threshold * self.baseline_std_
+
+        # events going on at the start of the block continue from the
+        # previous block, so runs of windows are found with the state of
+        # the previous window before the block, and a closing window
+        # after it
+        open_wins = state['open_wins']
+        closed = np.zeros((self.n_chs, 1), dtype=bool)
+        above_th = np.concatenate(
+            (closed, open_wins[:, np.newaxis] >= 0,
+             statistic >= det_th[:, np.newaxis], closed), axis=-1)
+        edges = np.diff(above_th.view(np.int8), axis=-1)
+        ch_inds, run_starts = np.nonzero(edges == 1)
+        run_stops = np.nonzero(edges == -1)[1]
+
+        # window indices in the stream, where a run at the start of the
+        # block starts at the first window of the open event
+        run_starts = run_starts + first_win - 1
+        run_stops = run_stops + first_win - 1
+        continued = run_starts == first_win - 1
+        run_starts[continued] = open_wins[ch_inds[continued]]
+
+        # events going on at the end of the block are kept until they end
+        still_open = above_th[ch_inds, -2] & \
+            (run_stops == first_win + statistic.shape[-1])
+        open_wins[:] = -1
+        open_wins[ch_inds[still_open]] = run_starts[still_open]
+        done = ~still_open
+        starts = run_starts[done] * self.step_size
+        stops = run_stops[done] * self.step_size + self.win_size
+        return starts, stops, ch_inds[done]
+
+    def _is_chunked(self, X):
+        """Whether ``fit`` reads X in chunks of time."""
+        return self.chunk_duration is not None and \
+            isinstance(X, mne.io.BaseRaw)
+
+    def _data_key(self, X):
+        """Describe validated data and the parameters, but not the data.
+
+        The key covers the shape, data type, sampling rate and channel
+        names of the data array ``X``, and the parameters of the detector
+        that change the HFO events, which are cheap to compare.
+        """
+        params = sorted((name, value) for name, value in
+                        self.get_params().items()
+                        if name not in EVENT_INDEPENDENT_PARAMS)
+        return (X.shape, X.dtype.str, float(self.sfreq),
+                list(self.ch_names), params)
+
+    def _store_fit_data(self, X):
+        """Keep what is needed to tell whether later data is the fit data.
+
+        Only the key and a checksum of the data array ``X`` are kept, not
+        the data itself, so a fitted detector holds no copy of the
+        recording.
+        """
+        self._fit_key = None
+        self._fit_checksum = None
+        if X is None:
+            return
+        self._fit_key = self._data_key(X)
+        self._fit_checksum = _compute_checksum(X)
+
+    def _is_fitted_on(self, X):
+        """Whether the stored HFO events were detected on validated X.
+
+        The keys of the data are compared first, and the data only when
+        they match. Fits in chunks of time are never matched, since
+        checking them would mean reading the whole recording.
+        """
+        fit_key = getattr(self, '_fit_key', None)
+        if fit_key is None or self._data_key(X) != fit_key:
+            return False
+        return _compute_checksum(X) == self._fit_checksum
+
+    def _fit_channel(self, sig, ch_name=None):
+        """Compute the HFO events for channel."""
+        recorder = self._make_recorder(callback=False)
+
         # compute the metric over the signal used to compute the HFO
         # e.g. RMS, or Line Length over time
-        hfo_statistic_arr = self._compute_hfo_statistic(sig)
+        with recorder.stage('statistic', [ch_name]) as record:
+            hfo_statistic_arr = self._compute_hfo_statistic(sig)
+            if record is not None:
+                record.update(n_samples=np.size(sig),
+                              **self._statistic_counts(hfo_statistic_arr))
 
         # apply the threshold(s) to the statistic to get detections
         # of start and stop samples
-        hfo_detection_arr = self._threshold_statistic(hfo_statistic_arr)
+        with recorder.stage('threshold', [ch_name]) as record:
+            hfo_detection_arr = self._threshold_statistic(hfo_statistic_arr)
+            if record is not None:
+                record['n_detections'] = _count_detections(
+                    hfo_detection_arr)
 
         # (optionally) post process HFOs
-        ch_hfo_list = self._post_process_ch_hfos(hfo_detection_arr)
-
-        # extract onset, and durations of each HFO detected to form Annotations
-        onset, duration = [], []
-        for (start_sample, stop_sample) in ch_hfo_list:
-            onset.append(start_sample / sfreq)
-            duration.append((stop_sample - start_sample) / sfreq)
-
-        # create Annotations object
-        description = [hfo_description] * len(onset)
-        ch_names = [[ch_name] for _ in range(len(onset))]
-        ch_hfo_events = Annotations(onset=onset, duration=duration,
-                                    description=description,
-                                    ch_names=ch_names)
-        return ch_hfo_events, hfo_statistic_arr
+        with recorder.stage('merge', [ch_name]) as record:
+            ch_hfo_list = self._post_process_ch_hfos(hfo_detection_arr)
+            ch_hfo_events = self._make_ch_events(ch_hfo_list)
+            if record is not None:
+                record.update(
+                    n_detections=_count_detections(hfo_detection_arr),
+                    n_events=len(ch_hfo_events['starts']))
+
+        # do not send the statistic back if it is not stored
+        if self.event_arr_storage is None:
+            hfo_statistic_arr = None
+        return ch_hfo_events, hfo_statistic_arr, recorder.records
+
+    def _fit_block(self, X, ch_names=None):
+        """Compute the HFO events of each channel in a block.
+
+        Only used by detectors that set ``_batched``, whose statistic and
+        threshold steps operate on a (n_chs, n_times) array at once.
+        """
+        recorder = self._make_recorder(callback=False)
+
+        # compute the metric over all channels of the block at once
+        with recorder.stage('statistic', ch_names) as record:
+            hfo_statistic_arr = self._compute_hfo_statistic(X)
+            if record is not None:
+                record.update(n_samples=np.size(X),
+                              **self._statistic_counts(hfo_statistic_arr))
+
+        ch_hfo_events = self._detect_from_statistic(
+            hfo_statistic_arr, ch_names, recorder)
+
+        # do not send the statistic back if it is not stored
+        if self.event_arr_storage is None:
+            hfo_statistic_arr = None
+        return ch_hfo_events, hfo_statistic_arr, recorder.records
+
+    def _detect_from_statistic(self, hfo_statistic_arr, ch_names=None,
+                               recorder=None):
+        """Threshold a block of channel statistics into HFO events."""
+        if recorder is None:
+            recorder = _StageRecorder(enabled=False)
+        if ch_names is None:
+            ch_names = [None] * len(hfo_statistic_arr)
+
+        # apply the threshold(s) to get detections per channel
+        with recorder.stage('threshold', ch_names) as record:
+            chs_detections = self._threshold_statistic(hfo_statistic_arr)
+            if record is not None:
+                record['n_detections'] = sum(
+                    _count_detections(detections)
+                    for detections in chs_detections)
+
+        ch_hfo_events = []
+        for ch_name, detections in zip(ch_names, chs_detections):
+            with recorder.stage('merge', [ch_name]) as record:
+                ch_hfo_list = self._post_process_ch_hfos(detections)
+                ch_hfo_events.append(self._make_ch_events(ch_hfo_list))
+                if record is not None:
+                    record.update(
+                        n_detections=_count_detections(detections),
+                        n_events=len(ch_hfo_events[-1]['starts']))
+        return ch_hfo_events
+
+    def _make_recorder(self, callback=True):
+        """Create the recorder of the stages of fit.
+
+        Parameters
+        ----------
+        callback : bool
+            Whether the recorder calls ``profile`` if it is callable.
+            Worker processes do not, their records are passed on to the
+            recorder of ``fit`` instead.
+        """
+        callback = self.profile if callback and callable(self.profile) \
+            else None
+        return _StageRecorder(enabled=bool(self.profile),
+                              callback=callback)
+
+    def _block_ch_names(self, ch_block):
+        """Names of the channels of a block of channel indices."""
+        if not self.profile:
+            return None
+        return [self.ch_names[idx] for idx in ch_block]
+
+    def _statistic_counts(self, hfo_statistic_arr):
+        """Count the windows and bands of the statistic of a fit stage."""
+        # the statistic is (n_chs x) n_windows x n_bands
+        n_windows, n_bands = np.shape(hfo_statistic_arr)[-2:]
+        return dict(n_windows=n_windows, n_bands=n_bands)
+
+    def _compute_chunked_statistic(self, raw, hfo_event_arr, recorder=None):
+        """Compute the window statistic of a Raw one chunk at a time.
+
+        Each chunk covers a whole number of windows and is read with a
+        halo of extra samples on both sides, so the band-pass filter
+        output (and hence the statistic) inside the chunk matches
+        filtering the whole recording. The halo is rounded up to a
+        multiple of the step size, so the windows of the padded chunk
+        line up with the windows of the recording.
+        """
+        step_size = self.step_size
+        n_windows = self._compute_n_wins(self.win_size, step_size,
+                                         self.n_times)
+        chunk_wins = max(int(self.chunk_duration * self.sfreq) // step_size,
+                         1)
+        halo = int(np.ceil(self._filter_halo() / step_size)) * step_size
+
+        if recorder is None:
+            recorder = _StageRecorder(enabled=False)
+
+        for win_start in tqdm(range(0, n_windows, chunk_wins)):
+            win_stop = min(win_start + chunk_wins, n_windows)
+            start = win_start * step_size
+            stop = min((win_stop - 1) * step_size + self.win_size,
+                       self.n_times)
+            pad_start = max(start - halo, 0)
+            pad_stop = min(stop + halo, self.n_times)
+
+            with recorder.stage('statistic', list(self.ch_names)) as record:
+                data = raw.get_data(start=pad_start, stop=pad_stop).astype(
+                    self.dtype, copy=False)
+                statistic = self._compute_hfo_statistic(data)
+
+                # drop the windows that only cover the halo
+                first_win = (start - pad_start) // step_size
+                hfo_event_arr[:, win_start:win_stop] = \
+                    statistic[:, first_win:first_win + win_stop - win_start]
+                if record is not None:
+                    record.update(n_samples=np.size(data),
+                                  n_windows=win_stop - win_start,
+                                  n_bands=statistic.shape[-1])
+
+    def _filter_halo(self):
+        """Number of samples the band-pass filter needs around a chunk."""
+        filter_band = getattr(self, 'filter_band', None)
+        if filter_band is None:
+            return 0
+        filt = mne.filter.create_filter(
+            None, self.sfreq, l_freq=filter_band[0], h_freq=filter_band[1],
+            method=self._filter_method, verbose=False)
+        if self._filter_method == 'iir':
+            return filt['padlen']
+        return len(filt)
+
+    def _make_ch_events(self, ch_hfo_list):
+        """Collect one channel's HFO events into a dictionary of arrays.
+
+        The events are either a dictionary of arrays already, a tuple
+        of (starts, stops) arrays, or a list of (start, stop) pairs.
+        """
+        if isinstance(ch_hfo_list, dict):
+            ch_events = dict(ch_hfo_list)
+        elif isinstance(ch_hfo_list, tuple):
+            ch_events = dict(starts=ch_hfo_list[0], stops=ch_hfo_list[1])
+        else:
+            events = np.reshape(ch_hfo_list, (-1, 2))
+            ch_events = dict(starts=events[:, 0], stops=events[:, 1])
+
+        n_events = len(ch_events['starts'])
+        ch_events.setdefault('peak_amplitudes', np.full(n_events, np.nan))
+        ch_events.setdefault('freq_bands', np.full((n_events, 2), np.nan))
+        ch_events['freq_bands'] = np.reshape(ch_events['freq_bands'], (-1, 2))
+        return ch_events
 
     def _apply_threshold(self, metric, threshold_method):
         """Apply the threshold(s) to the calculated metric for a single channel.
@@ -470,8 +1177,14 @@ class Detector(BaseEstimator):
                              f'Please use one of {ACCEPTED_THRESHOLD_METHODS} '
                              f'methods.')
         if threshold_method == 'std':
-            threshold_func = apply_std
+            # keep the events as arrays of start and stop samples
+            threshold_func = partial(apply_std, as_tuples=False)
             threshold_dict = dict(thresh=self.threshold)
+            if self.baseline_duration is not None:
+                # the baseline is counted in windows
+                threshold_dict.update(
+                    baseline_win=self.baseline_duration * self.sfreq /
+                    self.step_size, baseline_mode=self.baseline_mode)
             kwargs = dict(step_size=self.step_size,
                           win_size=self.win_size,
                           n_times=self.n_times)
@@ -480,6 +1193,10 @@ class Detector(BaseEstimator):
             threshold_dict = dict(zscore=self.threshold,
                                   cycles=self.cycle_threshold,
                                   gap=self.gap_threshold)
+            if self.baseline_duration is not None:
+                threshold_dict.update(
+                    baseline_win=self.baseline_duration * self.sfreq,
+                    baseline_mode=self.baseline_mode)
             kwargs = dict(n_times=self.n_times,
                           sfreq=self.sfreq,
                           filter_band=self.filter_band,
@@ -497,7 +1214,9 @@ class Detector(BaseEstimator):
     def predict(self, X):
         """Scikit-learn override predict function.
 
-        Just directly computes HFOs using ``fit`` function.
+        Computes HFOs using the ``fit`` function, unless the detector was
+        already fit on the same data with the same parameters, in which
+        case the stored HFO events are returned.
 
         Parameters
         ----------
@@ -512,9 +1231,15 @@ class Detector(BaseEstimator):
             and offset of the HFO event.
         """
         check_is_fitted(self)
-        self.fit(X, None)
-        ypred = _make_ydf_sklearn(
-            self.to_data_frame(format='bids'), ch_names=self.ch_names)
+        if self._is_chunked(X):
+            self._fit(X, None)
+        else:
+            # validate X once, to compare it with the fit data and to
+            # fit it if it differs
+            X_valid, _ = self._check_input_raw(X, None)
+            if not self._is_fitted_on(X_valid):
+                self._fit(X, None, X_valid=X_valid)
+        ypred = self.hfo_events_.to_sklearn()
         return ypred
 
     def _compute_sliding_window_detection(self, sig, method):
@@ -542,37 +1267,9 @@ class Detector(BaseEstimator):
                              f'{method} is not implemented. Please '
                              f'use one of {ACCEPTED_HFO_METHODS}.')
 
-        if method == 'rms':
-            hfo_detect_func = compute_rms
-        elif method == 'line_length':
-            hfo_detect_func = compute_line_length
-
-        # Overlapping window
-        win_start = 0
-        win_stop = self.win_size
-        n_windows = self._compute_n_wins(self.win_size,
-                                         self.step_size,
-                                         self.n_times)
-
-        # store the statistic of each window
-        signal_win_stat = np.empty(n_windows)
-        win_idx = 0
-        while win_start < self.n_times:
-            if win_stop > self.n_times:
-                win_stop = self.n_times
-
-            # compute the statistic based on 'method' on filtered signal
-            # in this window
-            stat = hfo_detect_func(
-                sig[int(win_start):int(win_stop)], win_size=self.win_size)[0]
-            signal_win_stat[win_idx] = stat
-
-            if win_stop == self.n_times:
-                break
-
-            win_start += self.step_size
-            win_stop += self.step_size
-            win_idx += 1
+        signal_win_stat = compute_sliding_window_stat(
+            sig, win_size=self.win_size, step_size=self.step_size,
+            method=method)
         return signal_win_stat
 
     def _compute_frq_band_detection(self, sig, method):
@@ -583,7 +1280,8 @@ class Detector(BaseEstimator):
         if method == 'hilbert':
             hfo_detect_func = compute_hilbert
         signal_stat = hfo_detect_func(sig, self.freq_cutoffs,
-                                      self.freq_span, self.sfreq)
+                                      self.freq_span, self.sfreq,
+                                      band_shape=self.band_shape)
         return signal_stat
 
     def _merge_contiguous_ch_detections(self, detections, method):
@@ -599,8 +1297,10 @@ class Detector(BaseEstimator):
 
         Returns
         -------
-        events: List(tuples)
-            List of start and stop times of the distinct HFO events.
+        events: List(tuples) | dict
+            List of start and stop times of the distinct HFO events. For
+            ``'freq-bands'``, a dictionary with the ``starts``, ``stops``,
+            ``peak_amplitudes`` and ``freq_bands`` of the events.
 
         """
         if method not in ACCEPTED_MERGE_METHODS:
@@ -615,8 +1315,37 @@ class Detector(BaseEstimator):
 
         events = merge_func(detections)
         if method == "freq-bands":
+            # keep the peak amplitude and frequency band of each event
             events, max_amplitude, freq_bands = events
-            self.hfo_max_amplitudes_ = max_amplitude
-            self.hfo_freq_bands_ = freq_bands
+            events = np.reshape(events, (-1, 2))
+            events = dict(starts=events[:, 0], stops=events[:, 1],
+                          peak_amplitudes=max_amplitude,
+                          freq_bands=freq_bands)
 
         return events
+
+
+def _count_detections(detections):
+    """Count the detections of one channel before merging.
+
+    These are either a tuple of the start and stop arrays of the
+    detections, or a list of detections per frequency band, as lists
+    of detections or tuples of start and stop arrays.
+    """
+    if isinstance(detections, tuple) and len(detections) == 2 and \
+            isinstance(detections[0], np.ndarray):
+        return len(detections[0])
+    return sum(_count_detections(band_detections)
+               if isinstance(band_detections, tuple)
+               else len(band_detections) for band_detections in detections)
+
+
+def _compute_checksum(X):
+    """Compute a checksum of the buffer of a data array.
+
+    The CRC-32 and Adler-32 checksums of zlib together give 64 bits in a
+    few percent of the time of fitting, which a cryptographic hash like
+    BLAKE2 would not.
+    """
+    buffer = np.ascontiguousarray(X).data
+    return zlib.crc32(buffer), zlib.adler32(buffer)
@@ -0,0 +1,305 @@
+"""Detect HFOs in all iEEG runs of a BIDS dataset from the command line.
+
+Installing MNE-HFO adds the ``mne-hfo`` command, e.g.::
+
+    mne-hfo /data/bids_root --detector rms --param threshold=3 \\
+        --param "filter_band=(80, 250)" --n-jobs 16
+
+runs an :class:`mne_hfo.RMSDetector` on every iEEG run found under the
+BIDS root, 16 runs at a time, and writes the HFO events of each run to
+``derivatives/mne-hfo`` with :func:`mne_hfo.io.write_annotations`. See
+``mne-hfo --help`` for all options.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import mne
+import pandas as pd
+from joblib.externals.loky import ProcessPoolExecutor
+from mne_bids import BIDSPath, read_raw_bids
+from mne_bids.config import ALLOWED_DATATYPE_EXTENSIONS
+
+from mne_hfo.config import ACCEPTED_ANNOT_EXTENSIONS, MANIFEST_COLUMNS
+from mne_hfo.detect import (HilbertDetector, LineLengthDetector,
+                            MultiBandDetector, RMSDetector)
+from mne_hfo.io import write_annotations
+
+# detectors by name, which is also the "desc" entity of the annotations
+DETECTORS = {
+    'rms': RMSDetector,
+    'linelength': LineLengthDetector,
+    'hilbert': HilbertDetector,
+    'multiband': MultiBandDetector,
+}
+MANIFEST_FNAME = 'mne_hfo_manifest.tsv'
+
+
+def run_bids_detection(root: Union[str, Path], detector: str = 'rms',
+                       detector_params: Optional[Dict] = None,
+                       out_dir: Optional[Union[str, Path]] = None,
+                       subjects: Optional[List[str]] = None,
+                       sessions: Optional[List[str]] = None,
+                       tasks: Optional[List[str]] = None,
+                       extension: str = '.tsv', n_jobs: int = 1,
+                       overwrite: bool = False,
+                       verbose: bool = True) -> pd.DataFrame:
+    """Detect HFOs in all iEEG runs of a BIDS dataset.
+
+    Each run is read with :func:`mne_bids.read_raw_bids`, its good
+    sEEG and ECoG channels are fit by the detector, and the HFO events
+    are written next to those of the other runs in ``out_dir``, as
+    ``*_desc-<detector>_annotations`` files. Runs are processed in
+    parallel in a pool of processes, the largest first.
+
+    Every processed run is recorded in the ``mne_hfo_manifest.tsv``
+    file of ``out_dir`` as soon as it finished, so runs that were
+    already done with the same detector and parameters are skipped
+    when calling this again, e.g. after an interruption. Runs that
+    failed are recorded with their error and retried.
+
+    Parameters
+    ----------
+    root : str | pathlib.Path
+        The root of the BIDS dataset.
+    detector : str
+        The detector to run, one of ``'rms'`` (default),
+        ``'linelength'``, ``'hilbert'`` or ``'multiband'``.
+    detector_params : dict | None
+        The parameters of the detector. ``n_jobs`` defaults to 1, since
+        runs are already processed in parallel.
+    out_dir : str | pathlib.Path | None
+        The directory to write annotations and the manifest to. If None
+        (default), ``derivatives/mne-hfo`` in ``root``.
+    subjects, sessions, tasks : list of str | None
+        Only process the runs of these subjects, sessions or tasks. If
+        None (default), all of them.
+    extension : str
+        The file format of the annotations, ``'.tsv'`` (default),
+        ``'.parquet'`` or ``'.feather'``.
+    n_jobs : int
+        The number of runs processed at the same time, or -1 for the
+        number of CPUs. Default is 1, which processes the runs one after
+        the other in this process.
+    overwrite : bool
+        Whether to process runs that are already done. Default is False.
+    verbose : bool
+        Whether to print the outcome of each run.
+
+    Returns
+    -------
+    manifest : pd.DataFrame
+        The manifest entries of the runs found, one row per run, with
+        ``status`` ``'done'``, ``'error'`` or ``'skipped'``.
+    """
+    if detector not in DETECTORS:
+        raise ValueError(f'Detector {detector} is not supported. '
+                         f'Please use one of {list(DETECTORS)}.')
+    if extension not in ACCEPTED_ANNOT_EXTENSIONS:
+        raise ValueError(f'Annotations extension {extension} is not '
+                         f'supported. Please use one of '
+                         f'{ACCEPTED_ANNOT_EXTENSIONS}.')
+    detector_params = {'n_jobs': 1, **(detector_params or dict())}
+    # fail before processing any run if the parameters are wrong
+    DETECTORS[detector](**detector_params)
+
+    root = Path(root)
+    out_dir = root / 'derivatives' / 'mne-hfo' if out_dir is None \
+        else Path(out_dir)
+    manifest_fname = out_dir / MANIFEST_FNAME
+    params = json.dumps(detector_params, sort_keys=True, default=str)
+    config = hashlib.blake2b(f'{detector}{extension}{params}'.encode(),
+                             digest_size=8).hexdigest()
+
+    # the runs already done with this configuration
+    done = set()
+    if manifest_fname.exists() and not overwrite:
+        prev_manifest = pd.read_csv(manifest_fname, sep='\t',
+                                    keep_default_na=False)
+        prev_manifest = prev_manifest[
+            (prev_manifest['config'] == config) &
+            (prev_manifest['status'] == 'done')]
+        done = {raw for raw, annot in zip(prev_manifest['raw'],
+                                          prev_manifest['annotations'])
+                if (out_dir / annot).exists()}
+
+    bids_paths = _find_ieeg_runs(root, subjects, sessions, tasks)
+    entries, tasks_args = [], []
+    for bids_path in bids_paths:
+        raw_fname = bids_path.fpath.relative_to(root)
+        annot_fname = raw_fname.parent / _get_annot_basename(
+            bids_path, detector, extension)
+        entry = dict(raw=raw_fname.as_posix(),
+                     annotations=annot_fname.as_posix(),
+                     detector=detector, params=params, config=config)
+        if entry['raw'] in done:
+            entries.append(dict(entry, status='skipped'))
+        else:
+            tasks_args.append((bids_path, out_dir / annot_fname, entry))
+
+    if verbose:
+        print(f'Found {len(bids_paths)} iEEG runs in {root}, '
+              f'{len(bids_paths) - len(tasks_args)} already done.')
+
+    # start with the largest runs, so that no process is left with a
+    # large run while the others are idle at the end
+    tasks_args.sort(key=lambda args: _get_run_size(args[0]), reverse=True)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    n_jobs = max(min(n_jobs, len(tasks_args)), 1)
+
+    def _record(entry):
+        # append each run as it finishes, so an interrupted batch keeps
+        # the runs done so far
+        entries.append(entry)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame([entry], columns=MANIFEST_COLUMNS).to_csv(
+            manifest_fname, sep='\t', index=False, mode='a',
+            header=not manifest_fname.exists())
+        if verbose:
+            outcome = f'{entry["n_events"]} HFO events' \
+                if entry['status'] == 'done' else entry['error']
+            print(f'[{len(entries)}/{len(bids_paths)}] {entry["raw"]}: '
+                  f'{outcome} ({entry["duration"]:.1f} s)')
+
+    if n_jobs == 1:
+        for bids_path, annot_fname, entry in tasks_args:
+            _record(_detect_run(bids_path, annot_fname, root, detector,
+                                detector_params, entry))
+    else:
+        # the processes of loky, unlike forked ones, do not deadlock when
+        # this process runs a pool of joblib, e.g. of a detector with
+        # n_jobs > 1, and need no main guard in scripts
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_detect_run, bids_path, annot_fname,
+                                       root, detector, detector_params,
+                                       entry)
+                       for bids_path, annot_fname, entry in tasks_args]
+            for future in as_completed(futures):
+                _record(future.result())
+
+    manifest = pd.DataFrame(entries, columns=MANIFEST_COLUMNS)
+    return manifest.sort_values('raw', ignore_index=True)
+
+
+def _find_ieeg_runs(root, subjects=None, sessions=None, tasks=None):
+    """Find the iEEG recordings of a BIDS dataset, outside derivatives."""
+    bids_paths = BIDSPath(root=root, datatype='ieeg', suffix='ieeg').match()
+    return sorted(
+        (bids_path for bids_path in bids_paths
+         if bids_path.extension in ALLOWED_DATATYPE_EXTENSIONS['ieeg'] and
+         bids_path.fpath.relative_to(root).parts[0].startswith('sub-') and
+         (subjects is None or bids_path.subject in subjects) and
+         (sessions is None or bids_path.session in sessions) and
+         (tasks is None or bids_path.task in tasks)),
+        key=lambda bids_path: str(bids_path.fpath))
+
+
+def _get_annot_basename(bids_path, detector, extension):
+    """Name the annotations of a recording after it and the detector."""
+    # the entities of the recording, without its suffix and extension
+    entities = bids_path.fpath.name[:-len(bids_path.extension)].rsplit(
+        '_', 1)[0]
+    return f'{entities}_desc-{detector}_annotations{extension}'
+
+
+def _get_run_size(bids_path):
+    """Size in bytes of the files of a recording, e.g. .vhdr and .eeg."""
+    fpath = bids_path.fpath
+    return sum(fname.stat().st_size
+               for fname in fpath.parent.glob(f'{fpath.stem}.*'))
+
+
+def _detect_run(bids_path, annot_fname, root, detector, detector_params,
+                entry):
+    """Detect and write the HFO events of one run, in a worker process."""
+    start = time.perf_counter()
+    try:
+        raw = read_raw_bids(bids_path, verbose=False)
+        raw.pick(mne.pick_types(raw.info, seeg=True, ecog=True,
+                                exclude='bads'))
+        hfo_detector = DETECTORS[detector](**detector_params).fit(raw)
+        annot_df = hfo_detector.to_data_frame(format='bids')
+        write_annotations(annot_df, fname=annot_fname,
+                          intended_for=bids_path.fpath, root=root)
+    except Exception as err:
+        # a failed run does not stop the batch, it is retried next time
+        error = ' '.join(f'{type(err).__name__}: {err}'.split())
+        entry = dict(entry, status='error', n_events=None, error=error)
+    else:
+        entry = dict(entry, status='done', n_events=len(annot_df),
+                     error='')
+    entry.update(duration=time.perf_counter() - start,
+                 date=datetime.now(timezone.utc).isoformat())
+    return entry
+
+
+def _parse_param(param):
+    """Parse a ``KEY=VALUE`` detector parameter, VALUE being a literal."""
+    key, sep, value = param.partition('=')
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f'Detector parameters need to be '
+                                         f'given as KEY=VALUE, not {param}.')
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        # anything else is a string, e.g. scoring_func=f1
+        pass
+    return key, value
+
+
+def main(argv=None):
+    """Run the ``mne-hfo`` command."""
+    parser = argparse.ArgumentParser(
+        prog='mne-hfo', description='Detect HFOs in all iEEG runs of a BIDS '
+                                    'dataset and write them as annotations.')
+    parser.add_argument('root', type=Path, help='The root of the BIDS '
+                                                'dataset.')
+    parser.add_argument('--detector', default='rms', choices=list(DETECTORS))
+    parser.add_argument('--param', dest='params', action='append',
+                        type=_parse_param, default=[], metavar='KEY=VALUE',
+                        help='A parameter of the detector, e.g. threshold=3 '
+                             'or "filter_band=(80, 250)". Can be repeated.')
+    parser.add_argument('--out-dir', type=Path, default=None,
+                        help='Where to write the annotations and the '
+                             'manifest. Default is derivatives/mne-hfo in '
+                             'the BIDS root.')
+    parser.add_argument('--subjects', nargs='+', default=None)
+    parser.add_argument('--sessions', nargs='+', default=None)
+    parser.add_argument('--tasks', nargs='+', default=None)
+    parser.add_argument('--extension', default='.tsv',
+                        choices=ACCEPTED_ANNOT_EXTENSIONS,
+                        help='The file format of the annotations.')
+    parser.add_argument('--n-jobs', type=int, default=1,
+                        help='The number of runs processed at the same '
+                             'time, -1 for the number of CPUs.')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Process the runs done already again.')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = run_bids_detection(
+            args.root, detector=args.detector,
+            detector_params=dict(args.params), out_dir=args.out_dir,
+            subjects=args.subjects, sessions=args.sessions, tasks=args.tasks,
+            extension=args.extension, n_jobs=args.n_jobs,
+            overwrite=args.overwrite, verbose=not args.quiet)
+    except (TypeError, ValueError) as err:
+        # the parameters are checked before any run is processed
+        parser.error(f'Wrong parameters of the {args.detector} detector: '
+                     f'{err}')
+
+    # a non-zero exit status if any run failed
+    return int((manifest['status'] == 'error').any())
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
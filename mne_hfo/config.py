@@ -24,7 +24,23 @@ REFERENCES = {
 }
 MINIMUM_SUGGESTED_SFREQ = 2000
 ACCEPTED_BAND_METHODS = ['linear', 'log']
+ACCEPTED_BAND_SHAPES = ['butter', 'rect', 'gaussian']
 
 # conversion of time scales to seconds
 TIME_SCALE_TO_SECS = {'s': 1., 'm': 60., 'h': 60. * 60, 'd': 60. * 60 * 24}
 ANNOT_COLUMNS = ['onset', 'duration', 'label', 'channels', 'sample']
+# file formats of the annotations, binary columnar formats need pyarrow
+ACCEPTED_ANNOT_EXTENSIONS = ['.tsv', '.parquet', '.feather']
+ACCEPTED_WINDOW_STATS = ['rms', 'line_length']
+ACCEPTED_WINDOW_ENGINES = ['vectorized', 'loop']
+ACCEPTED_BASELINE_MODES = ['segmented', 'rolling']
+
+# item counts and columns of the profile of the stages of a fit
+PROFILE_COUNTS = ['n_samples', 'n_windows', 'n_bands', 'n_detections',
+                  'n_events']
+PROFILE_COLUMNS = ['stage', 'channels', 'wall_time', 'cpu_time'] + \
+    PROFILE_COUNTS
+
+# columns of the manifest of the runs of a batch detection over a BIDS root
+MANIFEST_COLUMNS = ['raw', 'annotations', 'detector', 'params', 'config',
+                    'status', 'n_events', 'duration', 'error', 'date']
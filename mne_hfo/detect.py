@@ -1,10 +1,12 @@
-from typing import Tuple, Union
+from typing import Callable, Optional, Sequence, Tuple, Union
 
 import mne
 import numpy as np
 
 from mne_hfo.base import Detector
-from mne_hfo.config import ACCEPTED_BAND_METHODS
+from mne_hfo.config import (ACCEPTED_BAND_METHODS, ACCEPTED_BAND_SHAPES,
+                            ACCEPTED_WINDOW_STATS)
+from mne_hfo.utils import _filter_data, _filter_data_bands
 
 
 class HilbertDetector(Detector):  # noqa
@@ -26,6 +28,10 @@ class HilbertDetector(Detector):  # noqa
         is slower.
     n_bands : int
         Number of bands if band_spacing = log (default=300).
+    band_shape : str
+        Frequency response of each band of the filter bank. One of
+        ``'butter'`` (default), the zero-phase 4th order Butterworth
+        band-pass filter, ``'rect'`` or ``'gaussian'``.
     cycle_threshold : float
         Minimum number of cycles to detect (default=1).
     gap_threshold : float
@@ -43,6 +49,29 @@ class HilbertDetector(Detector):  # noqa
         (250, 500)).
     verbose : bool
         Verbosity of the detector.
+    event_arr_storage : str | None
+        How to store the HFO statistic in ``hfo_event_arr_``. One of
+        ``'float64'`` (default), ``'float32'``, ``'memmap'`` (temporary
+        file on disk), or None to not keep it.
+    baseline_duration : float | None
+        If not None, the envelope of each frequency band is z-scored
+        with the baseline of this many seconds around each sample,
+        instead of the whole recording. Default is None.
+    baseline_mode : str
+        How the baseline of each sample is chosen: ``'segmented'``
+        (default) for consecutive epochs of ``baseline_duration``
+        seconds, or ``'rolling'`` for the ``baseline_duration`` seconds
+        centered on the sample.
+    profile : bool | callable
+        If True, ``fit`` records the wall time, CPU time and item counts
+        of each of its stages in ``fit_profile_``. If a callable, it is
+        also called with the record of each stage as soon as it finished.
+        Default is False.
+    dtype : str
+        The floating point precision of ``fit``, ``'float64'`` (default)
+        or ``'float32'``, which halves the memory of the data. The
+        statistic then matches that of ``'float64'`` to a relative
+        tolerance of about ``1e-5``.
 
     References
     ----------
@@ -57,21 +86,35 @@ class HilbertDetector(Detector):  # noqa
                  threshold: Union[int, float] = 3,
                  filter_band: Tuple[int, int] = (30, 100),
                  band_method: str = 'linear', n_bands: int = 300,
+                 band_shape: str = 'butter',
                  cycle_threshold: float = 1, gap_threshold: float = 1,
                  n_jobs: int = -1, offset: int = 0,
                  scoring_func: str = 'f1',
-                 hfo_name: str = "hfo", verbose: bool = False):
+                 hfo_name: str = "hfo", verbose: bool = False,
+                 event_arr_storage: Optional[str] = 'float64',
+                 baseline_duration: Optional[float] = None,
+                 baseline_mode: str = 'segmented',
+                 profile: Union[bool, Callable] = False,
+                 dtype: str = 'float64'):
         if band_method not in ACCEPTED_BAND_METHODS:
             raise ValueError(f'Band method {band_method} is not '
                              f'an acceptable parameter. Please use '
                              f'one of {ACCEPTED_BAND_METHODS}')
+        if band_shape not in ACCEPTED_BAND_SHAPES:
+            raise ValueError(f'Band shape {band_shape} is not '
+                             f'an acceptable parameter. Please use '
+                             f'one of {ACCEPTED_BAND_SHAPES}')
 
         super(HilbertDetector, self).__init__(
             threshold, win_size=1, overlap=1,
-            scoring_func=scoring_func, n_jobs=n_jobs, verbose=verbose)
+            scoring_func=scoring_func, n_jobs=n_jobs, verbose=verbose,
+            event_arr_storage=event_arr_storage,
+            baseline_duration=baseline_duration,
+            baseline_mode=baseline_mode, profile=profile, dtype=dtype)
 
         self.band_method = band_method
         self.n_bands = n_bands
+        self.band_shape = band_shape
         self.filter_band = filter_band
         self.hfo_name = hfo_name
         self.cycle_threshold = cycle_threshold
@@ -93,7 +136,7 @@ class HilbertDetector(Detector):  # noqa
             return None
         return self.filter_band[1]
 
-    def _create_empty_event_arr(self):
+    def _create_empty_event_arr(self, storage='float64'):
         """Override ``Detector._create_empty_event_arr`` function.
 
         Also sets the frequency span of the Hilbert detector.
@@ -112,7 +155,8 @@ class HilbertDetector(Detector):  # noqa
             self.freq_span = (self.filter_band[1] - self.filter_band[0]) - 1
         n_windows = self.n_times
         n_bands = len(self.freq_cutoffs) - 1
-        hfo_event_arr = np.empty((self.n_chs, n_bands, n_windows))
+        hfo_event_arr = self._allocate_event_arr(
+            (self.n_chs, n_bands, n_windows), storage)
         return hfo_event_arr
 
     def _compute_hfo_statistic(self, X):
@@ -127,10 +171,18 @@ class HilbertDetector(Detector):  # noqa
 
         return hfo_event_arr
 
+    def _statistic_counts(self, hfo_statistic_arr):
+        """Override ``Detector._statistic_counts`` function."""
+        n_bands, n_times = np.shape(hfo_statistic_arr)
+        return dict(n_windows=n_times, n_bands=n_bands)
+
     def _threshold_statistic(self, X):
         """Override ``Detector._threshold_statistic`` function."""
-        hfo_threshold_arr = np.transpose(np.array(self._apply_threshold(
-            X, threshold_method='hilbert'), dtype='object'))
+        band_detections = self._apply_threshold(X, threshold_method='hilbert')
+        # one list of detections per band, even if all bands have the same
+        # number of detections, e.g. none
+        hfo_threshold_arr = np.empty(len(band_detections), dtype='object')
+        hfo_threshold_arr[:] = band_detections
         return hfo_threshold_arr
 
     def _post_process_ch_hfos(self, detections):
@@ -181,6 +233,36 @@ class LineLengthDetector(Detector):
         (250, 500)).
     verbose : bool
         Verbosity of the detector.
+    chunk_duration : float | None
+        If not None, fit a :class:`mne.io.Raw` by reading this many seconds
+        of data at a time instead of loading the whole recording.
+    event_arr_storage : str | None
+        How to store the HFO statistic in ``hfo_event_arr_``. One of
+        ``'float64'`` (default), ``'float32'``, ``'memmap'`` (temporary
+        file on disk), or None to not keep it.
+    baseline_halflife : float | None
+        The half-life in seconds of the baseline of the statistic when
+        streaming with ``partial_fit``. If None (default), all windows
+        of the stream weigh the same.
+    baseline_duration : float | None
+        If not None, the threshold of each window is computed from the
+        baseline of this many seconds around it, instead of the whole
+        recording. Default is None.
+    baseline_mode : str
+        How the baseline of each window is chosen: ``'segmented'``
+        (default) for consecutive epochs of ``baseline_duration``
+        seconds, or ``'rolling'`` for the ``baseline_duration`` seconds
+        centered on the window.
+    profile : bool | callable
+        If True, ``fit`` records the wall time, CPU time and item counts
+        of each of its stages in ``fit_profile_``. If a callable, it is
+        also called with the record of each stage as soon as it finished.
+        Default is False.
+    dtype : str
+        The floating point precision of ``fit``, ``'float64'`` (default)
+        or ``'float32'``, which halves the memory of the data. The
+        statistic then matches that of ``'float64'`` to a relative
+        tolerance of about ``1e-5``.
 
     Notes
     -----
@@ -200,17 +282,32 @@ class LineLengthDetector(Detector):
            Conference of the IEEE (Vol. 2, pp. 1707-1710). IEEE.
     """
 
+    _batched = True
+    _filter_method = 'iir'
+    _window_stat = 'line_length'
+
     def __init__(self,
                  threshold: Union[int, float] = 3, win_size: int = 100,
                  overlap: float = 0.25, sfreq: int = None,
                  filter_band: Tuple[int, int] = (30, 100),
                  scoring_func: str = 'f1', n_jobs: int = -1,
                  hfo_name: str = "hfo",
-                 verbose: bool = False):
+                 verbose: bool = False,
+                 chunk_duration: Optional[float] = None,
+                 event_arr_storage: Optional[str] = 'float64',
+                 baseline_halflife: Optional[float] = None,
+                 baseline_duration: Optional[float] = None,
+                 baseline_mode: str = 'segmented',
+                 profile: Union[bool, Callable] = False,
+                 dtype: str = 'float64'):
         super(LineLengthDetector, self).__init__(
             threshold, win_size=win_size, overlap=overlap,
             scoring_func=scoring_func, n_jobs=n_jobs,
-            verbose=verbose)
+            verbose=verbose, chunk_duration=chunk_duration,
+            event_arr_storage=event_arr_storage,
+            baseline_halflife=baseline_halflife,
+            baseline_duration=baseline_duration,
+            baseline_mode=baseline_mode, profile=profile, dtype=dtype)
 
         self.filter_band = filter_band
         self.sfreq = sfreq
@@ -236,27 +333,25 @@ class LineLengthDetector(Detector):
 
         # bandpass the signal using FIR filter
         if self.filter_band is not None:
-            X = mne.filter.filter_data(X, sfreq=self.sfreq,
-                                       l_freq=self.l_freq,
-                                       h_freq=self.h_freq,
-                                       method='iir', verbose=self.verbose)
+            X = _filter_data(X, sfreq=self.sfreq, l_freq=self.l_freq,
+                             h_freq=self.h_freq, method=self._filter_method,
+                             verbose=self.verbose)
 
         hfo_event_arr = self._compute_sliding_window_detection(
             X, method='line_length')
 
-        # reshape array to be n_wins x n_bands (i.e. 1)
-        n_windows = self._compute_n_wins(self.win_size, self.step_size,
-                                         self.n_times)
+        # reshape array to be (n_chs x) n_wins x n_bands (i.e. 1)
         n_bands = len(self.freq_cutoffs) - 1
-        shape = (n_windows, n_bands)
+        shape = hfo_event_arr.shape + (n_bands,)
         hfo_event_arr = np.array(hfo_event_arr).reshape(shape)
 
         return hfo_event_arr
 
     def _threshold_statistic(self, X):
         """Override ``Detector._threshold_statistic`` function."""
+        # threshold the statistic of the only frequency band
         hfo_threshold_arr = self._apply_threshold(
-            X, threshold_method='std'
+            X[..., 0], threshold_method='std'
         )
         return hfo_threshold_arr
 
@@ -300,6 +395,36 @@ class RMSDetector(Detector):
         (250, 500)).
     verbose : bool
         Verbosity of the detector.
+    chunk_duration : float | None
+        If not None, fit a :class:`mne.io.Raw` by reading this many seconds
+        of data at a time instead of loading the whole recording.
+    event_arr_storage : str | None
+        How to store the HFO statistic in ``hfo_event_arr_``. One of
+        ``'float64'`` (default), ``'float32'``, ``'memmap'`` (temporary
+        file on disk), or None to not keep it.
+    baseline_halflife : float | None
+        The half-life in seconds of the baseline of the statistic when
+        streaming with ``partial_fit``. If None (default), all windows
+        of the stream weigh the same.
+    baseline_duration : float | None
+        If not None, the threshold of each window is computed from the
+        baseline of this many seconds around it, instead of the whole
+        recording. Default is None.
+    baseline_mode : str
+        How the baseline of each window is chosen: ``'segmented'``
+        (default) for consecutive epochs of ``baseline_duration``
+        seconds, or ``'rolling'`` for the ``baseline_duration`` seconds
+        centered on the window.
+    profile : bool | callable
+        If True, ``fit`` records the wall time, CPU time and item counts
+        of each of its stages in ``fit_profile_``. If a callable, it is
+        also called with the record of each stage as soon as it finished.
+        Default is False.
+    dtype : str
+        The floating point precision of ``fit``, ``'float64'`` (default)
+        or ``'float32'``, which halves the memory of the data. The
+        statistic then matches that of ``'float64'`` to a relative
+        tolerance of about ``1e-5``.
 
     References
     ----------
@@ -309,16 +434,31 @@ class RMSDetector(Detector):
     J. Neurophysiol., vol. 88, pp. 1743–1752, 2002.
     """
 
+    _batched = True
+    _window_stat = 'rms'
+
     def __init__(self, threshold: Union[int, float] = 3, win_size: int = 100,
                  overlap: float = 0.25, sfreq=None,
                  filter_band: Tuple[int, int] = (100, 500),
                  scoring_func='f1', n_jobs: int = -1,
                  hfo_name: str = "hfo",
-                 verbose: bool = False):
+                 verbose: bool = False,
+                 chunk_duration: Optional[float] = None,
+                 event_arr_storage: Optional[str] = 'float64',
+                 baseline_halflife: Optional[float] = None,
+                 baseline_duration: Optional[float] = None,
+                 baseline_mode: str = 'segmented',
+                 profile: Union[bool, Callable] = False,
+                 dtype: str = 'float64'):
         super(RMSDetector, self).__init__(
             threshold, win_size, overlap,
             scoring_func,
-            n_jobs=n_jobs, verbose=verbose)
+            n_jobs=n_jobs, verbose=verbose,
+            chunk_duration=chunk_duration,
+            event_arr_storage=event_arr_storage,
+            baseline_halflife=baseline_halflife,
+            baseline_duration=baseline_duration,
+            baseline_mode=baseline_mode, profile=profile, dtype=dtype)
 
         # hyperparameters
         self.filter_band = filter_band
@@ -345,27 +485,25 @@ class RMSDetector(Detector):
 
         if self.l_freq is not None or self.h_freq is not None:
             # bandpass the signal using FIR filter
-            X = mne.filter.filter_data(X, sfreq=self.sfreq,
-                                       l_freq=self.l_freq,
-                                       h_freq=self.h_freq,
-                                       method='fir', verbose=self.verbose)
+            X = _filter_data(X, sfreq=self.sfreq, l_freq=self.l_freq,
+                             h_freq=self.h_freq, method=self._filter_method,
+                             verbose=self.verbose)
 
         hfo_event_arr = self._compute_sliding_window_detection(
             X, method='rms')
 
-        # reshape array to be n_wins x n_bands (i.e. 1)
-        n_windows = self._compute_n_wins(self.win_size, self.step_size,
-                                         self.n_times)
+        # reshape array to be (n_chs x) n_wins x n_bands (i.e. 1)
         n_bands = len(self.freq_cutoffs) - 1
-        shape = (n_windows, n_bands)
+        shape = hfo_event_arr.shape + (n_bands,)
         hfo_event_arr = np.array(hfo_event_arr).reshape(shape)
 
         return hfo_event_arr
 
     def _threshold_statistic(self, X):
         """Override ``Detector._threshold_statistic`` function."""
+        # threshold the statistic of the only frequency band
         hfo_threshold_arr = self._apply_threshold(
-            X, threshold_method='std'
+            X[..., 0], threshold_method='std'
         )
         return hfo_threshold_arr
 
@@ -373,3 +511,224 @@ class RMSDetector(Detector):
         """Override ``Detector._post_process_ch_hfos`` function."""
         return self._merge_contiguous_ch_detections(
             detections, method="time-windows")
+
+
+class MultiBandDetector(Detector):
+    """Sliding window HFO detection in several frequency bands at once.
+
+    Detects HFOs in each of ``filter_bands`` as :class:`RMSDetector` or
+    :class:`LineLengthDetector` would, with one threshold per band, but
+    validates the data once, filters it into all bands from one Fourier
+    transform (or one band after the other for the IIR filter of the
+    line length) and computes the statistic of all bands in one pass.
+    Events are labelled by their band, e.g. ``'ripple'`` and
+    ``'fastripple'``.
+
+    Parameters
+    ----------
+    threshold : float
+        Number of standard deviations to use as a threshold, in each band.
+    win_size : int
+        Sliding window size in samples.
+    overlap : float
+        Fraction of the window overlap (0 to 1).
+    sfreq : int | None
+        The sampling rate of the data.
+    filter_bands : list of tuple(float, float)
+        Low and high cut-off frequency of each band. The default is
+        ``((80, 250), (250, 500))``, ripples and fast ripples.
+    hfo_names : list of str
+        The label of the events of each band. The default is
+        ``('ripple', 'fastripple')``.
+    cooccurrence_name : str | None
+        If not None (default ``'frandr'``), events of different bands
+        that overlap on the same channel are merged into one event with
+        this label, spanning all of them and the frequencies of their
+        bands. If None, the events of each band are kept apart.
+    method : str
+        The sliding window statistic, ``'rms'`` (default) with a FIR
+        filter as :class:`RMSDetector`, or ``'line_length'`` with an IIR
+        filter as :class:`LineLengthDetector`.
+    scoring_func : str
+        The scoring function to apply when trying to match HFOs with
+        a different dataset, such as manual annotations.
+    n_jobs : int
+        The number of jobs for joblib parallelization.
+    verbose : bool
+        Verbosity of the detector.
+    chunk_duration : float | None
+        If not None, fit a :class:`mne.io.Raw` by reading this many seconds
+        of data at a time instead of loading the whole recording.
+    event_arr_storage : str | None
+        How to store the HFO statistic in ``hfo_event_arr_``, of shape
+        (n_chs, n_windows, n_bands). One of ``'float64'`` (default),
+        ``'float32'``, ``'memmap'`` (temporary file on disk), or None to
+        not keep it.
+    baseline_duration : float | None
+        If not None, the threshold of each window is computed from the
+        baseline of this many seconds around it, instead of the whole
+        recording. Default is None.
+    baseline_mode : str
+        How the baseline of each window is chosen: ``'segmented'``
+        (default) for consecutive epochs of ``baseline_duration``
+        seconds, or ``'rolling'`` for the ``baseline_duration`` seconds
+        centered on the window.
+    profile : bool | callable
+        If True, ``fit`` records the wall time, CPU time and item counts
+        of each of its stages in ``fit_profile_``. If a callable, it is
+        also called with the record of each stage as soon as it finished.
+        Default is False.
+    dtype : str
+        The floating point precision of ``fit``, ``'float64'`` (default)
+        or ``'float32'``, which halves the memory of the data. The
+        statistic then matches that of ``'float64'`` to a relative
+        tolerance of about ``1e-5``.
+
+    Notes
+    -----
+    The filtered data of all bands is held in memory at once, so a
+    block of channels takes ``len(filter_bands)`` times the memory of its
+    data. Use ``chunk_duration`` to bound it for long recordings.
+
+    Streaming with ``partial_fit`` is not supported.
+    """
+
+    _batched = True
+
+    def __init__(self, threshold: Union[int, float] = 3, win_size: int = 100,
+                 overlap: float = 0.25, sfreq: int = None,
+                 filter_bands: Sequence[Tuple[int, int]] = ((80, 250),
+                                                            (250, 500)),
+                 hfo_names: Sequence[str] = ('ripple', 'fastripple'),
+                 cooccurrence_name: Optional[str] = 'frandr',
+                 method: str = 'rms',
+                 scoring_func: str = 'f1', n_jobs: int = -1,
+                 verbose: bool = False,
+                 chunk_duration: Optional[float] = None,
+                 event_arr_storage: Optional[str] = 'float64',
+                 baseline_duration: Optional[float] = None,
+                 baseline_mode: str = 'segmented',
+                 profile: Union[bool, Callable] = False,
+                 dtype: str = 'float64'):
+        if method not in ACCEPTED_WINDOW_STATS:
+            raise ValueError(f'Method {method} is not an acceptable '
+                             f'parameter. Please use one of '
+                             f'{ACCEPTED_WINDOW_STATS}')
+        if len(hfo_names) != len(filter_bands):
+            raise ValueError(f'There needs to be one HFO name per filter '
+                             f'band. Got {len(hfo_names)} names for '
+                             f'{len(filter_bands)} bands.')
+
+        super(MultiBandDetector, self).__init__(
+            threshold, win_size=win_size, overlap=overlap,
+            scoring_func=scoring_func, n_jobs=n_jobs,
+            verbose=verbose, chunk_duration=chunk_duration,
+            event_arr_storage=event_arr_storage,
+            baseline_duration=baseline_duration,
+            baseline_mode=baseline_mode, profile=profile, dtype=dtype)
+
+        self.sfreq = sfreq
+        self.filter_bands = filter_bands
+        self.hfo_names = hfo_names
+        self.cooccurrence_name = cooccurrence_name
+        self.method = method
+
+    @property
+    def _filter_method(self):
+        """Filter of the single band detector of the statistic."""
+        return 'iir' if self.method == 'line_length' else 'fir'
+
+    def _create_empty_event_arr(self, storage='float64'):
+        """Override ``Detector._create_empty_event_arr`` function."""
+        n_windows = self._compute_n_wins(self.win_size, self.step_size,
+                                         self.n_times)
+        hfo_event_arr = self._allocate_event_arr(
+            (self.n_chs, n_windows, len(self.filter_bands)), storage)
+        return hfo_event_arr
+
+    def _compute_hfo_statistic(self, X):
+        """Override ``Detector._compute_hfo_statistic`` function."""
+        # filter into all bands, of shape n_bands x (n_chs x) n_times
+        X_bands = _filter_data_bands(X, sfreq=self.sfreq,
+                                     filter_bands=self.filter_bands,
+                                     method=self._filter_method,
+                                     verbose=self.verbose)
+
+        # the windows of all bands and channels at once
+        hfo_event_arr = self._compute_sliding_window_detection(
+            X_bands.reshape(-1, X_bands.shape[-1]), method=self.method)
+        hfo_event_arr = hfo_event_arr.reshape(X_bands.shape[:-1] + (-1,))
+
+        # reshape array to be (n_chs x) n_wins x n_bands
+        return np.moveaxis(hfo_event_arr, 0, -1)
+
+    def _threshold_statistic(self, X):
+        """Override ``Detector._threshold_statistic`` function."""
+        # threshold each band against its own baseline
+        band_detections = [
+            self._apply_threshold(X[..., band_idx], threshold_method='std')
+            for band_idx in range(X.shape[-1])]
+        if X.ndim == 2:
+            return band_detections
+
+        # the detections of each channel, as a list per band
+        return [list(ch_detections)
+                for ch_detections in zip(*band_detections)]
+
+    def _post_process_ch_hfos(self, detections):
+        """Override ``Detector._post_process_ch_hfos`` function."""
+        band_inds = np.concatenate([
+            np.full(len(starts), band_idx)
+            for band_idx, (starts, _) in enumerate(detections)])
+        starts = np.concatenate([starts for starts, _ in detections])
+        stops = np.concatenate([stops for _, stops in detections])
+        hfo_names = np.asarray(self.hfo_names, dtype=object)
+        filter_bands = np.asarray(self.filter_bands, dtype=np.float64)
+
+        if self.cooccurrence_name is None or len(starts) == 0:
+            return dict(starts=starts, stops=stops,
+                        freq_bands=filter_bands[band_inds],
+                        labels=hfo_names[band_inds])
+
+        # sweep over the events of all bands: an event starts a new
+        # group if it starts after all previous events stopped
+        order = np.lexsort((band_inds, starts))
+        band_inds, starts, stops = band_inds[order], starts[order], \
+            stops[order]
+        is_first = np.ones(len(starts), dtype=bool)
+        is_first[1:] = starts[1:] > np.maximum.accumulate(stops[:-1])
+        first_inds = np.flatnonzero(is_first)
+        groups = np.cumsum(is_first) - 1
+
+        # groups with events of more than one band are merged into one
+        # co-occurrence event, other events are kept as they are
+        is_cooccurrence = np.minimum.reduceat(band_inds, first_inds) != \
+            np.maximum.reduceat(band_inds, first_inds)
+        is_single = ~is_cooccurrence[groups]
+        merged_bands = np.column_stack((
+            np.minimum.reduceat(filter_bands[band_inds, 0], first_inds),
+            np.maximum.reduceat(filter_bands[band_inds, 1], first_inds)))
+        merged_stops = np.maximum.reduceat(stops, first_inds)
+        return dict(
+            starts=np.concatenate((starts[is_single],
+                                   starts[first_inds][is_cooccurrence])),
+            stops=np.concatenate((stops[is_single],
+                                  merged_stops[is_cooccurrence])),
+            freq_bands=np.concatenate((filter_bands[band_inds[is_single]],
+                                       merged_bands[is_cooccurrence])),
+            labels=np.concatenate((
+                hfo_names[band_inds[is_single]],
+                np.full(is_cooccurrence.sum(), self.cooccurrence_name,
+                        dtype=object))))
+
+    def _filter_halo(self):
+        """Override ``Detector._filter_halo`` function."""
+        # the halo of the longest filter of all bands
+        halos = []
+        for l_freq, h_freq in self.filter_bands:
+            filt = mne.filter.create_filter(
+                None, self.sfreq, l_freq=l_freq, h_freq=h_freq,
+                method=self._filter_method, verbose=False)
+            halos.append(filt['padlen'] if self._filter_method == 'iir'
+                         else len(filt))
+        return max(halos)
@@ -0,0 +1,240 @@
+"""Columnar table of detected HFO events."""
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from mne import Annotations
+
+from mne_hfo.config import ANNOT_COLUMNS
+
+
+class HFOEventTable:
+    """Array-backed table of HFO events, one entry per event.
+
+    This is the result of ``fit`` for all detectors, available as the
+    ``hfo_events_`` attribute. Each column is a NumPy array, and the
+    table converts to the other result types of MNE-HFO without
+    re-validating the events: :class:`mne.Annotations`, the BIDS
+    ``annotations.tsv`` DataFrame and the scikit-learn list format.
+
+    Parameters
+    ----------
+    starts : array-like of int, shape (n_events,)
+        The start sample of each event.
+    stops : array-like of int, shape (n_events,)
+        The stop sample of each event.
+    ch_inds : array-like of int, shape (n_events,)
+        The index into ``ch_names`` of the channel of each event.
+    ch_names : list of str
+        The channel names of the data the events were detected on.
+    sfreq : float
+        The sampling rate of the data.
+    labels : str | array-like of str
+        The label of each event, or a single label for all events.
+        Default is ``'hfo'``.
+    peak_amplitudes : array-like of float | None
+        The peak amplitude of the detection statistic of each event.
+        If None (default), it is unknown and set to NaN.
+    freq_bands : array-like of float, shape (n_events, 2) | None
+        The low and high frequency (in Hz) of each event. If None
+        (default), it is unknown and set to NaN.
+
+    Attributes
+    ----------
+    starts, stops, ch_inds, labels, peak_amplitudes, freq_bands : np.ndarray
+        The columns of the table.
+    ch_names : list of str
+        The channel names.
+    sfreq : float
+        The sampling rate.
+    """
+
+    def __init__(self, starts, stops, ch_inds, ch_names: List[str],
+                 sfreq: float, labels: Union[str, List[str]] = 'hfo',
+                 peak_amplitudes=None, freq_bands=None):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.ch_inds = np.asarray(ch_inds, dtype=np.int32)
+        self.ch_names = list(ch_names)
+        self.sfreq = float(sfreq)
+
+        n_events = len(self.starts)
+        if isinstance(labels, str):
+            labels = [labels] * n_events
+        self.labels = np.asarray(labels, dtype=object)
+        if peak_amplitudes is None:
+            peak_amplitudes = np.full(n_events, np.nan)
+        self.peak_amplitudes = np.asarray(peak_amplitudes, dtype=np.float64)
+        if freq_bands is None:
+            freq_bands = np.full((n_events, 2), np.nan)
+        self.freq_bands = np.asarray(freq_bands,
+                                     dtype=np.float64).reshape(-1, 2)
+
+        columns = dict(stops=self.stops, ch_inds=self.ch_inds,
+                       labels=self.labels,
+                       peak_amplitudes=self.peak_amplitudes,
+                       freq_bands=self.freq_bands)
+        for name, column in columns.items():
+            if len(column) != n_events:
+                raise ValueError(f'All columns need to have one value per '
+                                 f'event. There are {n_events} starts, '
+                                 f'but {len(column)} {name}.')
+        if n_events and (self.ch_inds.min() < 0 or
+                         self.ch_inds.max() >= len(self.ch_names)):
+            raise ValueError(f'Channel indices need to be between 0 '
+                             f'and {len(self.ch_names) - 1}.')
+
+    def __len__(self):
+        """Return the number of events."""
+        return len(self.starts)
+
+    def __repr__(self):
+        """Return a summary of the table."""
+        return (f'<HFOEventTable | {len(self)} events, '
+                f'{len(self.ch_names)} channels, sfreq: {self.sfreq} Hz>')
+
+    @property
+    def onset(self):
+        """Onset of each event in seconds."""
+        return self.starts / self.sfreq
+
+    @property
+    def duration(self):
+        """Duration of each event in seconds."""
+        return (self.stops - self.starts) / self.sfreq
+
+    @property
+    def channels(self):
+        """Channel name of each event."""
+        return np.asarray(self.ch_names, dtype=object)[self.ch_inds]
+
+    def to_annotations(self, orig_time=None):
+        """Convert the events to Annotations.
+
+        Parameters
+        ----------
+        orig_time : float | str | datetime | None
+            The ``orig_time`` of the Annotations. Default is None.
+
+        Returns
+        -------
+        annotations : instance of Annotations
+            One annotation per event, with the label as description and
+            the channel of the event as ``ch_names``.
+        """
+        ch_names = [[ch_name] for ch_name in self.channels]
+        return Annotations(onset=self.onset, duration=self.duration,
+                           description=self.labels.astype(str),
+                           ch_names=ch_names, orig_time=orig_time)
+
+    def to_data_frame(self):
+        """Convert the events to a BIDS ``annotations.tsv`` DataFrame.
+
+        Returns
+        -------
+        annot_df : pd.DataFrame
+            The annotations DataFrame, as created by
+            :func:`mne_hfo.create_annotations_df`.
+        """
+        annot_df = pd.DataFrame({
+            'onset': self.onset,
+            'duration': self.duration,
+            'label': self.labels.astype(str).astype(object),
+            'channels': self.channels,
+            'sample': self.starts,
+            'sfreq': np.full(len(self), self.sfreq),
+        }, columns=ANNOT_COLUMNS + ['sfreq'])
+        return annot_df
+
+    def to_sklearn(self, ch_names: Optional[List[str]] = None):
+        """Convert the events to the scikit-learn compatible list format.
+
+        Parameters
+        ----------
+        ch_names : list of str | None
+            The channels to list events for, in order. If None (default),
+            all channels in ``ch_names`` of the table.
+
+        Returns
+        -------
+        ch_results : np.ndarray of list of tuple
+            The ``(onset, offset, ch_name, label, sfreq)`` of the events
+            of each channel, or ``[(None, None, ch_name, None, None)]``
+            if a channel has no events. See
+            :func:`mne_hfo.sklearn.make_Xy_sklearn`.
+        """
+        if ch_names is None:
+            ch_names = self.ch_names
+        onsets = self.onset.tolist()
+        offsets = (self.stops / self.sfreq).tolist()
+        labels = self.labels.astype(str).tolist()
+
+        # positions of the events of each channel
+        ch_order = np.argsort(self.ch_inds, kind='stable')
+        ch_bounds = np.searchsorted(self.ch_inds[ch_order],
+                                    np.arange(len(self.ch_names) + 1))
+
+        ch_results = []
+        for ch_name in ch_names:
+            ch_idx = self.ch_names.index(ch_name)
+            inds = ch_order[ch_bounds[ch_idx]:ch_bounds[ch_idx + 1]]
+            if len(inds) == 0:
+                ch_results.append([(None, None, ch_name, None, None)])
+                continue
+            ch_results.append([(onsets[ind], offsets[ind], ch_name,
+                                labels[ind], self.sfreq)
+                               for ind in inds.tolist()])
+
+        ch_results = np.asarray(ch_results, dtype='object')
+        return ch_results
+
+
+def _concatenate_ch_events(ch_events, ch_names, sfreq, labels='hfo'):
+    """Concatenate the events of each channel into one sorted table.
+
+    Parameters
+    ----------
+    ch_events : list of dict
+        The ``starts``, ``stops``, ``peak_amplitudes`` and ``freq_bands``
+        arrays of the events of each channel, in order of ``ch_names``,
+        and optionally the ``labels`` of the events.
+    ch_names : list of str
+        The channel names.
+    sfreq : float
+        The sampling rate.
+    labels : str
+        The label of all events, if the channels do not have ``labels``.
+
+    Returns
+    -------
+    hfo_events : HFOEventTable
+        The events sorted by onset, then duration, then channel, which
+        is the order of :class:`mne.Annotations`.
+    """
+    n_events = [len(events['starts']) for events in ch_events]
+    columns = {key: np.concatenate([events[key] for events in ch_events])
+               for key in ['starts', 'stops', 'peak_amplitudes']}
+    columns['freq_bands'] = np.concatenate(
+        [events['freq_bands'] for events in ch_events]).reshape(-1, 2)
+    if all('labels' in events for events in ch_events):
+        columns['labels'] = np.concatenate(
+            [np.asarray(events['labels'], dtype=object)
+             for events in ch_events])
+    ch_inds = np.repeat(np.arange(len(ch_names)), n_events)
+
+    order = np.lexsort((ch_inds, columns['stops'] - columns['starts'],
+                        columns['starts']))
+    columns = {key: column[order] for key, column in columns.items()}
+    columns.setdefault('labels', labels)
+    return HFOEventTable(ch_inds=ch_inds[order], ch_names=ch_names,
+                         sfreq=sfreq, **columns)
+
+
+def _append_events(hfo_events, new_hfo_events):
+    """Append the events of one table to those of another table."""
+    columns = {key: np.concatenate((getattr(hfo_events, key),
+                                    getattr(new_hfo_events, key)))
+               for key in ['starts', 'stops', 'ch_inds', 'labels',
+                           'peak_amplitudes', 'freq_bands']}
+    return HFOEventTable(ch_names=hfo_events.ch_names,
+                         sfreq=hfo_events.sfreq, **columns)
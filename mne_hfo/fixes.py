@@ -0,0 +1,36 @@
+"""Compatibility with optional dependencies."""
+import os
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# numba is only used if installed, and can be disabled by setting the
+# MNE_HFO_USE_NUMBA environment variable to "false"
+has_numba = numba is not None and \
+    os.getenv('MNE_HFO_USE_NUMBA', 'true').lower() != 'false'
+
+
+def jit(**kwargs):
+    """Compile a function with numba, if it is used.
+
+    Parameters
+    ----------
+    **kwargs
+        Options of :func:`numba.jit`, in addition to ``nopython``,
+        ``nogil`` and ``cache``.
+
+    Returns
+    -------
+    decorator : callable
+        Returns the compiled function, or the function itself if numba
+        is not used.
+    """
+    kwargs = dict(dict(nopython=True, nogil=True, cache=True), **kwargs)
+
+    def _jit(func):
+        if not has_numba:
+            return func
+        return numba.jit(**kwargs)(func)
+    return _jit
@@ -1,6 +1,7 @@
 import json
 import os
 import platform
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Union, Optional
 
@@ -10,7 +11,7 @@ import pandas as pd
 from mne.utils import run_subprocess
 from mne_bids import read_raw_bids, get_entities_from_fname, BIDSPath
 
-from mne_hfo.config import ANNOT_COLUMNS
+from mne_hfo.config import ANNOT_COLUMNS, ACCEPTED_ANNOT_EXTENSIONS
 
 
 def _bids_validate(bids_root):
@@ -29,6 +30,54 @@ def _bids_validate(bids_root):
     run_subprocess(cmd, shell=shell)
 
 
+def _check_pyarrow_installed(ext):
+    """Raise an informative error if pyarrow is needed but missing."""
+    try:
+        import pyarrow  # noqa
+    except ImportError:
+        raise ImportError(f'Reading and writing annotations as "{ext}" '
+                          f'files requires pyarrow. Please install it '
+                          f'with "pip install pyarrow", or use ".tsv".')
+
+
+def _split_annot_fname(fname):
+    """Split the annotations file name into its basename and data extension.
+
+    Any extension other than the binary columnar formats, e.g. ``.json``
+    or no extension at all, refers to the ``.tsv`` file.
+    """
+    fname, ext = os.path.splitext(str(fname))
+    if ext not in ACCEPTED_ANNOT_EXTENSIONS:
+        ext = '.tsv'
+    return Path(fname), ext
+
+
+@lru_cache(maxsize=1024)
+def _read_sidecar_sfreq(json_fname: str, mtime: int) -> Optional[float]:
+    """Read the sampling rate in a sidecar file, cached per file version."""
+    with open(json_fname, 'r') as fin:
+        sidecar_json = json.load(fin)
+    return sidecar_json.get('SamplingFrequency')
+
+
+def _get_raw_sfreq(raw_fpath: BIDSPath) -> float:
+    """Get the sampling rate of a BIDS recording.
+
+    The sampling rate is read from the ``SamplingFrequency`` of the JSON
+    sidecar file of the recording, and the recording itself is only read
+    if the sidecar file does not exist or does not have it.
+    """
+    json_fname = raw_fpath.fpath.with_suffix('.json')
+    if json_fname.exists():
+        sfreq = _read_sidecar_sfreq(str(json_fname),
+                                    json_fname.stat().st_mtime_ns)
+        if sfreq is not None:
+            return float(sfreq)
+
+    raw = read_raw_bids(raw_fpath)
+    return raw.info['sfreq']
+
+
 def create_annotations_df(onset: List[float], duration: List[float],
                           ch_name: List[str], sfreq: Union[float, List[float]],
                           annotation_label: Optional[List[str]] = None) \
@@ -95,27 +144,22 @@ def create_annotations_df(onset: List[float], duration: List[float],
             raise ValueError(msg)
         label = annotation_label
 
-    # all description has the HFO events in there
-    channels = [[desc] for desc in ch_name]
-
-    # create the event dataframe according to BIDS events
-    annot_df = pd.DataFrame(data=np.column_stack([onset, duration, label,
-                                                  channels, sample, sfreq]),
-                            index=None,
-                            columns=ANNOT_COLUMNS + ['sfreq'])
-    print(annot_df.head())
-    annot_df = annot_df.astype({
-        'onset': 'float64',
-        'duration': 'float64',
-        'label': 'str',
-        'channels': 'object',
-        'sample': 'int',
-        'sfreq': 'float64',
-    })
+    # create the event dataframe according to BIDS events, where the
+    # channels column holds the channel name of each HFO
+    annot_df = pd.DataFrame({
+        'onset': np.asarray(onset, dtype='float64'),
+        'duration': np.asarray(duration, dtype='float64'),
+        'label': np.asarray(label, dtype='str').astype(object),
+        'channels': np.asarray(ch_name, dtype='str').astype(object),
+        'sample': sample,
+        'sfreq': np.asarray(sfreq, dtype='float64'),
+    }, columns=ANNOT_COLUMNS + ['sfreq'])
     return annot_df
 
 
-def read_annotations(fname: Union[str, Path], root: Path = None) \
+def read_annotations(fname: Union[str, Path], root: Path = None,
+                     columns: Optional[List[str]] = None,
+                     filters: Optional[list] = None) \
         -> pandas.core.frame.DataFrame:
     """Read annotations.tsv Derivative file.
 
@@ -125,10 +169,20 @@ def read_annotations(fname: Union[str, Path], root: Path = None) \
     Parameters
     ----------
     fname : str | pathlib.Path
-        The BIDS file path for the ``*annotations.tsv|json`` files.
+        The BIDS file path for the ``*annotations.tsv|json`` files. If
+        the extension is ``.parquet`` or ``.feather``, the annotations
+        are read from that binary columnar file instead of the ``.tsv``
+        file, which requires ``pyarrow``.
     root : str | pathlib.Path | None
         The root of the BIDS dataset. If None (default), will try
         to infer the BIDS root from the ``fname`` argument.
+    columns : list of str | None
+        The columns to read. If None (default), all columns are read.
+    filters : list of tuple | None
+        Row filters, such as ``[('channels', 'in', ['A1', 'A2'])]``,
+        used to only read the matching row groups and rows of a
+        ``.parquet`` file. See :func:`pyarrow.parquet.read_table`.
+        If None (default), all rows are read.
 
     Returns
     -------
@@ -140,11 +194,14 @@ def read_annotations(fname: Union[str, Path], root: Path = None) \
     ----------
     .. [1] https://docs.google.com/document/d/1PmcVs7vg7Th-cGC-UrX8rAhKUHIzOI-uIOh69_mvdlw/edit#  # noqa
     """
-    fname, ext = os.path.splitext(str(fname))
-    fname = Path(fname)
-    tsv_fname = fname.with_suffix('.tsv')
+    fname, ext = _split_annot_fname(fname)
+    data_fname = fname.with_suffix(ext)
     json_fname = fname.with_suffix('.json')
 
+    if filters is not None and ext != '.parquet':
+        raise ValueError(f'Filtering rows is only supported for ".parquet" '
+                         f'annotations, not "{ext}".')
+
     if root is None:
         fpath = fname
 
@@ -157,8 +214,16 @@ def read_annotations(fname: Union[str, Path], root: Path = None) \
         # BIDS root is its parent
         root = fpath.parent
 
-    # read the annotations.tsv file
-    annot_tsv = pd.read_csv(tsv_fname, delimiter='\t')
+    # read the annotations data file
+    if ext == '.tsv':
+        annot_tsv = pd.read_csv(data_fname, delimiter='\t', usecols=columns)
+    else:
+        _check_pyarrow_installed(ext)
+        if ext == '.parquet':
+            annot_tsv = pd.read_parquet(data_fname, engine='pyarrow',
+                                        columns=columns, filters=filters)
+        else:
+            annot_tsv = pd.read_feather(data_fname, columns=columns)
 
     # read the annotations.json file
     with open(json_fname, 'r') as fin:
@@ -177,12 +242,12 @@ def read_annotations(fname: Union[str, Path], root: Path = None) \
             f'Please set "root" kwarg.'
         )
 
-    # read data
-    raw = read_raw_bids(raw_fpath)
-    sfreq = raw.info['sfreq']
+    # get the sampling rate of the data
+    sfreq = _get_raw_sfreq(raw_fpath)
 
     # create sample column
-    annot_tsv['sample'] = annot_tsv['onset'] * sfreq
+    if 'onset' in annot_tsv.columns:
+        annot_tsv['sample'] = annot_tsv['onset'] * sfreq
     return annot_tsv
 
 
@@ -196,7 +261,11 @@ def write_annotations(annot_df: pd.DataFrame, fname: Union[str, Path],
     annot_df : pd.DataFrame
         The annotations DataFrame.
     fname : str | pathlib.Path
-        The BIDS filename to write annotations to.
+        The BIDS filename to write annotations to. If the extension is
+        ``.parquet`` or ``.feather``, the annotations are written to
+        that binary columnar file, which keeps the type of each column,
+        instead of a ``.tsv`` file. This requires ``pyarrow``. The
+        ``.json`` sidecar file is written for all formats.
     intended_for : str | pathlib.Path | BIDSPath
         The ``IntendedFor`` BIDS keyword corresponding to the
         ``Raw`` file that the Annotations were created from.
@@ -206,10 +275,11 @@ def write_annotations(annot_df: pd.DataFrame, fname: Union[str, Path],
         The description of the Annotations file. If None (default),
         will describe it as HFO events detected using mne-hfo.
     """
-    fname, ext = os.path.splitext(str(fname))
-    fname = Path(fname)
-    tsv_fname = fname.with_suffix('.tsv')
+    fname, annot_ext = _split_annot_fname(fname)
+    data_fname = fname.with_suffix(annot_ext)
     json_fname = fname.with_suffix('.json')
+    if annot_ext != '.tsv':
+        _check_pyarrow_installed(annot_ext)
 
     if description is None:
         description = 'HFO annotated events detected using ' \
@@ -228,15 +298,20 @@ def write_annotations(annot_df: pd.DataFrame, fname: Union[str, Path],
                            f'Please make sure it does.')
 
     # make sure parent directories exist
-    tsv_fname.parent.mkdir(parents=True, exist_ok=True)
+    data_fname.parent.mkdir(parents=True, exist_ok=True)
 
-    # write the dataframe itself as a tsv file
-    annot_df.to_csv(tsv_fname, sep='\t', index=False)
+    # write the dataframe itself
+    if annot_ext == '.tsv':
+        annot_df.to_csv(data_fname, sep='\t', index=False)
+    elif annot_ext == '.parquet':
+        annot_df.to_parquet(data_fname, engine='pyarrow', index=False)
+    else:
+        annot_df.reset_index(drop=True).to_feather(data_fname)
 
     # create annotations json
     annot_json = {
         'Description': description,
-        'IntendedFor': intended_for_path.basename,
+        'IntendedFor': intended_for_path.fpath.name,
         'Author': 'mne-hfo',
         'LabelDescription': {
             'hfo_<ch_name>': 'Generic HFO detected at channel name.',
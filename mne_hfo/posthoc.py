@@ -1,5 +1,4 @@
 import collections
-from datetime import datetime, timezone, timedelta
 from typing import List, Optional, Union
 
 import numpy as np
@@ -9,27 +8,60 @@ from mne_hfo.config import TIME_SCALE_TO_SECS
 from mne_hfo.utils import _check_df
 
 
-def _to_freq(x, rate: str = 's'):
-    """Convert a groupby DataFrame to rate.
+def _to_freq(count, duration, rate: str = 's'):
+    """Convert event counts over a duration to rate.
 
     Parameters
     ----------
-    x : pd.Series
-        The series of the group to compute frequency of occurrence.
+    count : int | np.ndarray
+        The number of events.
+    duration : float | np.ndarray
+        The duration (in seconds) over which the events were counted.
     rate : str
         One of ``s`` (second), ``m`` (minute), ``h`` (hour),
         ``d`` (day) to compute rate of the dataframe.
 
     Returns
     -------
-    rate : float
+    rate : float | np.ndarray
         The rate of the events per unit of time, selected
         by ``rate`` input.
     """
-    f = x.count() / x.mean()
+    f = np.divide(count, duration)
     return f / TIME_SCALE_TO_SECS[rate]
 
 
+def _encode_annot_channels(annot_df, ch_names):
+    """Encode the channel of each event as an index into channel names."""
+    ch_codes, all_ch_names = pd.factorize(annot_df['channels'], sort=True)
+    if ch_names is None:
+        return ch_codes, list(all_ch_names)
+
+    # search for channel names not inside pandas dataframe
+    if not all([name in all_ch_names for name in ch_names]):
+        raise ValueError('Not all channels are inside the '
+                         'annotation DataFrame.')
+
+    # map the codes to the position in ch_names, and -1 for the
+    # channels that are not selected
+    ch_names = list(ch_names)
+    ch_map = np.array([ch_names.index(name) if name in ch_names else -1
+                       for name in all_ch_names], dtype=int)
+    return ch_map[ch_codes], ch_names
+
+
+def _get_end_sec(annot_df, end_sec):
+    """Get the end time in seconds, defaulting to the last HFO onset."""
+    if end_sec is None:
+        end_sec = annot_df['onset'].max()
+    return float(end_sec)
+
+
+def _in_time_range(onsets, end_sec):
+    """Select the HFOs with an onset between 0 and ``end_sec`` seconds."""
+    return (onsets >= 0) & (onsets <= end_sec)
+
+
 def compute_chs_hfo_rates(annot_df: pd.DataFrame,
                           rate: str,
                           ch_names: Optional[List[str]] = None,
@@ -56,7 +88,8 @@ def compute_chs_hfo_rates(annot_df: pd.DataFrame,
     end_sec : float | None
         The end time (in seconds) of the dataset that HFOs were computed on.
         If None (default), then will take the last detected HFO as the end
-        time point.
+        time point. HFOs with an onset before 0 or after ``end_sec`` are
+        not counted, as in :func:`compute_chs_hfo_rates_over_time`.
     verbose : bool
         Verbosity.
 
@@ -68,127 +101,103 @@ def compute_chs_hfo_rates(annot_df: pd.DataFrame,
     See Also
     --------
     mne_hfo.io.read_annotations : Reading in annotations.tsv file as DataFrame.
-
-    References
-    ----------
-    .. [1] https://stackoverflow.com/questions/66143839/computing-rate-of-occurrences-per-unit-of-time-in-a-pandas-dataframe  # noqa
+    compute_chs_hfo_rates_over_time : HFO rates per channel in bins of time.
     """
     annot_df = _check_df(annot_df, df_type='annotations')
-
-    # store channel rates over sliding window
-    ch_hfo_rates = collections.defaultdict(list)
-
-    # start timestamp with current time
-    ref_timestamp = datetime.now(tz=timezone.utc)
-    onset_tdelta = pd.to_timedelta(annot_df['onset'], unit='s')  # type: ignore
-    annot_df['timestamp'] = ref_timestamp + onset_tdelta
+    ch_codes, ch_names = _encode_annot_channels(annot_df, ch_names)
 
     # get the end point in seconds
-    if end_sec is None:
-        end_timestamp = annot_df['timestamp'].max()
-    else:
-        end_timestamp = ref_timestamp + timedelta(seconds=end_sec)
-
-    # get end time in seconds
-    annot_df['end_time'] = \
-        (end_timestamp - ref_timestamp).total_seconds()  # type: ignore
-
+    end_sec = _get_end_sec(annot_df, end_sec)
     if verbose:
-        print(f'Beginning timestamp: {ref_timestamp}')
-        print(f'Got end timestamp of: {end_timestamp}')
-
-    # set timestamp as the datetime index to allow resampling
-    annot_df.set_index('timestamp', inplace=True)  # type: ignore
+        print(f'Got end time of: {end_sec} seconds')
 
-    # get all unique channels
-    if ch_names is None:
-        ch_names = annot_df['channels'].unique()  # type: ignore
-    else:
-        # search for channel names not inside pandas dataframe
-        if not all([name in annot_df['channels'] for name in ch_names]):
-            raise ValueError('Not all channels are inside the '
-                             'annotation DataFrame.')
+    # count the HFOs of every channel at once
+    onsets = annot_df['onset'].to_numpy(dtype=float)
+    keep = (ch_codes >= 0) & _in_time_range(onsets, end_sec)
+    counts = np.bincount(ch_codes[keep], minlength=len(ch_names))
+    rates = _to_freq(counts, end_sec, rate=rate)
 
-    for idx, group in annot_df.groupby(['channels']):
-        # get channel name
-        ch_name = group['channels'].values[0]
-
-        if ch_name not in ch_names:  # type: ignore
+    # store channel rates
+    ch_hfo_rates = collections.defaultdict(list)
+    for ch_name, count, result in zip(ch_names, counts, rates):
+        if count == 0:
             continue
-
-        # resample datetime indices over a certain frequency
-        # so we can now count the number of HFO occurrences in a
-        # set time frame
-        # dt_idx = pd.date_range(ref_timestamp, end_timestamp, freq=rate)
-        # group = group.reindex(dt_idx, fill_value=np.nan)
-
-        # see Reference [1] where we compute rate of occurrence
-        result = group.end_time.agg(lambda x: _to_freq(x, rate=rate))
         if verbose:
             print(f'Found HFO rate per {rate} for {ch_name} as {result}')
-
-        # now compute the rate in this group
         ch_hfo_rates[ch_name] = result
 
-        # if not over_time:
-        # ch_hfo_rates[ch_name] = ch_hfo_rates[ch_name].count()
-
     return ch_hfo_rates
 
 
-def _join_times(df: pd.DataFrame) -> pd.DataFrame:
-    """Join together start and end times sorted in order.
+def compute_chs_hfo_rates_over_time(annot_df: pd.DataFrame,
+                                    rate: str,
+                                    bin_sec: float,
+                                    ch_names: Optional[List[str]] = None,
+                                    end_sec: float = None) -> pd.DataFrame:
+    """Compute channel HFO rates in consecutive bins of time.
 
-    Creates a second column ``what`` that marks +1/-1 for start/end times
-    to keep track of how many intervals are overlapping. Then a ``newwin``
-    column is added to identify the beginning of a new non-overlapping time interval
-    and a ``group`` column is added to mark the rows that belong to the same
-    overlapping time interval.
-
-    This ``group`` column is added to the original dataframe.
+    This function will assume that each row is another
+    HFO event. If you want to pre-process the HFOs that
+    in some way overlap, do so beforehand.
 
     Parameters
     ----------
-    df : pd.DataFrame
+    annot_df : pd.DataFrame
+        The DataFrame corresponding to the ``annotations.tsv`` file.
+    rate : str
+        The frequency at which to compute the HFO rate.
+        One of ``s`` (second), ``m`` (minute), ``h`` (hour),
+        ``d`` (day) to compute rate of the dataframe.
+    bin_sec : float
+        The length (in seconds) of each bin of time. The last bin
+        is shorter if ``end_sec`` is not a multiple of ``bin_sec``.
+    ch_names : list of str | None
+        A list of channel names to compute rates for, in order of the
+        rows of the output. Default = None will compute rate for all
+        channels present in the ``annot_df``, sorted by name.
+    end_sec : float | None
+        The end time (in seconds) of the dataset that HFOs were computed on.
+        If None (default), then will take the last detected HFO as the end
+        time point. HFOs with an onset before 0 or after ``end_sec`` are
+        not counted, as in :func:`compute_chs_hfo_rates`, so the rates of
+        the bins add up to the rate over the whole dataset.
 
     Returns
     -------
-    res : pd.DataFrame
+    rates_df : pd.DataFrame
+        The HFO rates of shape (n_chs, n_bins), with the channel names
+        as index and the start of each bin (in seconds) as columns. It
+        uses the same unit as :func:`compute_chs_hfo_rates`, which is the
+        rate of a single bin spanning the whole recording.
 
-    References
-    ----------
-    .. [1] https://stackoverflow.com/questions/57804145/combining-rows-with-overlapping-time-periods-in-a-pandas-dataframe  # noqa
+    See Also
+    --------
+    compute_chs_hfo_rates : HFO rates per channel over the whole dataset.
     """
-    startdf = pd.DataFrame({  # type: ignore
-        'time': df['start_timestamp'],  # type: ignore
-        'what': 1})  # type: ignore
-    enddf = pd.DataFrame({  # type: ignore
-        'time': df['end_timestamp'],  # type: ignore
-        'what': -1})  # type: ignore
-
-    # create merged dataframe of start and end times that are
-    # sorted by timestamp
-    mergdf = pd.concat([startdf, enddf]).sort_values('time')
-
-    # get a running cumulative sum
-    mergdf['running'] = mergdf['what'].cumsum()  # type: ignore
+    if bin_sec <= 0:
+        raise ValueError(f'The bin length must be positive, not {bin_sec}.')
+    annot_df = _check_df(annot_df, df_type='annotations')
+    ch_codes, ch_names = _encode_annot_channels(annot_df, ch_names)
+    end_sec = _get_end_sec(annot_df, end_sec)
 
-    # assign groups to overlapping intervals
-    mergdf['newwin'] = (mergdf['running'].eq(1) &  # type: ignore
-                        mergdf['what'].eq(1))  # type: ignore
-    mergdf['group'] = mergdf['newwin'].cumsum()  # type: ignore
+    # bins of time, where the last bin includes the end point
+    n_bins = max(int(np.ceil(end_sec / bin_sec)), 1)
+    bin_starts = np.arange(n_bins) * bin_sec
+    bin_durations = np.minimum(bin_starts + bin_sec, end_sec) - bin_starts
 
-    # add the group assignments to the original dataframe
-    df['group'] = mergdf['group'].loc[mergdf['what'].eq(1)]  # type: ignore
+    onsets = annot_df['onset'].to_numpy(dtype=float)
+    bin_inds = np.minimum((onsets // bin_sec).astype(int), n_bins - 1)
+    keep = (ch_codes >= 0) & _in_time_range(onsets, end_sec)
 
-    # now group all overlapping intervals in the original dataframe
-    # agg_func_dict = {col: lambda x: set(x) for col in df.columns}
-    res = df.groupby('group').agg({'start_timestamp': 'first',
-                                   'end_timestamp': 'last',
-                                   'label': 'unique',
-                                   'ref_timestamp': 'first'})
+    # count the HFOs of every (channel, bin) pair at once
+    counts = np.bincount(ch_codes[keep] * n_bins + bin_inds[keep],
+                         minlength=len(ch_names) * n_bins)
+    counts = counts.reshape(len(ch_names), n_bins)
+    rates = _to_freq(counts, bin_durations, rate=rate)
 
-    return res
+    rates_df = pd.DataFrame(rates, index=pd.Index(ch_names, name='channels'),
+                            columns=pd.Index(bin_starts, name='bin_start'))
+    return rates_df
 
 
 def merge_overlapping_events(df: pd.DataFrame):
@@ -203,7 +212,15 @@ def merge_overlapping_events(df: pd.DataFrame):
     -------
     merged_df : pd.DataFrame
         New events dataframe with merged HFOs depending on
-        overlap criterion.
+        overlap criterion. The events are sorted by channel and onset,
+        and the ``label`` column holds the array of unique labels of
+        the events merged into each row.
+
+    Notes
+    -----
+    Events on the same channel are merged when one starts before (or
+    exactly when) another one stops. A merged event spans from the
+    earliest onset to the latest offset of the events it contains.
 
     See Also
     --------
@@ -214,38 +231,57 @@ def merge_overlapping_events(df: pd.DataFrame):
 
     # check dataframe
     df = _check_df(df, df_type='annotations')
+    if df.empty:
+        return df[orig_cols]
 
     # compute sfreq. XXX: assumes only 1 sampling rate
     sfreq = np.unique(df['sfreq'])[0]
 
-    # start/end timestamp with current time for every row
-    ref_timestamp = datetime.now(tz=timezone.utc)
-    onset_tdelta = pd.to_timedelta(df['onset'], unit='s')  # type: ignore
-    df['start_timestamp'] = ref_timestamp + onset_tdelta
-
-    duration_secs = pd.to_timedelta(df['duration'], unit='s')  # type: ignore
-    df['end_timestamp'] = df['start_timestamp'] + duration_secs
-    df['ref_timestamp'] = ref_timestamp
-
-    # first group by channels
-    # now join rows that are overlapping
-    merged_df = df.groupby(['channels']).apply(  # type: ignore
-        _join_times
-    ).reset_index().drop('group', axis=1)
-
-    # get the old columns back and drop the intermediate computation columns
-    merged_df['duration'] = (merged_df['end_timestamp'] -
-                             merged_df['start_timestamp']).dt.total_seconds()
-    merged_df['onset'] = (merged_df['start_timestamp'] -
-                          merged_df['ref_timestamp']).dt.total_seconds()
-    merged_df['sample'] = merged_df['onset'] * sfreq
+    # sort the events by channel, then onset
+    ch_codes, ch_names = pd.factorize(df['channels'], sort=True)
+    onsets = df['onset'].to_numpy(dtype=float)
+    offsets = onsets + df['duration'].to_numpy(dtype=float)
+    order = np.lexsort((onsets, ch_codes))
+    ch_codes = ch_codes[order]
+    onsets = onsets[order]
+    offsets = offsets[order]
+
+    # sweep over the events of each channel: an event starts a new
+    # merged event if it starts after all previous events stopped
+    is_first = np.ones(len(df), dtype=bool)
+    ch_bounds = np.flatnonzero(np.diff(ch_codes, prepend=-1, append=-1))
+    for ch_start, ch_stop in zip(ch_bounds[:-1], ch_bounds[1:]):
+        prev_offsets = np.maximum.accumulate(offsets[ch_start:ch_stop - 1])
+        is_first[ch_start + 1:ch_stop] = onsets[ch_start + 1:ch_stop] > \
+            prev_offsets
+    first_inds = np.flatnonzero(is_first)
+    merged_onsets = onsets[first_inds]
+    merged_offsets = np.maximum.reduceat(offsets, first_inds)
+
+    # unique labels of each merged event, in order of appearance
+    merge_inds = np.empty(len(df), dtype=int)
+    merge_inds[order] = np.cumsum(is_first) - 1
+    merged_labels = pd.DataFrame({'merge_ind': merge_inds,
+                                  'label': df['label'].to_numpy()})
+    merged_labels = merged_labels.drop_duplicates().sort_values(
+        'merge_ind', kind='stable')
+    label_bounds = np.flatnonzero(np.diff(merged_labels['merge_ind'],
+                                          prepend=-1, append=-1))
+    labels = merged_labels['label'].to_numpy()
+    merged_labels = pd.Series([
+        labels[start:stop] for start, stop in
+        zip(label_bounds[:-1].tolist(), label_bounds[1:].tolist())],
+        dtype=object)
 
     # XXX: need to enable different sfreqs maybe
-    print(sfreq)
-    print(merged_df)
-    merged_df['sfreq'] = sfreq
-    merged_df.drop(['start_timestamp', 'end_timestamp', 'ref_timestamp'],
-                   axis=1, inplace=True)
+    merged_df = pd.DataFrame({
+        'onset': merged_onsets,
+        'duration': merged_offsets - merged_onsets,
+        'label': merged_labels,
+        'channels': ch_names[ch_codes[first_inds]],
+        'sample': merged_onsets * sfreq,
+        'sfreq': sfreq,
+    })
     merged_df = merged_df[orig_cols]
 
     return merged_df
@@ -425,11 +461,9 @@ def match_detected_annotations(
     # else if prediction yields no events, return structured dataframe
     # containing just true indices
     elif ypred_annot_df.empty:
-        match_df = pd.DataFrame(columns=('true_index', 'pred_index'))
-        for ind, row in ytrue_annot_df.iterrows():
-            match_df.loc[ind] = [ind, None]
-        match_df.apply(pd.to_numeric, errors="coerce",
-                       downcast="float")
+        match_df = pd.DataFrame(
+            {'true_index': ytrue_annot_df.index.to_numpy(dtype=float),
+             'pred_index': np.nan}, index=ytrue_annot_df.index)
         return match_df
 
     # make sure columns match what is needed
@@ -502,82 +536,93 @@ def _match_detections_overlap(gs_df, check_df, margin, cols):
                          f'"offset" columns (in seconds).It '
                          f'has columns: {check_df.columns}')
 
-    # List of tuples to populate the output DataFrame
-    match_indices = []
-
-    # Convert the DataFrames that are expensive to manipulate into a list
-    # of tuples (index, onset, offset, ch_name)
-    # Pandas does not care about column order, but since we are changing
-    # the DataFrames to numpy, we need to track the column order
-    gs_cols = gs_df.columns
-    check_cols = check_df.columns
-    gs_keep_inds = (gs_cols.get_loc("onset"),
-                    gs_cols.get_loc("offset"),
-                    gs_cols.get_loc("channels"))
-    check_keep_inds = (check_cols.get_loc("onset"),
-                       check_cols.get_loc("offset"),
-                       check_cols.get_loc("channels"))
-    gs_numpy = gs_df.to_numpy()[:, gs_keep_inds]
-    gs_numpy = [[i, onset, offset, ch_name] for
-                i, (onset, offset, ch_name)
-                in enumerate(gs_numpy)]
-    check_numpy = check_df.to_numpy()[:, check_keep_inds]
-    check_numpy = [[i, onset, offset, ch_name] for
-                   i, (onset, offset, ch_name)
-                   in enumerate(check_numpy)]
-
-    # TODO: If there is a way to subset by channel, we can speed
-    #  up the loop
-
-    # Now we can iterate
-    for gs_hfo in gs_numpy:
-        gs_ind, gs_onset, gs_offset, gs_ch_name = gs_hfo
-        check_window = (gs_onset - margin, gs_onset + margin)
-        # Subset to the same channel and has onset within the expected window
-        check_numpy_channel = [x for x in check_numpy
-                               if (x[3] == gs_ch_name and
-                                   (x[1] > check_window[0] or
-                                    x[1] < check_window[1]))]
-        # check if nothing meets this criteria
-        if not check_numpy_channel:
-            match_indices.append((gs_ind, None))
+    n_gs = len(gs_df)
+    if n_gs == 0:
+        return pd.DataFrame(columns=cols)
+
+    # events are matched by their position in the DataFrames
+    gs_onsets = gs_df['onset'].to_numpy(dtype=float)
+    gs_offsets = gs_df['offset'].to_numpy(dtype=float)
+    check_onsets = check_df['onset'].to_numpy(dtype=float)
+    check_offsets = check_df['offset'].to_numpy(dtype=float)
+    gs_chs, check_chs = _encode_channels(gs_df['channels'],
+                                         check_df['channels'])
+
+    # best matching check index for each gold standard event
+    best_inds = np.full(n_gs, np.nan)
+    for ch_code in np.unique(gs_chs):
+        gs_inds = np.flatnonzero(gs_chs == ch_code)
+        # sort the check events of this channel by onset
+        check_inds = np.flatnonzero(check_chs == ch_code)
+        check_inds = check_inds[np.argsort(check_onsets[check_inds],
+                                           kind='stable')]
+        if len(check_inds) == 0:
             continue
-        potential_matches = []
-        # else, see if there is overlap
-        for check_hfo in check_numpy_channel:
-            check_ind, check_onset, check_offset, check_ch_name = check_hfo
-            gs_win = (gs_onset, gs_offset)
-            check_win = (check_onset, check_offset)
-            if _check_detection_overlap(gs_win, check_win):
-                potential_matches.append(check_hfo)
-        if not potential_matches:
-            match_indices.append((gs_ind, None))
-        elif len(potential_matches) == 1:
-            match_indices.append((gs_ind, potential_matches[0][0]))
-        else:
-            # more than one match, find closest
-            match_indices.append(_find_best_overlap(gs_hfo, potential_matches))
-
-    if not match_indices:
-        match_df = pd.DataFrame(columns=cols)
-    else:
-        match_df = pd.DataFrame(match_indices, columns=cols).apply(
-            pd.to_numeric, errors="coerce", downcast="float")
+
+        ch_best_inds = _match_sorted_events(
+            gs_onsets[gs_inds], gs_offsets[gs_inds],
+            check_onsets[check_inds], check_offsets[check_inds],
+            tie_breaker=check_inds)
+        has_match = ch_best_inds >= 0
+        best_inds[gs_inds[has_match]] = check_inds[ch_best_inds[has_match]]
+
+    match_df = pd.DataFrame({cols[0]: np.arange(n_gs),
+                             cols[1]: best_inds}).apply(
+        pd.to_numeric, errors="coerce", downcast="float")
     return match_df
 
 
-def _find_best_overlap(gs, check_list):
-    """Find best overlap from an ideal (gs) and a possible list."""
-    gs_ind, gs_onset, gs_offset, _ = gs
-    gs_point = np.array([gs_onset, gs_offset])
-    dist = np.inf
-    best_inds = (gs_ind, None)
-    for check_hfo in check_list:
-        check_ind, check_onset, check_offset, _ = check_hfo
-        check_point = np.array([check_onset, check_offset])
-        # Using distance of the points as the metric
-        new_dist = np.linalg.norm(gs_point - check_point)
-        if new_dist < dist:
-            dist = new_dist
-            best_inds = (gs_ind, check_ind)
+def _encode_channels(gs_chs, check_chs):
+    """Encode the channels of two sets of events as shared integer codes."""
+    codes = dict()
+
+    def _encode(chs):
+        # channels may be stored as lists, which are not hashable
+        return np.array([
+            codes.setdefault(tuple(ch) if isinstance(ch, list) else ch,
+                             len(codes)) for ch in chs], dtype=int)
+    return _encode(gs_chs), _encode(check_chs)
+
+
+def _match_sorted_events(gs_onsets, gs_offsets, check_onsets, check_offsets,
+                         tie_breaker):
+    """Find the closest overlapping check event of each reference event.
+
+    The check events must be sorted by onset. Two events overlap if
+    they share at least one time point, and among several overlapping
+    check events, the closest one in (onset, offset) is picked, with
+    ties going to the check event with the lowest ``tie_breaker``.
+
+    Returns
+    -------
+    best_inds : np.ndarray of int
+        Index into the check events of the match of each reference
+        event, or -1 if there is none.
+    """
+    # the overlapping check events start before the reference event
+    # stops, and are after the first check event that could still
+    # be ongoing when the reference event starts
+    stops = np.searchsorted(check_onsets, gs_offsets, side='right')
+    starts = np.searchsorted(np.maximum.accumulate(check_offsets),
+                             gs_onsets, side='left')
+    n_candidates = np.maximum(stops - starts, 0)
+
+    # expand all (reference, candidate) pairs
+    gs_inds = np.repeat(np.arange(len(gs_onsets)), n_candidates)
+    pair_offsets = np.cumsum(n_candidates) - n_candidates
+    cand_inds = np.arange(n_candidates.sum()) - \
+        np.repeat(pair_offsets - starts, n_candidates)
+    is_overlap = check_offsets[cand_inds] >= gs_onsets[gs_inds]
+    gs_inds = gs_inds[is_overlap]
+    cand_inds = cand_inds[is_overlap]
+
+    # pick the closest candidate of each event
+    dist = np.sqrt((gs_onsets[gs_inds] - check_onsets[cand_inds]) ** 2 +
+                   (gs_offsets[gs_inds] - check_offsets[cand_inds]) ** 2)
+    order = np.lexsort((tie_breaker[cand_inds], dist, gs_inds))
+    is_first = np.diff(gs_inds[order], prepend=-1) != 0
+    best = order[is_first]
+
+    best_inds = np.full(len(gs_onsets), -1)
+    best_inds[gs_inds[best]] = cand_inds[best]
     return best_inds
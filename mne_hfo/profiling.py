@@ -0,0 +1,64 @@
+"""Timing and counting the stages of fitting a detector."""
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from mne_hfo.config import PROFILE_COLUMNS, PROFILE_COUNTS
+
+
+class _StageRecorder:
+    """Record the wall time, CPU time and item counts of fit stages.
+
+    Each stage is recorded as a dictionary with the name of the stage,
+    the channels it covered, its ``wall_time`` and ``cpu_time`` in
+    seconds, and the counts set by the caller, see
+    ``PROFILE_COUNTS`` in :mod:`mne_hfo.config`.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether to record stages. If False, stages are not timed and
+        nothing is stored, so that recording costs nearly nothing.
+    callback : callable | None
+        Called with each record, once its stage finished in this
+        process, or once the records of another process were added
+        with ``extend``.
+    """
+
+    def __init__(self, enabled=True, callback=None):
+        self.enabled = enabled
+        self.callback = callback
+        self.records = []
+
+    @contextmanager
+    def stage(self, stage, channels=None):
+        """Time the code run in the context as one stage.
+
+        Yields the record of the stage, to which the caller adds counts,
+        or None if the recorder is disabled.
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        record = dict(stage=stage, channels=channels)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        yield record
+        record['wall_time'] = time.perf_counter() - wall_start
+        record['cpu_time'] = time.process_time() - cpu_start
+        self.extend([record])
+
+    def extend(self, records):
+        """Add records, e.g. of the stages run in a worker process."""
+        self.records.extend(records)
+        if self.callback is not None:
+            for record in records:
+                self.callback(record)
+
+    def to_data_frame(self):
+        """Create the DataFrame of all records, one row per stage."""
+        profile = pd.DataFrame(self.records, columns=PROFILE_COLUMNS)
+        # counts that do not apply to a stage are missing
+        return profile.astype({count: 'Int64' for count in PROFILE_COUNTS})
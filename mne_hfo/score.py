@@ -25,7 +25,7 @@ def true_positive_rate(y, y_pred):
     tp, fp, fn = _compute_score_data(y, y_pred, method='match-total')
 
     # return actual metric
-    return tp / (tp + fn)
+    return _compute_metrics(tp, fp, fn)['tpr']
 
 
 def precision(y, y_pred):
@@ -46,11 +46,8 @@ def precision(y, y_pred):
     """
     tp, fp, fn = _compute_score_data(y, y_pred, method='match-total')
 
-    if tp == 0:
-        return 0.
-
     # return actual metric
-    return tp / (tp + fp)
+    return _compute_metrics(tp, fp, fn)['precision']
 
 
 def false_negative_rate(y, y_pred):
@@ -72,7 +69,7 @@ def false_negative_rate(y, y_pred):
     tp, fp, fn = _compute_score_data(y, y_pred, method='match-total')
 
     # return actual metric
-    return fn / (fn + tp)
+    return _compute_metrics(tp, fp, fn)['fnr']
 
 
 def false_discovery_rate(y, y_pred):
@@ -93,11 +90,8 @@ def false_discovery_rate(y, y_pred):
     """
     tp, fp, fn = _compute_score_data(y, y_pred, method='match-total')
 
-    if fp == 0.:
-        return 0.
-
     # return the actual metric
-    return fp / (fp + tp)
+    return _compute_metrics(tp, fp, fn)['fdr']
 
 
 def accuracy(y, y_pred):
@@ -122,11 +116,95 @@ def accuracy(y, y_pred):
     """
     tp, fp, fn = _compute_score_data(y, y_pred, method='match-total')
     # return actual metric
-    return tp / (tp + fp + fn)
+    return _compute_metrics(tp, fp, fn)['accuracy']
 
 
-def _compute_score_data(y, y_pred, method):
-    """Compute basic HFO scoring metrics."""
+def compute_score_report(y, y_pred):
+    """Compute all scoring metrics from a single matching of HFOs.
+
+    The HFOs are matched once, and the true positives, false positives
+    and false negatives are counted for every channel at once. Metrics
+    follow the same definitions as :func:`accuracy`,
+    :func:`true_positive_rate`, :func:`precision`,
+    :func:`false_negative_rate` and :func:`false_discovery_rate`.
+
+    Parameters
+    ----------
+    y : pd.DataFrame | list of list of tuple
+        Annotation Dataframe with actual labels, or the scikit-learn
+        compatible list of HFO events per channel.
+    y_pred : pd.DataFrame | list of list of tuple
+        Annotation Dataframe with predicted labels, or the scikit-learn
+        compatible list of HFO events per channel.
+
+    Returns
+    -------
+    report : dict
+        The counts ``'tp'``, ``'fp'`` and ``'fn'`` and the metrics
+        ``'accuracy'``, ``'tpr'``, ``'precision'``, ``'fnr'``, ``'fdr'``
+        and ``'f1'`` over all channels. The ``'channels'`` key holds a
+        DataFrame with the same columns for each channel with any
+        true or predicted HFO.
+    """
+    y, y_pred, overlap_df = _match_score_data(y, y_pred,
+                                              method='match-total')
+    has_true = overlap_df['true_index'].notna().to_numpy()
+    has_pred = overlap_df['pred_index'].notna().to_numpy()
+
+    # each matched event belongs to the channel of its true HFO, or
+    # of its predicted HFO if it is a false positive
+    ch_names = np.empty(len(overlap_df), dtype=object)
+    if has_true.any():
+        true_inds = overlap_df['true_index'].to_numpy()[has_true]
+        ch_names[has_true] = y['channels'].to_numpy()[true_inds.astype(int)]
+    if (~has_true).any():
+        pred_inds = overlap_df['pred_index'].to_numpy()[~has_true]
+        ch_names[~has_true] = \
+            y_pred['channels'].to_numpy()[pred_inds.astype(int)]
+    ch_codes, ch_names = pd.factorize(ch_names, sort=True)
+
+    # count all channels at once
+    n_chs = len(ch_names)
+    ch_counts = {
+        'tp': np.bincount(ch_codes[has_true & has_pred], minlength=n_chs),
+        'fp': np.bincount(ch_codes[has_pred & ~has_true], minlength=n_chs),
+        'fn': np.bincount(ch_codes[has_true & ~has_pred], minlength=n_chs),
+    }
+    ch_report = pd.DataFrame(
+        {**ch_counts, **_compute_metrics(**ch_counts)},
+        index=pd.Index(ch_names, name='channels'))
+
+    counts = {key: ch_count.sum() for key, ch_count in ch_counts.items()}
+    report = {**counts, **_compute_metrics(**counts)}
+    report['channels'] = ch_report
+    return report
+
+
+def _compute_metrics(tp, fp, fn):
+    """Compute the scoring metrics from counts of matched HFOs.
+
+    The counts can be arrays, e.g. one count per channel.
+    """
+    tp, fp, fn = np.asarray(tp), np.asarray(fp), np.asarray(fn)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            'accuracy': tp / (tp + fp + fn),
+            'tpr': tp / (tp + fn),
+            'precision': np.where(tp == 0, 0., tp / (tp + fp)),
+            'fnr': fn / (fn + tp),
+            'fdr': np.where(fp == 0, 0., fp / (fp + tp)),
+            'f1': 2 * tp / (2 * tp + fp + fn),
+        }
+    # return scalars for scalar counts
+    return {key: metric[()] for key, metric in metrics.items()}
+
+
+def _match_score_data(y, y_pred, method):
+    """Match HFO events of the true and predicted labels.
+
+    Both are returned as annotations DataFrames indexed by the
+    position of each HFO, along with the matched indices.
+    """
     if isinstance(y, pd.DataFrame):
         y = _check_df(y, df_type='annotations')
     else:
@@ -139,7 +217,17 @@ def _compute_score_data(y, y_pred, method):
         # assume y is now in the form of list of (onset, offset) per channel
         y_pred = _convert_y_sklearn_to_annot_df(y_pred)
 
+    # matched indices are positions in the DataFrames
+    y = y.reset_index(drop=True)
+    y_pred = y_pred.reset_index(drop=True)
+
     overlap_df = match_detected_annotations(y, y_pred, method=method)
+    return y, y_pred, overlap_df
+
+
+def _compute_score_data(y, y_pred, method):
+    """Compute basic HFO scoring metrics."""
+    _, _, overlap_df = _match_score_data(y, y_pred, method=method)
 
     # get the indices from the match event overlap output
     y_true_series = overlap_df['true_index']
@@ -173,15 +261,13 @@ def _calculate_match_stats(ytrue_indices, ypred_indices):
     fn: int
         number of false negatives - i.e. prediction is false and actual is true
     """
-    # Convert the match df structure to two lists of booleans.
-    # (True) and negatives (False).
+    # Convert the match df structure to two arrays of booleans.
     # True if an index is present, False if Nan
-    y_true_bool = ytrue_indices.notna().to_list()
-    y_pred_bool = ypred_indices.notna().to_list()
+    y_true_bool = ytrue_indices.notna().to_numpy()
+    y_pred_bool = ypred_indices.notna().to_numpy()
 
     # compute true positive, false positive and false negative
-    label_pairs = tuple(zip(y_true_bool, y_pred_bool))
-    tp = np.sum([(t and p) for t, p in label_pairs])
-    fp = np.sum([(p and not t) for t, p in label_pairs])
-    fn = np.sum([(t and not p) for t, p in label_pairs])
+    tp = np.sum(y_true_bool & y_pred_bool)
+    fp = np.sum(y_pred_bool & ~y_true_bool)
+    fn = np.sum(y_true_bool & ~y_pred_bool)
     return tp, fp, fn
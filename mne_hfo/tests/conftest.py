@@ -5,6 +5,8 @@ import numpy as np
 import pytest
 import shutil as sh
 from pathlib import Path
+from mne import create_info
+from mne.io import RawArray, read_raw_fif
 from mne.utils import run_subprocess
 
 from mne_hfo.simulate import simulate_hfo, simulate_spike
@@ -98,6 +100,35 @@ def create_testing_eeg_data():
     return data, hfo_samps
 
 
+@pytest.fixture(scope="function")
+def create_testing_raw_file(tmp_path):
+    """Create recordings of noise with HFOs, saved to and read from FIF.
+
+    Returns a function creating a Raw that is not preloaded. Its data is
+    white noise of ``n_chs`` channels with a 100 samples burst of a sine
+    wave at ``hfo_freq`` Hz every ``hfo_interval`` seconds on all
+    channels, or ``data`` if passed.
+    """
+    fnames = iter(tmp_path / f'test{idx}_raw.fif' for idx in range(100))
+
+    def _create_raw_file(n_chs=2, duration=30, sfreq=2000, hfo_freq=150,
+                         hfo_interval=3, data=None):
+        if data is None:
+            rng = np.random.RandomState(0)
+            data = rng.randn(n_chs, sfreq * duration)
+            hfo = 5 * np.sin(2 * np.pi * hfo_freq * np.arange(100) / sfreq)
+            for start in range(sfreq // 2, data.shape[1] - sfreq,
+                               hfo_interval * sfreq):
+                data[:, start:start + len(hfo)] += hfo
+        ch_names = [chr(ord('a') + idx) for idx in range(len(data))]
+        info = create_info(sfreq=sfreq, ch_names=ch_names, ch_types='seeg')
+        fname = next(fnames)
+        RawArray(data, info=info, verbose=False).save(fname, verbose=False)
+        return read_raw_fif(fname, preload=False, verbose=False)
+
+    return _create_raw_file
+
+
 @pytest.fixture(scope="module")
 def create_testing_data():
     """Create testing data with certain frequencies."""
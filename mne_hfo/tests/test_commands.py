@@ -0,0 +1,118 @@
+"""Testing the batch detection over a BIDS dataset."""
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from mne_bids.copyfiles import copyfile_brainvision
+
+from mne_hfo.commands import main, run_bids_detection
+from mne_hfo.io import read_annotations
+
+ieeg_dir = Path('sub-01') / 'ses-interictalsleep' / 'ieeg'
+basename = 'sub-01_ses-interictalsleep_run-{}'
+
+
+def _add_run(root, run):
+    """Copy the recording of run 01 of the test dataset to another run."""
+    root = Path(root)
+    src = root / ieeg_dir / basename.format('01')
+    dest = root / ieeg_dir / basename.format(run)
+    copyfile_brainvision(f'{src}_ieeg.vhdr', f'{dest}_ieeg.vhdr')
+    for suffix in ['_ieeg.json', '_channels.tsv', '_events.tsv']:
+        shutil.copyfile(f'{src}{suffix}', f'{dest}{suffix}')
+
+    scans_fname = root / ieeg_dir.parent / \
+        'sub-01_ses-interictalsleep_scans.tsv'
+    with open(scans_fname, 'a', encoding='utf-8') as fout:
+        fout.write(f'\nieeg/{dest.name}_ieeg.vhdr\t'
+                   f'2013-12-07T09:29:20.000000Z')
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_run_bids_detection(n_jobs, test_bids_root, capsys):
+    """Test detecting HFOs in all runs, and skipping the ones done."""
+    root = Path(test_bids_root)
+    _add_run(root, '02')
+    out_dir = root / 'derivatives' / 'mne-hfo'
+    argv = [str(root), '--detector', 'rms', '--param', 'threshold=3',
+            '--param', 'filter_band=(80, 250)', '--n-jobs', str(n_jobs)]
+    assert main(argv) == 0
+    assert '[2/2]' in capsys.readouterr().out
+
+    manifest = pd.read_csv(out_dir / 'mne_hfo_manifest.tsv', sep='\t')
+    assert list(manifest['status']) == ['done', 'done']
+    annot_fnames = [out_dir / ieeg_dir / (basename.format(run) +
+                                          '_desc-rms_annotations.tsv')
+                    for run in ['01', '02']]
+    for annot_fname, n_events in zip(
+            annot_fnames, manifest.set_index('annotations').loc[
+                [fname.relative_to(out_dir).as_posix()
+                 for fname in annot_fnames], 'n_events']):
+        annot_df = read_annotations(annot_fname)
+        assert len(annot_df) == n_events > 0
+        assert set(annot_df['label']) == {'hfo'}
+
+    # runs that are done are skipped, unless they were removed
+    mtime = annot_fnames[0].stat().st_mtime_ns
+    annot_fnames[1].unlink()
+    manifest = run_bids_detection(
+        root, detector='rms', n_jobs=n_jobs, verbose=False,
+        detector_params=dict(threshold=3, filter_band=(80, 250)))
+    assert list(manifest['status']) == ['skipped', 'done']
+    assert annot_fnames[0].stat().st_mtime_ns == mtime
+    assert annot_fnames[1].exists()
+    assert len(pd.read_csv(out_dir / 'mne_hfo_manifest.tsv', sep='\t')) == 3
+
+    # other parameters, or overwrite, process all runs again
+    manifest = run_bids_detection(
+        root, detector='rms', n_jobs=n_jobs, verbose=False,
+        detector_params=dict(threshold=4, filter_band=(80, 250)))
+    assert list(manifest['status']) == ['done', 'done']
+    manifest = run_bids_detection(
+        root, detector='rms', n_jobs=n_jobs, verbose=False, overwrite=True,
+        detector_params=dict(threshold=4, filter_band=(80, 250)))
+    assert list(manifest['status']) == ['done', 'done']
+
+    # the detectors run on one CPU, unless n_jobs is passed
+    manifest = run_bids_detection(
+        root, detector='rms', n_jobs=n_jobs, verbose=False,
+        detector_params=dict(threshold=4, filter_band=(80, 250), n_jobs=2))
+    assert list(manifest['status']) == ['done', 'done']
+    assert main([str(root), '--param', 'n_jobs=2', '--quiet']) == 0
+
+    # only some subjects, with another detector
+    manifest = run_bids_detection(root, detector='multiband',
+                                  subjects=['02'], verbose=False)
+    assert len(manifest) == 0
+
+
+def test_run_bids_detection_errors(test_bids_root, capsys):
+    """Test failing runs are recorded and retried, and wrong arguments."""
+    root = Path(test_bids_root)
+    _add_run(root, '02')
+    # the data file of run 02 is missing
+    (root / ieeg_dir / (basename.format('02') + '_ieeg.eeg')).unlink()
+
+    argv = [str(root), '--detector', 'linelength', '--quiet']
+    assert main(argv) == 1
+    manifest = pd.read_csv(
+        root / 'derivatives' / 'mne-hfo' / 'mne_hfo_manifest.tsv', sep='\t')
+    assert list(manifest['status']) == ['done', 'error']
+    assert 'run-02' in manifest['raw'][1]
+    assert isinstance(manifest['error'][1], str)
+
+    # the failed run is retried
+    manifest = run_bids_detection(root, detector='linelength',
+                                  verbose=False)
+    assert list(manifest['status']) == ['skipped', 'error']
+
+    with pytest.raises(SystemExit):
+        main([str(root), '--param', 'thresh=3'])
+    assert 'Wrong parameters of the rms detector' in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        main([str(root), '--param', 'threshold'])
+    with pytest.raises(ValueError, match='Detector foo is not supported'):
+        run_bids_detection(root, detector='foo')
+    with pytest.raises(ValueError, match='extension .csv is not supported'):
+        run_bids_detection(root, extension='.csv')
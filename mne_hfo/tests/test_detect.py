@@ -1,19 +1,24 @@
 """Testing HFO detection algorithms."""
 
+import pickle
+
 import numpy as np
 import pytest
-from scipy.signal import butter, filtfilt
+from scipy.signal import butter, filtfilt, sosfilt
 from sklearn.utils.estimator_checks import parametrize_with_checks
 from mne.io import RawArray
 from mne import create_info
 
 from mne_hfo import LineLengthDetector, RMSDetector, \
-    HilbertDetector, CSDetector
+    HilbertDetector, CSDetector, MultiBandDetector
+from mne_hfo import base
+from mne_hfo.utils import compute_sliding_window_stat
 
 
 @parametrize_with_checks([
     RMSDetector(sfreq=2000, win_size=5),
     LineLengthDetector(sfreq=2000, win_size=5),
+    MultiBandDetector(sfreq=2000, win_size=5),
     # HilbertDetector(sfreq=2000),
 ])
 def test_sklearn_compat(estimator, check):
@@ -110,6 +115,424 @@ def test_detect_hfo_rms(create_testing_eeg_data, benchmark):
         assert (onset + duration) * raw.info['sfreq'] == exp_val[1]
 
 
+@pytest.mark.parametrize('Detector', [RMSDetector, LineLengthDetector])
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_detect_batched_channels(Detector, n_jobs, create_testing_eeg_data):
+    """Test that channel blocks give the same events as single channels."""
+    data, hfo_samps = create_testing_eeg_data
+    fs = 5000
+    rng = np.random.RandomState(0)
+    data = np.vstack([data, data + rng.randn(len(data)),
+                      np.roll(data, 1000)])
+    info = create_info(sfreq=fs, ch_names=['a', 'b', 'c'], ch_types='seeg')
+    raw = RawArray(data, info=info)
+
+    detector = Detector(sfreq=fs, win_size=62, n_jobs=n_jobs)
+    detector.fit(raw)
+    annots = detector.hfo_annotations
+
+    for idx, ch_name in enumerate(raw.ch_names):
+        ch_raw = raw.copy().pick([ch_name])
+        ch_detector = Detector(sfreq=fs, win_size=62, n_jobs=1).fit(ch_raw)
+        ch_annots = ch_detector.hfo_annotations
+        ch_mask = [ch_names == (ch_name,) for ch_names in annots.ch_names]
+        np.testing.assert_allclose(annots.onset[ch_mask], ch_annots.onset)
+        np.testing.assert_allclose(annots.duration[ch_mask],
+                                   ch_annots.duration)
+        np.testing.assert_allclose(detector.hfo_event_arr[idx],
+                                   ch_detector.hfo_event_arr[0])
+
+
+@pytest.mark.parametrize('Detector', [RMSDetector, LineLengthDetector])
+def test_detect_chunked_raw(Detector, create_testing_raw_file):
+    """Test fitting a Raw in chunks gives the same events as in memory."""
+    raw = create_testing_raw_file()
+    sfreq = raw.info['sfreq']
+
+    detector = Detector(sfreq=sfreq, n_jobs=1).fit(raw)
+    assert not raw.preload
+
+    # the last chunk is shorter than the others
+    chunk_detector = Detector(sfreq=sfreq, n_jobs=1,
+                              chunk_duration=7.3).fit(raw)
+    assert not raw.preload
+    np.testing.assert_allclose(chunk_detector.hfo_event_arr,
+                               detector.hfo_event_arr,
+                               rtol=1e-3, atol=1e-3 * np.abs(
+                                   detector.hfo_event_arr).max())
+    annots = detector.hfo_annotations
+    chunk_annots = chunk_detector.hfo_annotations
+    assert len(annots) > 0
+    np.testing.assert_array_equal(chunk_annots.onset, annots.onset)
+    np.testing.assert_array_equal(chunk_annots.duration, annots.duration)
+    assert list(chunk_annots.ch_names) == list(annots.ch_names)
+
+
+@pytest.mark.parametrize('event_arr_storage', ['float32', 'memmap', None])
+def test_detect_event_arr_storage(event_arr_storage, create_testing_eeg_data):
+    """Test storing the HFO statistic with less memory, or not at all."""
+    data, hfo_samps = create_testing_eeg_data
+    fs = 5000
+    data = np.vstack([data, np.roll(data, 1000)])
+    info = create_info(sfreq=fs, ch_names=['a', 'b'], ch_types='seeg')
+    raw = RawArray(data, info=info)
+
+    detector = RMSDetector(sfreq=fs, n_jobs=1).fit(raw)
+    store_detector = RMSDetector(sfreq=fs, n_jobs=1,
+                                 event_arr_storage=event_arr_storage)
+    store_detector.fit(raw)
+    np.testing.assert_array_equal(store_detector.hfo_annotations.onset,
+                                  detector.hfo_annotations.onset)
+
+    if event_arr_storage is None:
+        with pytest.raises(RuntimeError, match='was not stored'):
+            store_detector.hfo_event_arr
+        return
+
+    hfo_event_arr = store_detector.hfo_event_arr
+    if event_arr_storage == 'memmap':
+        assert isinstance(hfo_event_arr, np.memmap)
+    else:
+        assert hfo_event_arr.dtype == np.float32
+    np.testing.assert_allclose(hfo_event_arr, detector.hfo_event_arr,
+                               rtol=1e-6)
+
+
+@pytest.mark.parametrize('Detector', [RMSDetector, LineLengthDetector])
+@pytest.mark.parametrize('chunk_duration', [None, 7.3])
+def test_detect_dtype(Detector, chunk_duration, create_testing_raw_file):
+    """Test fitting in single precision gives the double precision events."""
+    raw = create_testing_raw_file()
+    sfreq = raw.info['sfreq']
+
+    detector = Detector(sfreq=sfreq, n_jobs=1,
+                        chunk_duration=chunk_duration).fit(raw)
+    single_detector = Detector(sfreq=sfreq, n_jobs=1, dtype='float32',
+                               event_arr_storage='float32',
+                               chunk_duration=chunk_duration).fit(raw)
+    hfo_event_arr = detector.hfo_event_arr
+    np.testing.assert_allclose(single_detector.hfo_event_arr, hfo_event_arr,
+                               atol=1e-5 * np.abs(hfo_event_arr).max())
+    assert len(detector.hfo_events_) > 0
+    np.testing.assert_array_equal(single_detector.hfo_events_.starts,
+                                  detector.hfo_events_.starts)
+    np.testing.assert_array_equal(single_detector.hfo_events_.stops,
+                                  detector.hfo_events_.stops)
+
+    with pytest.raises(ValueError, match='Data type float16'):
+        Detector(sfreq=sfreq, dtype='float16',
+                 chunk_duration=chunk_duration).fit(raw)
+
+
+def test_detect_predict_cached(create_testing_eeg_data, monkeypatch):
+    """Test that predict on the fit data does not fit again."""
+    data, hfo_samps = create_testing_eeg_data
+    fs = 5000
+    data = np.vstack([data, np.roll(data, 1000)])
+    info = create_info(sfreq=fs, ch_names=['a', 'b'], ch_types='seeg')
+    raw = RawArray(data, info=info)
+
+    detector = RMSDetector(sfreq=fs, n_jobs=1)
+    y_pred = detector.fit_predict(raw)
+    assert len(detector.hfo_annotations) > 0
+
+    # the fitted detector does not hold a copy of the data
+    assert len(pickle.dumps(detector)) < data.nbytes / 4
+
+    # the stored events are returned for the same data and parameters
+    fit_calls = []
+    fit = detector._fit
+
+    def _fit(X, y=None, X_valid=None):
+        fit_calls.append(X)
+        return fit(X, y, X_valid=X_valid)
+
+    monkeypatch.setattr(detector, '_fit', _fit)
+    new_y_pred = detector.predict(raw)
+    assert fit_calls == []
+    assert len(new_y_pred) == len(y_pred)
+    for ch_y, new_ch_y in zip(y_pred, new_y_pred):
+        assert list(map(tuple, ch_y)) == list(map(tuple, new_ch_y))
+
+    # changing the data or the parameters fits again
+    new_raw = raw.copy()
+    new_raw._data[0, 0] += 1
+    detector.predict(new_raw)
+    assert len(fit_calls) == 1
+    detector.predict(new_raw)
+    assert len(fit_calls) == 1
+    detector.set_params(threshold=2)
+    detector.predict(new_raw)
+    assert len(fit_calls) == 2
+
+    # data of another shape is only read to be fit, not to be compared
+    checksums = []
+    monkeypatch.setattr(base, '_compute_checksum', checksums.append)
+    detector.predict(new_raw.copy().crop(tmax=1))
+    assert len(fit_calls) == 3
+    assert [X.shape for X in checksums] == [(2, fs + 1)]
+    monkeypatch.undo()
+
+    # an array modified in place after the fit is fit again
+    detector = RMSDetector(sfreq=fs, n_jobs=1)
+    detector.fit(data)
+    data[0, :100] += 1
+    new_y_pred = detector.predict(data)
+    for ch_y, new_ch_y in zip(detector.fit_predict(data), new_y_pred):
+        assert list(map(tuple, ch_y)) == list(map(tuple, new_ch_y))
+
+
+@pytest.mark.parametrize('Detector', [RMSDetector, LineLengthDetector])
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_detect_profile(Detector, n_jobs, create_testing_raw_file):
+    """Test recording the time and item counts of the stages of fit."""
+    raw = create_testing_raw_file(n_chs=4, duration=10, hfo_freq=80,
+                                  hfo_interval=1)
+    sfreq = raw.info['sfreq']
+    n_samples = len(raw.ch_names) * raw.n_times
+
+    records = []
+    detector = Detector(sfreq=sfreq, n_jobs=n_jobs,
+                        profile=records.append).fit(raw)
+    profile = detector.fit_profile
+    assert len(profile) == len(records)
+    assert list(profile['stage'].unique()) == [
+        'validate', 'statistic', 'threshold', 'merge', 'events']
+    assert (profile['wall_time'] >= 0).all()
+
+    stages = profile.groupby('stage', sort=False)
+    counts = stages[['n_samples', 'n_windows', 'n_detections',
+                     'n_events']].sum()
+    assert counts.loc['validate', 'n_samples'] == n_samples
+    assert counts.loc['statistic', 'n_samples'] == n_samples
+    # each block of channels of a job counts the same windows
+    assert counts.loc['statistic', 'n_windows'] == \
+        detector.hfo_event_arr.shape[1] * n_jobs
+    assert counts.loc['threshold', 'n_detections'] == \
+        counts.loc['merge', 'n_detections']
+    assert counts.loc['merge', 'n_events'] == len(detector.hfo_events_)
+    assert counts.loc['events', 'n_events'] == len(detector.hfo_events_)
+    merge = profile[profile['stage'] == 'merge']
+    assert [chs[0] for chs in merge['channels']] == raw.ch_names
+
+    # the statistic of a Raw fit in chunks is recorded per chunk
+    profile = Detector(sfreq=sfreq, n_jobs=n_jobs, chunk_duration=3,
+                       profile=True).fit(raw).fit_profile
+    statistic = profile[profile['stage'] == 'statistic']
+    assert len(statistic) == 4
+    assert statistic['n_windows'].sum() == detector.hfo_event_arr.shape[1]
+
+    # nothing is recorded by default
+    detector = Detector(sfreq=sfreq, n_jobs=n_jobs).fit(raw)
+    assert detector.fit_profile_ is None
+    with pytest.raises(RuntimeError, match='were not profiled'):
+        detector.fit_profile
+
+
+@pytest.mark.parametrize('Detector, kwargs', [
+    (RMSDetector, dict(sfreq=5000)),
+    (LineLengthDetector, dict(sfreq=5000)),
+    (HilbertDetector, dict(filter_band=(200, 300), band_method='log'))])
+def test_detect_threshold_path(Detector, kwargs, create_testing_eeg_data,
+                               monkeypatch):
+    """Test detecting HFOs for many thresholds from one statistic."""
+    data, hfo_samps = create_testing_eeg_data
+    fs = 5000
+    data = np.vstack([data, np.roll(data, 1000)])
+    info = create_info(sfreq=fs, ch_names=['a', 'b'], ch_types='seeg')
+    raw = RawArray(data, info=info)
+    y = Detector(threshold=2, n_jobs=1, **kwargs).fit_predict(raw)
+
+    # nothing is detected above the last threshold
+    thresholds = [1, 2, 1000]
+    detector = Detector(n_jobs=1, event_arr_storage=None, **kwargs)
+    hfo_events, scores = detector.threshold_path(raw, thresholds, y=y)
+    assert detector.threshold == 3
+    assert detector.hfo_event_arr_ is None
+    assert list(scores.index) == thresholds
+    assert len(hfo_events[0]) > 0
+    assert len(hfo_events[-1]) == 0
+
+    for threshold, events in zip(thresholds, hfo_events):
+        threshold_detector = Detector(threshold=threshold, n_jobs=1,
+                                      **kwargs).fit(raw)
+        np.testing.assert_array_equal(
+            events.starts, threshold_detector.hfo_events_.starts)
+        np.testing.assert_array_equal(
+            events.channels, threshold_detector.hfo_events_.channels)
+        np.testing.assert_equal(scores.loc[threshold, 'f1'],
+                                threshold_detector.score(raw, y))
+
+    hfo_events, scores = detector.threshold_path(raw, thresholds)
+    assert len(hfo_events) == 3
+    assert scores is None
+
+    # the detector keeps its fit at its own threshold, which predict
+    # reuses
+    monkeypatch.setattr(detector, '_fit', None)
+    new_y = detector.predict(raw)
+    y = Detector(n_jobs=1, **kwargs).fit_predict(raw)
+    for ch_y, new_ch_y in zip(y, new_y):
+        assert list(map(tuple, ch_y)) == list(map(tuple, new_ch_y))
+
+
+@pytest.mark.parametrize('Detector', [RMSDetector, LineLengthDetector])
+def test_detect_baseline_duration(Detector, create_testing_raw_file):
+    """Test thresholds following a change of amplitude of the recording."""
+    raw = create_testing_raw_file(duration=60, hfo_freq=80)
+    sfreq = int(raw.info['sfreq'])
+    data = raw.get_data()
+    # the second half of the recording is 10 times louder
+    data[:, sfreq * 30:] *= 10
+    raw = create_testing_raw_file(data=data)
+
+    # the threshold over the whole recording misses the quiet HFOs
+    hfo_events = Detector(sfreq=sfreq, n_jobs=1).fit(raw).hfo_events_
+    assert len(hfo_events) > 0
+    assert np.all(hfo_events.starts >= sfreq * 30)
+
+    for baseline_mode in ['rolling', 'segmented']:
+        detector = Detector(sfreq=sfreq, n_jobs=1, baseline_duration=10,
+                            baseline_mode=baseline_mode).fit(raw)
+        assert np.any(detector.hfo_events_.starts < sfreq * 30)
+
+    # a baseline longer than the recording is the whole recording
+    long_events = Detector(sfreq=sfreq, n_jobs=1,
+                           baseline_duration=100).fit(raw).hfo_events_
+    np.testing.assert_array_equal(long_events.starts, hfo_events.starts)
+
+    # the baseline is computed from the statistic of all chunks
+    chunk_events = Detector(sfreq=sfreq, n_jobs=1, chunk_duration=7.3,
+                            baseline_duration=10).fit(raw).hfo_events_
+    np.testing.assert_array_equal(chunk_events.starts,
+                                  detector.hfo_events_.starts)
+
+
+@pytest.mark.parametrize('method, Detector', [('rms', RMSDetector),
+                                              ('line_length',
+                                               LineLengthDetector)])
+@pytest.mark.parametrize('chunk_duration', [None, 7.3])
+def test_detect_multi_band(method, Detector, chunk_duration,
+                           create_testing_raw_file):
+    """Test detecting in several bands like one detector per band."""
+    rng = np.random.RandomState(0)
+    sfreq = 2000
+    data = rng.randn(3, sfreq * 30)
+    # tapered, so that ripples do not leak into the fast ripple band
+    times = np.arange(100) / sfreq
+    ripple = 8 * np.hanning(100) * np.sin(2 * np.pi * 150 * times)
+    fast_ripple = 8 * np.hanning(100) * np.sin(2 * np.pi * 350 * times)
+    for start in range(sfreq // 2, data.shape[1] - sfreq, 3 * sfreq):
+        data[:, start:start + 100] += ripple
+        # fast ripples during the ripples of the first channel only
+        data[0, start + 50:start + 150] += fast_ripple
+        data[1, start + sfreq:start + sfreq + 100] += fast_ripple
+    raw = create_testing_raw_file(data=data)
+
+    filter_bands = [(80, 250), (250, 500)]
+    detector = MultiBandDetector(sfreq=sfreq, method=method, n_jobs=1,
+                                 cooccurrence_name=None,
+                                 chunk_duration=chunk_duration).fit(raw)
+    hfo_events = detector.hfo_events_
+    assert detector.hfo_event_arr.shape[-1] == 2
+    for band_idx, hfo_name in enumerate(['ripple', 'fastripple']):
+        band_detector = Detector(sfreq=sfreq, n_jobs=1,
+                                 filter_band=filter_bands[band_idx]).fit(raw)
+        np.testing.assert_allclose(detector.hfo_event_arr[..., band_idx],
+                                   band_detector.hfo_event_arr[..., 0],
+                                   rtol=1e-3, atol=1e-3 * np.abs(
+                                       band_detector.hfo_event_arr).max())
+        is_band = hfo_events.labels == hfo_name
+        band_events = band_detector.hfo_events_
+        assert len(band_events) > 0
+        np.testing.assert_array_equal(hfo_events.starts[is_band],
+                                      band_events.starts)
+        np.testing.assert_array_equal(hfo_events.stops[is_band],
+                                      band_events.stops)
+        np.testing.assert_array_equal(hfo_events.ch_inds[is_band],
+                                      band_events.ch_inds)
+        np.testing.assert_array_equal(hfo_events.freq_bands[is_band],
+                                      [filter_bands[band_idx]] * is_band.sum())
+
+    # overlapping ripples and fast ripples are merged into co-occurrences
+    detector = MultiBandDetector(threshold=5, sfreq=sfreq, method=method,
+                                 n_jobs=2,
+                                 chunk_duration=chunk_duration).fit(raw)
+    annot_df = detector.to_data_frame(format='bids')
+    n_events = annot_df.groupby(['channels', 'label']).size().to_dict()
+    assert n_events == {('a', 'frandr'): 10, ('b', 'fastripple'): 10,
+                        ('b', 'ripple'): 10, ('c', 'ripple'): 10}
+    is_cooccurrence = detector.hfo_events_.labels == 'frandr'
+    np.testing.assert_array_equal(
+        detector.hfo_events_.freq_bands[is_cooccurrence],
+        [(80, 500)] * is_cooccurrence.sum())
+
+    with pytest.raises(RuntimeError, match='does not support streaming'):
+        detector.partial_fit(data)
+    with pytest.raises(ValueError, match='one HFO name per filter band'):
+        MultiBandDetector(filter_bands=filter_bands, hfo_names=['ripple'])
+    with pytest.raises(ValueError, match='Method hilbert'):
+        MultiBandDetector(method='hilbert')
+
+
+@pytest.mark.parametrize('Detector', [RMSDetector, LineLengthDetector])
+def test_detect_partial_fit(Detector, create_testing_raw_file):
+    """Test streaming blocks of a recording through partial_fit."""
+    raw = create_testing_raw_file(duration=20)
+    sfreq = int(raw.info['sfreq'])
+    data = raw.get_data()
+
+    # replay the recording in blocks of 0.25 seconds
+    detector = Detector(sfreq=sfreq, win_size=50, filter_band=(80, 250))
+    block_size = sfreq // 4
+    new_starts = []
+    for start in range(0, raw.n_times, block_size):
+        block = raw.get_data(start=start, stop=start + block_size)
+        detector.partial_fit(block)
+        new_events = detector.new_hfo_events_
+        new_starts.extend(new_events.starts)
+        # events are emitted once their windows have all arrived
+        assert np.all(new_events.stops <= detector.n_samples_seen_)
+    assert detector.n_samples_seen_ == raw.n_times
+    hfo_events = detector.hfo_events_
+    assert len(hfo_events) == len(new_starts) > 0
+    np.testing.assert_array_equal(np.sort(hfo_events.starts),
+                                  np.sort(new_starts))
+    assert len(detector.hfo_annotations) == len(hfo_events)
+
+    # the baseline is the statistic of all windows of the stream
+    win_size, step_size = detector.win_size, detector.step_size
+    n_windows = (raw.n_times - win_size) // step_size + 1
+    sos = butter(4, (80, 250), btype='bandpass', fs=sfreq, output='sos')
+    filt_data = sosfilt(sos, data, axis=-1)
+    statistic = compute_sliding_window_stat(
+        filt_data[:, :(n_windows - 1) * step_size + win_size],
+        win_size=win_size, step_size=step_size,
+        method=Detector._window_stat)
+    np.testing.assert_allclose(detector.baseline_mean_,
+                               statistic.mean(axis=-1))
+    np.testing.assert_allclose(detector.baseline_std_,
+                               statistic.std(axis=-1))
+
+    # the HFOs detected by fit are detected by the stream as well
+    fit_starts = Detector(sfreq=sfreq, win_size=50, filter_band=(80, 250),
+                          n_jobs=1).fit(raw).hfo_events_.starts
+    assert np.abs(np.subtract.outer(fit_starts, hfo_events.starts)).min(
+        axis=1).max() < 50
+
+    # blocks need the same channels
+    with pytest.raises(ValueError, match='same channels'):
+        detector.partial_fit(data[:1, :block_size])
+
+    # fit starts over
+    detector.fit(raw)
+    detector.partial_fit(data[:, :block_size])
+    assert detector.n_samples_seen_ == block_size
+
+    with pytest.raises(RuntimeError, match='does not support streaming'):
+        HilbertDetector(filter_band=(80, 250)).partial_fit(raw)
+
+
 @pytest.mark.skip(reason='Not as sensitive, need to investigate why')
 def test_detect_hfo_hilbert(create_testing_eeg_data, benchmark):
     """Test HilbertDetector with simulated HFO.
@@ -0,0 +1,74 @@
+"""Testing the table of detected HFO events."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.testing import assert_array_equal, assert_array_almost_equal
+
+from mne_hfo import HFOEventTable, create_annotations_df
+from mne_hfo.events import _concatenate_ch_events
+from mne_hfo.sklearn import _make_ydf_sklearn
+
+
+def test_hfo_event_table():
+    """Test conversions of the HFO event table to other result types."""
+    sfreq = 1000
+    ch_names = ['A1', 'A2', 'A3']
+    ch_events = [
+        dict(starts=np.array([500, 100]), stops=np.array([600, 250]),
+             peak_amplitudes=np.array([2., 3.]),
+             freq_bands=np.array([[80., 90.], [100., 120.]])),
+        dict(starts=np.array([100]), stops=np.array([200]),
+             peak_amplitudes=np.array([4.]),
+             freq_bands=np.array([[80., 100.]])),
+        dict(starts=np.array([], dtype=int), stops=np.array([], dtype=int),
+             peak_amplitudes=np.array([]),
+             freq_bands=np.empty((0, 2))),
+    ]
+    hfo_events = _concatenate_ch_events(ch_events, ch_names, sfreq)
+    assert len(hfo_events) == 3
+    assert 'HFOEventTable | 3 events' in repr(hfo_events)
+
+    # events are sorted by onset, then duration, then channel
+    assert_array_equal(hfo_events.starts, [100, 100, 500])
+    assert_array_equal(hfo_events.channels, ['A2', 'A1', 'A1'])
+    assert_array_equal(hfo_events.peak_amplitudes, [4., 3., 2.])
+    assert_array_equal(hfo_events.freq_bands,
+                       [[80., 100.], [100., 120.], [80., 90.]])
+
+    # Annotations have the same events
+    annots = hfo_events.to_annotations()
+    assert_array_almost_equal(annots.onset, hfo_events.onset)
+    assert_array_almost_equal(annots.duration, hfo_events.duration)
+    assert [ch[0] for ch in annots.ch_names] == ['A2', 'A1', 'A1']
+
+    # the DataFrame is the one created from the Annotations
+    annot_df = create_annotations_df(
+        annots.onset, annots.duration, [ch[0] for ch in annots.ch_names],
+        annotation_label=annots.description, sfreq=sfreq)
+    pd.testing.assert_frame_equal(hfo_events.to_data_frame(), annot_df)
+
+    # the sklearn format lists the events of each channel
+    y = hfo_events.to_sklearn()
+    expected_y = _make_ydf_sklearn(annot_df, ch_names)
+    assert len(y) == len(expected_y)
+    for ch_y, expected_ch_y in zip(y, expected_y):
+        assert list(ch_y) == list(expected_ch_y)
+    assert y[2] == [(None, None, 'A3', None, None)]
+
+    # channels can be selected and ordered
+    y = hfo_events.to_sklearn(ch_names=['A3', 'A2'])
+    assert tuple(y[1][0]) == (0.1, 0.2, 'A2', 'hfo', 1000.)
+
+    # unknown amplitudes and frequency bands are NaN
+    hfo_events = HFOEventTable(starts=[0], stops=[10], ch_inds=[0],
+                               ch_names=ch_names, sfreq=sfreq)
+    assert np.isnan(hfo_events.peak_amplitudes).all()
+    assert hfo_events.freq_bands.shape == (1, 2)
+
+    with pytest.raises(ValueError, match='one value per event'):
+        HFOEventTable(starts=[0, 20], stops=[10], ch_inds=[0, 0],
+                      ch_names=ch_names, sfreq=sfreq)
+    with pytest.raises(ValueError, match='Channel indices need'):
+        HFOEventTable(starts=[0], stops=[10], ch_inds=[3],
+                      ch_names=ch_names, sfreq=sfreq)
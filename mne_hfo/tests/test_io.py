@@ -1,13 +1,16 @@
 """Testing reading, creating and writing of files."""
+import sys
 from pathlib import Path
 
 import pandas as pd
 import pytest
 from mne.utils import _TempDir
-from mne_bids import BIDSPath
+from mne_bids import BIDSPath, read_raw_bids
 
+import mne_hfo.io
 from mne_hfo import (create_annotations_df, read_annotations,
                      write_annotations)
+from mne_hfo.io import _get_raw_sfreq
 
 data_path = Path('data')
 subject = '01'
@@ -89,3 +92,75 @@ def test_create_annot_df():
                                          'to be the same as other arguments'):
         create_annotations_df(onset, duration, ch_name,
                               sfreq, annotation_label[0])
+
+
+@pytest.mark.parametrize('extension', ['.parquet', '.feather'])
+@pytest.mark.usefixtures('test_bids_root')
+def test_io_annot_df_binary(test_bids_root, extension):
+    """Test reading and writing annotations in binary columnar formats."""
+    pytest.importorskip('pyarrow')
+    sfreq = 150
+    onset = [1.5, 2.0, 3]
+    duration = [0.0, 0, 1.5]
+    ch_name = ['A1', 'A2', 'A3']
+    annotation_label = ['ripple', 'frandr', 'fast-ripple']
+    annot_df = create_annotations_df(onset, duration, ch_name,
+                                     sfreq, annotation_label)
+
+    annot_path = bids_path.copy().update(root=None, suffix='annotations',
+                                         extension=None, check=False)
+    out_fname = Path(test_bids_root) / 'derivatives' / 'sub-01' / \
+        (annot_path.basename + extension)
+    write_annotations(annot_df, fname=out_fname,
+                      intended_for=bids_path,
+                      root=test_bids_root)
+    assert out_fname.exists()
+    assert out_fname.with_suffix('.json').exists()
+
+    # column types are kept, and the sample column is recomputed
+    new_annot_df = read_annotations(fname=out_fname, root=test_bids_root)
+    pd.testing.assert_frame_equal(
+        new_annot_df.drop(columns='sample'), annot_df.drop(columns='sample'))
+
+    # only read a subset of columns
+    new_annot_df = read_annotations(fname=out_fname, root=test_bids_root,
+                                    columns=['onset', 'channels'])
+    assert list(new_annot_df.columns) == ['onset', 'channels', 'sample']
+
+    if extension == '.parquet':
+        new_annot_df = read_annotations(
+            fname=out_fname, root=test_bids_root,
+            filters=[('channels', 'in', ['A1', 'A3'])])
+        assert new_annot_df['channels'].tolist() == ['A1', 'A3']
+    else:
+        with pytest.raises(ValueError, match='Filtering rows is only'):
+            read_annotations(fname=out_fname, root=test_bids_root,
+                             filters=[('channels', '==', 'A1')])
+
+
+def test_io_annot_df_binary_requires_pyarrow(monkeypatch):
+    """Test that binary annotations need pyarrow."""
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    annot_df = create_annotations_df([1.5], [0.], ['A1'], 150)
+    with pytest.raises(ImportError, match='requires pyarrow'):
+        write_annotations(annot_df, fname='sub-01_annotations.parquet',
+                          intended_for=bids_path, root=data_path)
+
+
+@pytest.mark.usefixtures('test_bids_root')
+def test_get_raw_sfreq(test_bids_root, monkeypatch):
+    """Test getting the sampling rate of a recording from its sidecar."""
+    raw_fpath = bids_path.copy().update(root=test_bids_root)
+    sfreq = read_raw_bids(raw_fpath).info['sfreq']
+
+    # the sidecar file is used instead of reading the recording
+    def _read_raw_bids(bids_path):
+        raise AssertionError('The recording should not be read.')
+
+    monkeypatch.setattr(mne_hfo.io, 'read_raw_bids', _read_raw_bids)
+    assert _get_raw_sfreq(raw_fpath) == sfreq
+
+    # without a sidecar file, the recording is read
+    raw_fpath.fpath.with_suffix('.json').unlink()
+    with pytest.raises(AssertionError, match='should not be read'):
+        _get_raw_sfreq(raw_fpath)
@@ -9,8 +9,8 @@ from sklearn.model_selection import GridSearchCV
 
 from mne_hfo import (
     create_annotations_df, find_coincident_events,
-    compute_chs_hfo_rates, merge_overlapping_events,
-    LineLengthDetector)
+    compute_chs_hfo_rates, compute_chs_hfo_rates_over_time,
+    merge_overlapping_events, LineLengthDetector)
 from mne_hfo.config import TIME_SCALE_TO_SECS
 from mne_hfo.posthoc import match_detected_annotations
 from mne_hfo.score import (accuracy, false_negative_rate, false_discovery_rate,
@@ -108,6 +108,38 @@ def test_match_hfo_annotations():
                                    method="match-average")
 
 
+def test_match_hfo_annotations_closest():
+    """Test matching events to the closest overlap on the same channel."""
+    sfreq = 1000
+    onset1 = [1., 10., 1., 20.]
+    duration1 = [2., 2., 2., 1.]
+    ch_name1 = ['A1', 'A1', 'A2', 'A2']
+    annot_df1 = create_annotations_df(onset1, duration1, ch_name1, sfreq)
+
+    # several A1 events overlap the first reference event, the A2 event
+    # at 1 s is on a different channel than the second reference event
+    onset2 = [0.5, 1.2, 2.9, 10.5, 1.]
+    duration2 = [1., 2., 3., 0., 1.]
+    ch_name2 = ['A1', 'A1', 'A1', 'A2', 'A2']
+    annot_df2 = create_annotations_df(onset2, duration2, ch_name2, sfreq)
+
+    output_df_true = match_detected_annotations(annot_df1, annot_df2,
+                                                method="match-true")
+    expected_df_true = pd.DataFrame({
+        "true_index": [0, 1, 2, 3],
+        "pred_index": [1, None, 4, None]
+    }).apply(pd.to_numeric, errors="coerce", downcast="float")
+    pd.testing.assert_frame_equal(expected_df_true, output_df_true)
+
+    output_df_pred = match_detected_annotations(annot_df1, annot_df2,
+                                                method="match-pred")
+    expected_df_pred = pd.DataFrame({
+        "pred_index": [0, 1, 2, 3, 4],
+        "true_index": [0, 0, 0, None, 2]
+    }).apply(pd.to_numeric, errors="coerce", downcast="float")
+    pd.testing.assert_frame_equal(expected_df_pred, output_df_pred)
+
+
 def test_match_detections_empty():
     # First create two annotation dataframes with expected columns. We will
     # consider df1 to be ground truth and df2 to be the prediction
@@ -243,9 +275,24 @@ def test_merge_overlapping_hfos():
     new_annot_df = merge_overlapping_events(annot_df)
     assert new_annot_df.shape == (1, annot_df.shape[1])
     assert new_annot_df['onset'].values == [1.5]
-    assert new_annot_df['duration'].values == [0.55]
+    assert new_annot_df['duration'].values == [1.5]
     assert new_annot_df['channels'].values == ['A1']
 
+    # events on different channels are never merged
+    onset = [1.5, 2.0, 1.55, 1.7]
+    duration = [0.1, 1.0, 0.5, 0.4]
+    ch_name = ['A1', 'A1', 'A2', 'A1']
+    annotation_label = ['ripple', 'fastripple', 'ripple', 'ripple']
+    annot_df = create_annotations_df(onset, duration, ch_name, sfreq,
+                                     annotation_label)
+    annot_df['sample'] = annot_df['onset'] * sfreq
+    new_annot_df = merge_overlapping_events(annot_df)
+    np.testing.assert_allclose(new_annot_df['onset'], [1.5, 1.7, 1.55])
+    np.testing.assert_allclose(new_annot_df['duration'], [0.1, 1.3, 0.5])
+    assert list(new_annot_df['channels']) == ['A1', 'A1', 'A2']
+    assert [list(label) for label in new_annot_df['label']] == \
+        [['ripple'], ['fastripple', 'ripple'], ['ripple']]
+
 
 # parameters for testing HFO rates over units of time
 end_secs = [10, 20, 10.25, 50.5]
@@ -275,3 +322,43 @@ def test_metrics_df(end_sec, rate):
     # error if specifying channel names are not inside dataframe
     with pytest.raises(ValueError, match=''):
         compute_chs_hfo_rates(annot_df, rate=rate, ch_names=['A0', 'A1'])
+
+    chs_hfo_rates = compute_chs_hfo_rates(annot_df, rate=rate,
+                                          ch_names=['A1'], end_sec=end_sec)
+    assert list(chs_hfo_rates) == ['A1']
+
+
+def test_hfo_rates_over_time():
+    """Test HFO rates computed in bins of time."""
+    onset = [1.5, 2.0, 3, 5.5, 9.9, 12.]
+    duration = [0.1, 1.0, 1.0, 0.1, 0.1, 0.1]
+    ch_name = ['A1', 'A2', 'A3', 'A1', 'A1', 'A2']
+    sfreq = 1000
+
+    annot_df = create_annotations_df(onset, duration, ch_name, sfreq=sfreq)
+    rates_df = compute_chs_hfo_rates_over_time(annot_df, rate='s',
+                                               bin_sec=4, end_sec=10)
+    assert list(rates_df.index) == ['A1', 'A2', 'A3']
+    np.testing.assert_array_equal(rates_df.columns, [0, 4, 8])
+    # the last bin is only 2 seconds long, and the HFO after the end
+    # point is ignored
+    np.testing.assert_allclose(rates_df.to_numpy(), [[1 / 4, 1 / 4, 1 / 2],
+                                                     [1 / 4, 0, 0],
+                                                     [1 / 4, 0, 0]])
+
+    # the bins add up to the rate over the whole dataset, which does not
+    # count the HFO of A2 after the end point either
+    chs_hfo_rates = compute_chs_hfo_rates(annot_df, rate='m', end_sec=10)
+    np.testing.assert_allclose(chs_hfo_rates['A2'],
+                               (1 / 10) / TIME_SCALE_TO_SECS['m'])
+    rates_df = compute_chs_hfo_rates_over_time(
+        annot_df, rate='m', bin_sec=4, ch_names=['A3', 'A1', 'A2'],
+        end_sec=10)
+    bin_secs = np.array([4, 4, 2])
+    for ch_name in ['A1', 'A2', 'A3']:
+        np.testing.assert_allclose(
+            (rates_df.loc[ch_name] * bin_secs).sum() / 10,
+            chs_hfo_rates[ch_name])
+
+    with pytest.raises(ValueError, match='bin length must be positive'):
+        compute_chs_hfo_rates_over_time(annot_df, rate='s', bin_sec=0)
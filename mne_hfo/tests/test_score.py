@@ -1,6 +1,9 @@
+import numpy as np
+
 from mne_hfo import create_annotations_df
 from mne_hfo.score import accuracy, true_positive_rate, \
-    false_negative_rate, false_discovery_rate, precision
+    false_negative_rate, false_discovery_rate, precision, \
+    compute_score_report
 from mne_hfo.sklearn import _make_ydf_sklearn
 
 
@@ -94,3 +97,36 @@ def test_match_detection_scoring_sklearn():
 
     prec = precision(y_true, y_pred)
     assert prec == 0.75
+
+
+def test_compute_score_report():
+    """Test computing all metrics, per channel, from one matching."""
+    sfreq = 1000
+    onset1 = [1.5, 12.6, 22.342, 59.9, 3.]
+    offset1 = [6.7300, 14.870, 31.1, 81.2, 4.]
+    duration1 = [offset - onset for onset, offset in zip(onset1, offset1)]
+    ch_name1 = ['A1'] * 4 + ['A2']
+    annot_df1 = create_annotations_df(onset1, duration1, ch_name1, sfreq)
+
+    onset2 = [2, 12.3, 60.1, 98.3, 10.]
+    offset2 = [6.93, 15.12, 65.6, 101.45, 11.]
+    duration2 = [offset - onset for onset, offset in zip(onset2, offset2)]
+    ch_name2 = ['A1'] * 4 + ['A3']
+    annot_df2 = create_annotations_df(onset2, duration2, ch_name2, sfreq)
+
+    report = compute_score_report(annot_df1, annot_df2)
+    assert (report['tp'], report['fp'], report['fn']) == (3, 2, 2)
+    assert report['accuracy'] == accuracy(annot_df1, annot_df2)
+    assert report['tpr'] == true_positive_rate(annot_df1, annot_df2)
+    assert report['fnr'] == false_negative_rate(annot_df1, annot_df2)
+    assert report['fdr'] == false_discovery_rate(annot_df1, annot_df2)
+    assert report['precision'] == precision(annot_df1, annot_df2)
+    np.testing.assert_allclose(report['f1'], 0.6)
+
+    ch_report = report['channels']
+    assert list(ch_report.index) == ['A1', 'A2', 'A3']
+    np.testing.assert_array_equal(ch_report[['tp', 'fp', 'fn']],
+                                  [[3, 1, 1], [0, 0, 1], [0, 1, 0]])
+    np.testing.assert_allclose(ch_report['accuracy'], [0.6, 0, 0])
+    np.testing.assert_allclose(ch_report['precision'], [0.75, 0, 0])
+    assert np.isnan(ch_report.loc['A3', 'tpr'])
@@ -1,8 +1,16 @@
 import numpy as np
+import pytest
+from mne.filter import filter_data
+from scipy.signal import hilbert
 
 from mne_hfo.utils import (compute_rms, compute_line_length,
+                           compute_sliding_window_stat, compute_hilbert,
                            threshold_tukey, threshold_quian,
-                           _get_threshold_std, _band_zscore_detect)
+                           _get_threshold_std, _band_zscore_detect,
+                           apply_std, _filter_data, _filter_data_bands,
+                           _find_envelopes,
+                           _find_envelopes_jit, _group_windows,
+                           _group_windows_jit)
 
 
 def test_compute_rms(create_testing_data):
@@ -15,12 +23,185 @@ def test_compute_line_length(create_testing_data):
             round(58084.721256107114, 5))  # noqa
 
 
+@pytest.mark.parametrize('method', ['rms', 'line_length'])
+@pytest.mark.parametrize('win_size, step_size, n_times', [
+    (100, 25, 5000), (100, 25, 5013), (5, 2, 50), (6, 6, 64), (3, 1, 20)])
+def test_sliding_window_engines(method, win_size, step_size, n_times):
+    """Test vectorized windowing against the per-window loop."""
+    rng = np.random.RandomState(0)
+    data = rng.randn(3, n_times)
+    expected = compute_sliding_window_stat(data, win_size, step_size,
+                                           method=method, engine='loop')
+    stat = compute_sliding_window_stat(data, win_size, step_size,
+                                       method=method)
+    n_windows = int(np.ceil((n_times - win_size) / step_size)) + 1
+    assert stat.shape == (3, n_windows)
+    np.testing.assert_allclose(stat, expected, rtol=1e-10)
+
+    # a single channel gives the same result as a row of the 2D input
+    np.testing.assert_allclose(
+        compute_sliding_window_stat(data[1], win_size, step_size,
+                                    method=method), stat[1])
+
+    with pytest.raises(ValueError, match='engine'):
+        compute_sliding_window_stat(data, win_size, step_size,
+                                    method=method, engine='numba')
+
+
+# ----- Filtering and Hilbert -----
+@pytest.mark.parametrize('method', ['fir', 'iir'])
+@pytest.mark.parametrize('l_freq, h_freq', [(80, 250), (30, 100),
+                                            (250, None)])
+def test_filter_data_single_precision(method, l_freq, h_freq):
+    """Test filtering single precision data like mne does in double."""
+    rng = np.random.RandomState(0)
+    data = rng.randn(2, 5000)
+    expected = filter_data(data, 2000, l_freq, h_freq, method=method,
+                           verbose=False)
+    np.testing.assert_array_equal(
+        _filter_data(data, 2000, l_freq, h_freq, method=method), expected)
+
+    data_filt = _filter_data(data.astype(np.float32), 2000, l_freq, h_freq,
+                             method=method)
+    assert data_filt.dtype == np.float32
+    np.testing.assert_allclose(data_filt, expected,
+                               atol=1e-5 * np.abs(expected).max())
+
+
+@pytest.mark.parametrize('method', ['fir', 'iir'])
+@pytest.mark.parametrize('n_times', [1001, 5000])
+def test_filter_data_bands(method, n_times):
+    """Test filtering into several bands like filtering each band."""
+    rng = np.random.RandomState(0)
+    data = rng.randn(2, n_times)
+    filter_bands = [(80, 250), (250, 500), (30, None)]
+    data_bands = _filter_data_bands(data, 2000, filter_bands, method=method)
+    assert data_bands.shape == (3, 2, n_times)
+    for (l_freq, h_freq), data_filt in zip(filter_bands, data_bands):
+        expected = filter_data(data, 2000, l_freq, h_freq, method=method,
+                               verbose=False)
+        np.testing.assert_allclose(data_filt, expected, rtol=0,
+                                   atol=1e-12 * np.abs(expected).max())
+
+    data_bands = _filter_data_bands(data[0].astype(np.float32), 2000,
+                                    filter_bands, method=method)
+    assert data_bands.dtype == np.float32
+    assert data_bands.shape == (3, n_times)
+
+
+@pytest.mark.parametrize('band_shape', ['butter', 'rect', 'gaussian'])
+def test_compute_hilbert(band_shape):
+    """Test the Hilbert envelope of a filter bank on a burst."""
+    sfreq = 2000
+    times = np.arange(10 * sfreq) / sfreq
+    rng = np.random.RandomState(0)
+    data = 0.1 * rng.randn(len(times))
+    burst = (times > 4.9) & (times < 5.1)
+    data[burst] += np.sin(2 * np.pi * 120 * times[burst])
+
+    freq_cutoffs = np.arange(80, 200, 20)
+    freq_span = len(freq_cutoffs) - 1
+    hfx_bands = compute_hilbert(data, freq_cutoffs, freq_span, sfreq,
+                                band_shape=band_shape)
+    assert hfx_bands.shape == (freq_span, len(times))
+
+    # the burst stands out only in the bands that contain it
+    peak_band = np.argmax(hfx_bands[:, burst].mean(axis=1))
+    assert freq_cutoffs[peak_band] <= 120 <= freq_cutoffs[peak_band + 1]
+    assert hfx_bands[peak_band, burst].mean() > \
+        5 * hfx_bands[peak_band, ~burst].mean()
+
+    with pytest.raises(ValueError, match='Band shape'):
+        compute_hilbert(data, freq_cutoffs, freq_span, sfreq,
+                        band_shape='triangle')
+
+
+def test_compute_hilbert_iir():
+    """Test the Hilbert envelope against filtering each band with mne."""
+    sfreq = 2000
+    rng = np.random.RandomState(0)
+    data = rng.randn(10 * sfreq)
+    # narrow linear bands ring the longest
+    freq_cutoffs = np.concatenate([np.arange(80, 85), [100, 150, 250]])
+    freq_span = len(freq_cutoffs) - 1
+    hfx_bands = compute_hilbert(data, freq_cutoffs, freq_span, sfreq)
+
+    edge = sfreq // 2
+    for ind in range(freq_span):
+        band_sig = filter_data(data, sfreq, freq_cutoffs[ind],
+                               freq_cutoffs[ind + 1], method='iir',
+                               verbose=False)
+        band_sig = (band_sig - band_sig.mean()) / band_sig.std()
+        # the Hilbert transform of the band-passed signal with its edges
+        # reflected matches everywhere within 1% of the mean envelope
+        band_ext = np.pad(band_sig, edge, mode='reflect', reflect_type='odd')
+        expected = np.abs(hilbert(band_ext))[edge:-edge]
+        np.testing.assert_allclose(hfx_bands[ind], expected, rtol=0,
+                                   atol=0.01 * expected.mean())
+        # and away from the edges, where the wrap-around of the Hilbert
+        # transform of the unpadded signal does not reach, so does the
+        # envelope of the band-passed signal itself
+        expected = np.abs(hilbert(band_sig))
+        np.testing.assert_allclose(hfx_bands[ind, edge:-edge],
+                                   expected[edge:-edge], rtol=0,
+                                   atol=0.01 * expected.mean())
+
+
 # ----- Thresholds -----
 def test_threshold_std(create_testing_data):
     assert (round(_get_threshold_std(create_testing_data, 3), 5) ==
             round(6.708203932499344, 5))
 
 
+@pytest.mark.parametrize('baseline_mode', ['segmented', 'rolling'])
+def test_threshold_std_baseline(baseline_mode):
+    """Test thresholds computed on the baseline around each value."""
+    rng = np.random.RandomState(0)
+    signal = 5 + 10 * rng.randn(2, 103)
+    baseline_win = 10
+
+    ths = _get_threshold_std(signal, 3, baseline_win=baseline_win,
+                             baseline_mode=baseline_mode)
+    assert ths.shape == signal.shape
+    for ind in range(signal.shape[1]):
+        if baseline_mode == 'segmented':
+            start = ind - ind % baseline_win
+        else:
+            start = ind - baseline_win // 2
+        baseline = signal[:, max(start, 0):start + baseline_win]
+        np.testing.assert_allclose(
+            ths[:, ind], baseline.mean(axis=-1) + 3 * baseline.std(axis=-1))
+
+    # a baseline of the whole signal gives the global threshold
+    ths = _get_threshold_std(signal, 3, baseline_win=signal.shape[1],
+                             baseline_mode='segmented')
+    np.testing.assert_allclose(ths, _get_threshold_std(
+        signal, 3)[:, np.newaxis] * np.ones_like(signal))
+
+    with pytest.raises(ValueError, match='Baseline mode'):
+        _get_threshold_std(signal, 3, baseline_win=baseline_win,
+                           baseline_mode='expanding')
+
+
+def test_apply_std():
+    """Test grouping of contiguous supra-threshold windows."""
+    metric = np.zeros((2, 20))
+    metric[0, [2, 3, 4, 10, 19]] = 10
+    metric[1, [0, 1]] = 10
+    kwargs = dict(step_size=5, win_size=10, n_times=103)
+    threshold_dict = dict(thresh=1)
+
+    events = apply_std(metric, threshold_dict, kwargs)
+    # an event stops one window after its last window, within the signal
+    assert events == [[(10, 35), (50, 65), (95, 103)], [(0, 20)]]
+    assert apply_std(metric[0], threshold_dict, kwargs) == events[0]
+
+    event_starts, event_stops = apply_std(metric[0], threshold_dict, kwargs,
+                                          as_tuples=False)
+    np.testing.assert_array_equal(event_starts, [10, 50, 95])
+    np.testing.assert_array_equal(event_stops, [35, 65, 103])
+
+
 def test_threshold_tukey(create_testing_data):
     assert (round(threshold_tukey(create_testing_data, 3), 5) ==
             round(10.659619047273361, 5))
@@ -46,3 +227,67 @@ def test_band_z_score_detect(create_testing_zscore_data):
                                      cycles_thresh, gap_thresh, zscore_thresh)
     assert hfo_detect[0][1] == hfo_outline[0]
     assert hfo_detect[0][2] == hfo_outline[1]
+
+
+def test_band_z_score_detect_runs():
+    """Test gap bridging, cycle criteria and peaks of envelope runs."""
+    sfreq, l_freq = 1000, 100
+    signal = np.zeros(200)
+    # two runs separated by less than a gap (10 samples) form one event
+    signal[10:20] = 5
+    signal[25:40] = 4
+    signal[30] = 8
+    # isolated time-points never start an event
+    signal[60] = 9
+    # too short for the cycles criteria
+    signal[100:105] = 5
+    # separated by a gap from the first event
+    signal[150:180] = 6
+
+    hfo_detect = _band_zscore_detect(signal, sfreq, 0, l_freq, l_freq + 1,
+                                     len(signal), cycles_threshold=1,
+                                     gap_threshold=1, zscore_threshold=3)
+    assert [det[1:4] for det in hfo_detect] == [[10, 39, 8], [150, 179, 6]]
+    assert all(det[4] == [l_freq, l_freq + 1] for det in hfo_detect)
+
+
+@pytest.mark.parametrize('gap_samp', [0, 1, 2, 10])
+@pytest.mark.parametrize('zscore_threshold', [0.5, 1.5, 5])
+def test_find_envelopes_jit(gap_samp, zscore_threshold):
+    """Test the compiled envelope search against the NumPy one."""
+    rng = np.random.RandomState(0)
+    signal = np.abs(rng.randn(2000)).cumsum() % 3
+    for n_times in [0, 1, 2, 3, 1000, 2000]:
+        starts, stops = _find_envelopes(signal, n_times, zscore_threshold,
+                                        gap_samp)
+        jit_starts, jit_stops = _find_envelopes_jit(
+            signal, n_times, zscore_threshold, gap_samp)
+        np.testing.assert_array_equal(jit_starts, starts)
+        np.testing.assert_array_equal(jit_stops, stops)
+
+    # the last run only counts if it ends with back to back time-points
+    signal = np.zeros(20)
+    signal[[5, 6, 8]] = 1
+    for find_envelopes in [_find_envelopes, _find_envelopes_jit]:
+        starts, stops = find_envelopes(signal, len(signal), 0.5, 3)
+        assert len(starts) == len(stops) == 0
+        signal[9] = 1
+        starts, stops = find_envelopes(signal, len(signal), 0.5, 3)
+        assert starts.tolist() == [5] and stops.tolist() == [9]
+        signal[9] = 0
+
+
+@pytest.mark.parametrize('step_size, win_size', [(1, 1), (5, 10), (10, 5)])
+def test_group_windows_jit(step_size, win_size, monkeypatch):
+    """Test the compiled window grouping against the NumPy one."""
+    monkeypatch.setattr('mne_hfo.utils.has_numba', False)
+    rng = np.random.RandomState(0)
+    for above_th in [np.zeros(0, bool), np.ones(1, bool), np.ones(50, bool),
+                     rng.rand(50) > 0.5, rng.rand(50) > 0.9]:
+        n_times = len(above_th) * step_size + 3
+        starts, stops = _group_windows(above_th, step_size, win_size,
+                                       n_times)
+        jit_starts, jit_stops = _group_windows_jit(above_th, step_size,
+                                                   win_size, n_times)
+        np.testing.assert_array_equal(jit_starts, starts)
+        np.testing.assert_array_equal(jit_stops, stops)
@@ -2,15 +2,23 @@
 # License: BSD (3-clause)
 import json
 import os
+from functools import lru_cache
 from os import path as op
 
 import mne
 import numpy as np
 import pandas as pd
-from scipy.signal import hilbert
+import scipy.fft
+import scipy.signal
 from tqdm import tqdm
 
-from mne_hfo.config import ANNOT_COLUMNS
+from mne_hfo.config import (ANNOT_COLUMNS, ACCEPTED_WINDOW_STATS,
+                            ACCEPTED_WINDOW_ENGINES, ACCEPTED_BAND_SHAPES,
+                            ACCEPTED_BASELINE_MODES)
+from mne_hfo.fixes import has_numba, jit
+
+# order of the Butterworth band-pass filter used by mne.filter.filter_data
+BUTTER_ORDER = 4
 
 
 def _check_df(df: pd.DataFrame, df_type: str,
@@ -78,6 +86,14 @@ def _write_json(fname, dictionary, overwrite=False, verbose=False):
         print(json_output)
 
 
+def _remove_file(fname):
+    """Remove a file, if it still exists."""
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
+
+
 def _band_zscore_detect(signal, sfreq, band_idx, l_freq, h_freq, n_times,
                         cycles_threshold, gap_threshold, zscore_threshold):
     """
@@ -114,66 +130,135 @@ def _band_zscore_detect(signal, sfreq, band_idx, l_freq, h_freq, n_times,
         [3] - Maximum value of the Hilbert envelope in this event window
 
     """
-    # Detections where the envelope has a zscore greater than threshold
-    tdetects = []
+    # Calculate the required samples to be considered a valid gap
+    gap_samp = round(gap_threshold * sfreq / l_freq)
 
-    # Create boolean mask of signal greater than zscore_threshold
-    thresh_sig = np.zeros(n_times, dtype='bool')
-    thresh_sig[signal > zscore_threshold] = 1
+    # find the envelopes above the z-score threshold
+    if has_numba:
+        start_idxs, stop_idxs = _find_envelopes_jit(
+            signal, n_times, zscore_threshold, gap_samp)
+    else:
+        start_idxs, stop_idxs = _find_envelopes(
+            signal, n_times, zscore_threshold, gap_samp)
+
+    # Check that envelope meets number of cycles criteria
+    cycs = l_freq * (stop_idxs - start_idxs) / sfreq
+    is_valid = cycs > cycles_threshold
+    start_idxs = start_idxs[is_valid]
+    stop_idxs = stop_idxs[is_valid]
+    if len(start_idxs) == 0:
+        return []
+
+    # maximum value of the envelope in each [start, stop) window; the
+    # envelopes do not overlap, so the odd reductions are in between them
+    bounds = np.column_stack((start_idxs, stop_idxs)).ravel()
+    max_amps = np.maximum.reduceat(signal, bounds)[::2]
+
+    tdetects = [[band_idx, start_idx, stop_idx, max_amp, [l_freq, h_freq]]
+                for start_idx, stop_idx, max_amp in zip(
+                    start_idxs.tolist(), stop_idxs.tolist(),
+                    max_amps.tolist())]
+    return tdetects
 
-    idx = 0
 
-    # Find indices where threshold is met
-    thresh_idxs = np.where(thresh_sig == 1)[0]
+def _find_envelopes(signal, n_times, zscore_threshold, gap_samp):
+    """Find the envelopes of a band above the z-score threshold.
 
-    # Calculate the required samples to be considered a valid gap
-    gap_samp = round(gap_threshold * sfreq / l_freq)
+    Time-points above the threshold separated by less than ``gap_samp``
+    samples are linked into one run. An envelope spans a run from its
+    first two back to back time-points to its last time-point, and the
+    last run of the signal is only kept if it ends with back to back
+    time-points.
 
-    # Iterate over valid indices (significant zscore timepoints)
-    while idx < len(thresh_idxs) - 1:
-        # Find the start of the envelope, which occurs when back to back
-        # time-points meet the threshold
-        if (thresh_idxs[idx + 1] - thresh_idxs[idx]) == 1:
-            start_idx = thresh_idxs[idx]
-            # Find where the envelope ends by iterating over indices
-            while idx < len(thresh_idxs) - 1:
-                # Check if last index over threshold. If so,
-                # consider this index to be the end of the envelope
-                if (thresh_idxs[idx + 1] - thresh_idxs[idx]) == 1:
-                    idx += 1
-                    if idx == len(thresh_idxs) - 1:
-                        stop_idx = thresh_idxs[idx]
-                        # Check that envelope meets number of cycles criteria
-                        dur = (stop_idx - start_idx) / sfreq
-                        cycs = l_freq * dur
-                        if cycs > cycles_threshold:
-                            # Valid, so append to detections
-                            tdetects.append([band_idx, start_idx, stop_idx,
-                                             max(signal[start_idx:stop_idx]),
-                                             [l_freq, h_freq]])
-                else:
-                    # If there is no gap between this and the next index,
-                    # it is still part of this envelope. Increment the
-                    # index.
-                    if (thresh_idxs[idx + 1] - (thresh_idxs[idx])) < gap_samp:
-                        idx += 1
-                    # If the next index has a gap, the current index is the
-                    # end of the envelope
-                    else:
-                        stop_idx = thresh_idxs[idx]
-                        # Check that envelope meets number of cycles criteria
-                        dur = (stop_idx - start_idx) / sfreq
-                        cycs = l_freq * dur
-                        if cycs > cycles_threshold:
-                            # Valid, so append to detections
-                            tdetects.append([band_idx, start_idx, stop_idx,
-                                             max(signal[start_idx:stop_idx]),
-                                             [l_freq, h_freq]])
-                        idx += 1
-                        break
-        else:
-            idx += 1
-    return tdetects
+    Parameters
+    ----------
+    signal : np.ndarray
+        The Hilbert envelope of one channel in one frequency band.
+    n_times : int
+        The number of time-points of ``signal`` to search.
+    zscore_threshold : float
+        The threshold of the envelope.
+    gap_samp : int
+        The number of samples of a gap between two runs.
+
+    Returns
+    -------
+    start_idxs : np.ndarray of int
+        The first time-point of each envelope.
+    stop_idxs : np.ndarray of int
+        The last time-point of each envelope.
+    """
+    # Find indices where the envelope has a zscore greater than threshold
+    thresh_idxs = np.flatnonzero(signal[:n_times] > zscore_threshold)
+    if len(thresh_idxs) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # back to back time-points are part of the same envelope, and so are
+    # time-points separated by less than a gap
+    diffs = np.diff(thresh_idxs)
+    is_contiguous = diffs == 1
+    is_linked = is_contiguous | (diffs < gap_samp)
+
+    # positions in thresh_idxs of the first and last time-point of each
+    # run of linked time-points
+    run_firsts = np.flatnonzero(np.r_[True, ~is_linked])
+    run_lasts = np.flatnonzero(np.r_[~is_linked, True])
+
+    # an envelope starts at the first back to back time-points of a run,
+    # so find the next contiguous position from each run's first
+    n_idxs = len(thresh_idxs)
+    next_contiguous = np.where(is_contiguous, np.arange(n_idxs - 1), n_idxs)
+    next_contiguous = np.minimum.accumulate(next_contiguous[::-1])[::-1]
+    starts = next_contiguous[np.minimum(run_firsts, n_idxs - 2)]
+    is_valid = starts < run_lasts
+
+    # an envelope running until the last time-point over threshold is
+    # only kept if it ends with back to back time-points
+    if not is_contiguous[-1]:
+        is_valid[-1] = False
+
+    start_idxs = thresh_idxs[starts[is_valid]].astype(np.int64)
+    stop_idxs = thresh_idxs[run_lasts[is_valid]].astype(np.int64)
+    return start_idxs, stop_idxs
+
+
+@jit()
+def _find_envelopes_jit(signal, n_times, zscore_threshold, gap_samp):
+    """Find the envelopes of :func:`_find_envelopes` in one pass."""
+    n_times = min(n_times, len(signal))
+    start_idxs = np.empty(n_times // 2 + 1, dtype=np.int64)
+    stop_idxs = np.empty(n_times // 2 + 1, dtype=np.int64)
+    n_envelopes = 0
+
+    # the last time-point above threshold, and the first of the back to
+    # back time-points of the current run (-1 if there are none yet)
+    prev_idx = -1
+    run_start = -1
+    is_contiguous = False
+    for idx in range(n_times):
+        if not signal[idx] > zscore_threshold:
+            continue
+        if prev_idx >= 0:
+            diff = idx - prev_idx
+            if diff == 1 or diff < gap_samp:
+                if diff == 1 and run_start < 0:
+                    run_start = prev_idx
+            else:
+                # a gap ends the run
+                if run_start >= 0:
+                    start_idxs[n_envelopes] = run_start
+                    stop_idxs[n_envelopes] = prev_idx
+                    n_envelopes += 1
+                run_start = -1
+            is_contiguous = diff == 1
+        prev_idx = idx
+
+    # the last run has to end with back to back time-points
+    if run_start >= 0 and is_contiguous:
+        start_idxs[n_envelopes] = run_start
+        stop_idxs[n_envelopes] = prev_idx
+        n_envelopes += 1
+    return start_idxs[:n_envelopes].copy(), stop_idxs[:n_envelopes].copy()
 
 
 def compute_rms(signal, win_size=6):
@@ -235,9 +320,257 @@ def compute_line_length(signal, win_size=6):
     return data[start:-stop]
 
 
-def compute_hilbert(signal, freq_cutoffs, freq_span, sfreq):
+def _filter_data(data, sfreq, l_freq, h_freq, method='fir', verbose=None):
+    """Band-pass filter data in its own floating point precision.
+
+    Double precision data is filtered with :func:`mne.filter.filter_data`.
+    Single precision data, which :func:`mne.filter.filter_data` does not
+    accept, is filtered with the same zero-phase filter designed by
+    :func:`mne.filter.create_filter`, applied in single precision.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        The data of shape (..., n_times), of dtype float64 or float32.
+    sfreq : float
+        The sampling rate.
+    l_freq : float | None
+        The low cutoff frequency.
+    h_freq : float | None
+        The high cutoff frequency.
+    method : str
+        ``'fir'`` (default) or ``'iir'``.
+    verbose : bool | None
+        Verbosity of MNE.
+
+    Returns
+    -------
+    data : np.ndarray
+        The filtered data, of the dtype of ``data``.
+    """
+    if data.dtype == np.float64:
+        return mne.filter.filter_data(data, sfreq=sfreq, l_freq=l_freq,
+                                      h_freq=h_freq, method=method,
+                                      verbose=verbose)
+
+    n_times = data.shape[-1]
+    filt = mne.filter.create_filter(None, sfreq, l_freq=l_freq,
+                                    h_freq=h_freq, method=method,
+                                    verbose=verbose)
+    if method == 'iir':
+        # forward and backward, as in mne.filter.filter_data
+        padlen = min(filt['padlen'], n_times - 1)
+        return scipy.signal.sosfiltfilt(filt['sos'].astype(data.dtype), data,
+                                        padlen=padlen, axis=-1)
+
+    # convolve with the linear-phase FIR filter, after reflecting the
+    # edges as mne.filter.filter_data does, and compensate its delay
+    h = filt.astype(data.dtype)
+    n_edge = max(min(len(h), n_times) - 1, 0)
+    pad_width = [(0, 0)] * (data.ndim - 1) + [(n_edge, n_edge)]
+    data_ext = np.pad(data, pad_width, mode='reflect', reflect_type='odd')
+    data_filt = scipy.signal.oaconvolve(
+        data_ext, h.reshape((1,) * (data.ndim - 1) + (-1,)), axes=-1)
+    shift = (len(h) - 1) // 2 + n_edge
+    return data_filt[..., shift:shift + n_times]
+
+
+def _filter_data_bands(data, sfreq, filter_bands, method='fir',
+                       verbose=None):
+    """Band-pass filter data into several frequency bands.
+
+    FIR filters of all bands are applied to one Fourier transform of the
+    data, with its edges reflected as :func:`mne.filter.filter_data` does,
+    which gives the output of :func:`_filter_data` for each band up to
+    rounding errors. IIR filters are applied one band after the other.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        The data of shape (..., n_times), of dtype float64 or float32.
+    sfreq : float
+        The sampling rate.
+    filter_bands : list of tuple of float
+        The low and high cutoff frequency of each band.
+    method : str
+        ``'fir'`` (default) or ``'iir'``.
+    verbose : bool | None
+        Verbosity of MNE.
+
+    Returns
+    -------
+    data_bands : np.ndarray
+        The filtered data of shape (n_bands, ..., n_times), of the dtype
+        of ``data``.
+    """
+    data_bands = np.empty((len(filter_bands),) + data.shape, data.dtype)
+    if method == 'iir':
+        for band_idx, (l_freq, h_freq) in enumerate(filter_bands):
+            data_bands[band_idx] = _filter_data(data, sfreq, l_freq, h_freq,
+                                                method=method,
+                                                verbose=verbose)
+        return data_bands
+
+    n_times = data.shape[-1]
+    filts = [mne.filter.create_filter(None, sfreq, l_freq=l_freq,
+                                      h_freq=h_freq, method=method,
+                                      verbose=verbose).astype(data.dtype)
+             for l_freq, h_freq in filter_bands]
+
+    # reflect the edges by the longest filter, which leaves the samples
+    # reached by the shorter filters as they are
+    n_edge = max(max(min(len(h), n_times) - 1, 0) for h in filts)
+    pad_width = [(0, 0)] * (data.ndim - 1) + [(n_edge, n_edge)]
+    data_ext = np.pad(data, pad_width, mode='reflect', reflect_type='odd')
+    n_fft = scipy.fft.next_fast_len(
+        data_ext.shape[-1] + max(len(h) for h in filts) - 1, real=True)
+    data_fft = scipy.fft.rfft(data_ext, n_fft, axis=-1)
+    del data_ext
+
+    for band_idx, h in enumerate(filts):
+        data_filt = scipy.fft.irfft(data_fft * scipy.fft.rfft(h, n_fft),
+                                    n_fft, axis=-1)
+        # compensate the delay of the linear-phase filter
+        shift = (len(h) - 1) // 2 + n_edge
+        data_bands[band_idx] = data_filt[..., shift:shift + n_times]
+    return data_bands
+
+
+def compute_sliding_window_stat(signal, win_size, step_size, method='rms',
+                                engine='vectorized'):
+    """Compute a statistic for every sliding window of a signal.
+
+    Windows start every ``step_size`` samples and span ``win_size``
+    samples. The final window is truncated at the end of the signal.
+    Each window's value is the first sample of :func:`compute_rms`, or
+    :func:`compute_line_length` applied to that window.
+
+    Parameters
+    ----------
+    signal : np.ndarray
+        Signal of shape (n_times,), or (n_chs, n_times). Windows are
+        taken over the last axis.
+    win_size : int
+        Number of samples in each window.
+    step_size : int
+        Number of samples between the start of consecutive windows.
+    method : str
+        The statistic to compute. One of ``'rms'``, or ``'line_length'``.
+    engine : str
+        How to compute the statistic. ``'vectorized'`` (default) computes
+        all windows at once over strided views of the signal. ``'loop'``
+        calls the statistic function once per window and is kept as a
+        reference implementation.
+
+    Returns
+    -------
+    signal_win_stat : np.ndarray
+        Statistic per window of shape (n_windows,), or (n_chs, n_windows).
+    """
+    if method not in ACCEPTED_WINDOW_STATS:
+        raise ValueError(f'Sliding window statistic {method} is not '
+                         f'implemented. Please use one of '
+                         f'{ACCEPTED_WINDOW_STATS}.')
+    if engine not in ACCEPTED_WINDOW_ENGINES:
+        raise ValueError(f'Sliding window engine {engine} is not '
+                         f'implemented. Please use one of '
+                         f'{ACCEPTED_WINDOW_ENGINES}.')
+    signal = np.asarray(signal)
+    if engine == 'loop':
+        if signal.ndim == 1:
+            return _sliding_window_loop(signal, win_size, step_size, method)
+        return np.stack([
+            _sliding_window_loop(sig, win_size, step_size, method)
+            for sig in signal.reshape(-1, signal.shape[-1])
+        ]).reshape(signal.shape[:-1] + (-1,))
+    return _sliding_window_vectorized(signal, win_size, step_size, method)
+
+
+def _sliding_window_loop(signal, win_size, step_size, method):
+    """Compute the statistic of each window with one call per window."""
+    if method == 'rms':
+        hfo_detect_func = compute_rms
+    elif method == 'line_length':
+        hfo_detect_func = compute_line_length
+
+    # Overlapping window
+    n_times = len(signal)
+    win_start = 0
+    win_stop = win_size
+    n_windows = int(np.ceil((n_times - win_size) / step_size)) + 1
+
+    # store the statistic of each window
+    signal_win_stat = np.empty(n_windows)
+    win_idx = 0
+    while win_start < n_times:
+        if win_stop > n_times:
+            win_stop = n_times
+
+        # compute the statistic based on 'method' on filtered signal
+        # in this window
+        stat = hfo_detect_func(
+            signal[int(win_start):int(win_stop)], win_size=win_size)[0]
+        signal_win_stat[win_idx] = stat
+
+        if win_stop == n_times:
+            break
+
+        win_start += step_size
+        win_stop += step_size
+        win_idx += 1
+    return signal_win_stat
+
+
+def _sliding_window_vectorized(signal, win_size, step_size, method):
+    """Compute the statistic of all windows at once.
+
+    The first value of the centered convolution in :func:`compute_rms`
+    (and :func:`compute_line_length`) only sums the leading samples of a
+    window, so each window reduces to a sum over a fixed number of
+    samples from its start. Full windows are summed over a strided view
+    and only the final (possibly truncated) window is handled separately.
+    """
+    n_times = signal.shape[-1]
+    n_windows = int(np.ceil((n_times - win_size) / step_size)) + 1
+    last_start = (n_windows - 1) * step_size
+    last_len = n_times - last_start
+
+    if method == 'rms':
+        aux = np.square(signal)
+        n_used = (win_size - 1) // 2 + 1
+        last_used = (min(last_len, win_size) - 1) // 2 + 1
+    elif method == 'line_length':
+        aux = np.abs(np.diff(signal, axis=-1))
+        n_used = min(win_size // 2, win_size - 2) + 1
+        last_used = max(min(win_size // 2, last_len - 2) + 1, 0)
+
+    signal_win_stat = np.empty(signal.shape[:-1] + (n_windows,),
+                               dtype=np.result_type(aux.dtype, np.float32))
+    if n_windows > 1:
+        windows = np.lib.stride_tricks.sliding_window_view(
+            aux, n_used, axis=-1)[..., :last_start:step_size, :]
+        signal_win_stat[..., :-1] = windows.sum(axis=-1)
+    signal_win_stat[..., -1] = aux[..., last_start:last_start +
+                                   last_used].sum(axis=-1)
+
+    signal_win_stat /= float(win_size)
+    if method == 'rms':
+        np.sqrt(signal_win_stat, out=signal_win_stat)
+    return signal_win_stat
+
+
+def compute_hilbert(signal, freq_cutoffs, freq_span, sfreq,
+                    band_shape='butter'):
     """Compute the Hilbert envelope for a single channel.
 
+    The signal is transformed with one FFT. Each frequency band is then
+    selected by multiplying the spectrum with the band's frequency
+    response, and its analytic signal is obtained with one inverse FFT.
+    The envelope is that of the z-scored band-passed signal. The edges of
+    the signal are reflected by the ringing of the Butterworth filter of
+    the narrowest band before the FFT, as :func:`mne.filter.filter_data`
+    pads the signal it filters.
+
     Parameters
     ----------
     signal : np.ndarray
@@ -248,46 +581,101 @@ def compute_hilbert(signal, freq_cutoffs, freq_span, sfreq):
         The span of how many frequencies there are.
     sfreq : float
         The sampling rate.
+    band_shape : str
+        The frequency response of each band. ``'butter'`` (default) is
+        the response of a 4th order Butterworth band-pass filter applied
+        forward and backward, like :func:`mne.filter.filter_data` with
+        ``method='iir'``. ``'rect'`` keeps only the frequencies inside the
+        band, and ``'gaussian'`` is a Gaussian centered on the band with
+        the same -6 dB points as ``'butter'``.
 
     Returns
     -------
     hfx_bands : np.ndarray
-        Hilbert transforms per freq band.
+        Hilbert transforms per freq band of shape (freq_span, n_times).
     """
-    hfx_bands = []
-    # Iterate over freq bands
+    if band_shape not in ACCEPTED_BAND_SHAPES:
+        raise ValueError(f'Band shape {band_shape} is not implemented. '
+                         f'Please use one of {ACCEPTED_BAND_SHAPES}.')
+    n_times = len(signal)
+    # keep single precision signals in single precision
+    real_dtype = np.result_type(signal, np.float32)
+
+    # reflect the edges by the ringing of the narrowest band, as the
+    # forward-backward IIR filter of mne.filter.filter_data does, so that
+    # the circular wrap-around of the filtered signal stays in the padding
+    n_pad = max(_iir_padlen(float(freq_cutoffs[ind]),
+                            float(freq_cutoffs[ind + 1]), float(sfreq))
+                for ind in range(freq_span))
+    n_pad = min(n_pad, n_times - 1)
+    signal_ext = np.pad(signal, n_pad, mode='reflect', reflect_type='odd')
+    n_fft = scipy.fft.next_fast_len(len(signal_ext))
+    sig_fft = scipy.fft.rfft(signal_ext, n=n_fft)
+    del signal_ext
+    freqs = scipy.fft.rfftfreq(n_fft, d=1. / sfreq)
+
+    # the analytic signal keeps the positive frequencies doubled
+    sig_fft[1:(n_fft + 1) // 2] *= 2
+    band_fft = np.zeros(n_fft, dtype=sig_fft.dtype)
+
+    hfx_bands = np.empty((freq_span, n_times), dtype=real_dtype)
     for ind in range(freq_span):
         l_freq = freq_cutoffs[ind]
         h_freq = freq_cutoffs[ind + 1]
 
-        # Filter the data for this frequency band
-        signal = mne.filter.filter_data(signal, sfreq=sfreq,
-                                        l_freq=l_freq, h_freq=h_freq,
-                                        method='iir', verbose=False)
-        # compute z-score of data
-        signal = (signal - np.mean(signal)) / np.std(signal)
-
-        # Chunk the signal into 30 second windows and compute the Hilbert
-        # to save memory
-        hfx = np.empty(signal.shape)
-        n_times = len(hfx)
-        win_size = int(sfreq * 30)
-        n_wins = int(np.ceil(n_times / win_size))
-        for win in range(n_wins):
-            start_samp = win * win_size
-            end_samp = (win + 1) * win_size
-            if win == n_wins:
-                end_samp = n_times
-            sig = signal[start_samp:end_samp]
-            hfx[start_samp:end_samp] = np.abs(hilbert(sig))
+        # select the frequency band and go back to the time domain
+        band_fft[:len(freqs)] = sig_fft * _band_response(
+            freqs, l_freq, h_freq, sfreq, band_shape).astype(real_dtype)
+        analytic = scipy.fft.ifft(band_fft)[n_pad:n_pad + n_times]
+
+        # the real part is the band-passed signal; z-scoring it shifts
+        # and scales the analytic signal the same way
+        band_sig = analytic.real
+        mean = np.mean(band_sig, dtype=np.float64).astype(real_dtype)
+        std = np.std(band_sig, dtype=np.float64).astype(real_dtype)
 
         # return the absolute value of the Hilbert transform.
         # (i.e. the envelope)
-        hfx_bands.append(hfx)
-        hfx = None
+        hfx_bands[ind] = np.abs(analytic - mean) / std
     return hfx_bands
 
 
+@lru_cache(maxsize=None)
+def _iir_padlen(l_freq, h_freq, sfreq):
+    """Estimate the ringing of the Butterworth band-pass filter in samples.
+
+    This is the padding used by :func:`mne.filter.filter_data` with
+    ``method='iir'``.
+    """
+    iir_params = mne.filter.construct_iir_filter(
+        dict(order=BUTTER_ORDER, ftype='butter', output='sos'),
+        [l_freq, h_freq], None, sfreq, 'bandpass', return_copy=False,
+        verbose=False)
+    return iir_params['padlen']
+
+
+def _band_response(freqs, l_freq, h_freq, sfreq, band_shape):
+    """Compute the (zero-phase) frequency response of one band."""
+    if band_shape == 'butter':
+        # magnitude of the band-pass Butterworth filter designed by
+        # scipy.signal.butter, using the pre-warped analog frequencies
+        # of the bilinear transform
+        omega = np.tan(np.pi * freqs / sfreq)
+        l_omega = np.tan(np.pi * l_freq / sfreq)
+        h_omega = np.tan(np.pi * h_freq / sfreq)
+        with np.errstate(divide='ignore'):
+            ratio = (omega ** 2 - l_omega * h_omega) / \
+                (omega * (h_omega - l_omega))
+        # forward and backward filtering squares the magnitude
+        return 1. / (1. + ratio ** (2 * BUTTER_ORDER))
+    elif band_shape == 'rect':
+        return ((freqs >= l_freq) & (freqs <= h_freq)).astype(float)
+    elif band_shape == 'gaussian':
+        center = (l_freq + h_freq) / 2.
+        sigma = (h_freq - l_freq) / 2. / np.sqrt(2 * np.log(2))
+        return np.exp(-0.5 * ((freqs - center) / sigma) ** 2)
+
+
 def apply_hilbert(metric, threshold_dict, kwargs):
     """Apply the Hilbert z-score thresholding scheme.
 
@@ -297,7 +685,10 @@ def apply_hilbert(metric, threshold_dict, kwargs):
         The values to apply the threshold rules to.
     threshold_dict : dict
         Dictionary of  threshold parameters to apply to metric.
-        Must have zscore, gap, and cycles keys.
+        Must have zscore, gap, and cycles keys. Optionally, the
+        baseline_win and baseline_mode keys normalize the envelope by the
+        baseline around each sample instead of the whole signal, see
+        :func:`apply_std`.
     kwargs : dict
         Additional model parameters needed to apply hilbert threshold.
         Must have n_times, sfreq, filter_band, freq_cutoffs,
@@ -329,6 +720,19 @@ def apply_hilbert(metric, threshold_dict, kwargs):
                            f" filter_band, freq_cutoffs, freq_span, n_jobs."
                            f" You passed {kwargs}")
 
+    baseline_win = threshold_dict.get("baseline_win")
+    if baseline_win is not None:
+        # the envelope is z-scored with the standard deviation of the
+        # whole band signal, which is about the root mean square of the
+        # envelope over root 2, so rescale it with that of the baseline
+        metric = np.asarray(metric, dtype=np.float64)[:freq_span]
+        mean, var = _compute_baseline_moments(
+            metric, baseline_win,
+            threshold_dict.get("baseline_mode", "segmented"))
+        scale = np.sqrt((var + np.square(mean)) / 2)
+        metric = np.divide(metric, scale, out=np.zeros_like(metric),
+                           where=scale > 0)
+
     tdetects = []
     for i in tqdm(range(freq_span), unit="HFO-first-phase"):
         # Find bottom and top of the frequency band
@@ -343,34 +747,50 @@ def apply_hilbert(metric, threshold_dict, kwargs):
     return tdetects
 
 
-def apply_std(metric, threshold_dict, kwargs):
+def apply_std(metric, threshold_dict, kwargs, as_tuples=True):
     """Calculate and apply the threshold based on number of standard deviations.
 
     Parameters
     ----------
     metric : np.ndarray
-        Values to apply the threshold to.
+        Values to apply the threshold to, of shape (n_windows,), or
+        (n_chs, n_windows). The threshold is computed per channel.
     threshold_dict : dict
-        Dictionary of threshold values. Should just have thresh,
-        which is the number of standard deviations to check against.
+        Dictionary of threshold values. Should have thresh, which is the
+        number of standard deviations to check against. Optionally,
+        baseline_win is the number of values of the baseline the mean
+        and standard deviation are computed over, instead of the whole
+        signal, and baseline_mode is how the baseline of each value is
+        chosen: ``'segmented'`` (default) for consecutive segments of
+        baseline_win values, or ``'rolling'`` for the baseline_win values
+        centered on it.
     kwargs : dict
         Additional key-word args from the detector needed to
         apply the threshold.
         Step_size, win_size, and n_times are required keys.
+    as_tuples : bool
+        If True (default), return the events as a list of
+        ``(event_start, event_stop)`` tuples. If False, return a tuple
+        of two arrays ``(event_starts, event_stops)`` instead.
 
     Returns
     -------
-    output: List of tuple
-        List of detected events that pass the threshold.
+    output: List of tuple | tuple of np.ndarray
+        The detected events that pass the threshold, in samples. If
+        ``metric`` is 2D, a list with the events of each channel.
     """
     # determine threshold value
     threshold = threshold_dict["thresh"]
     if threshold is None:
         raise RuntimeError(f"threshold_dict must have a value for 'thresh'."
                            f" You passed {threshold_dict}")
-    det_th = _get_threshold_std(metric, threshold)
+    metric = np.asarray(metric)
+    det_th = _get_threshold_std(
+        metric, threshold, baseline_win=threshold_dict.get("baseline_win"),
+        baseline_mode=threshold_dict.get("baseline_mode", "segmented"))
+    if det_th.ndim < metric.ndim:
+        det_th = det_th[..., np.newaxis]
 
-    n_windows = len(metric)
     step_size = kwargs["step_size"]
     win_size = kwargs["win_size"]
     n_times = kwargs["n_times"]
@@ -378,60 +798,228 @@ def apply_std(metric, threshold_dict, kwargs):
         raise RuntimeError(f"kwargs must have step_size, win_size, "
                            f"and n_times. You passed {kwargs}")
 
-    # store thresholded hfo events as a list
-    output = []
-    # Detect and now group events if they are within a
-    # step size of each other
-    win_idx = 0
-    while win_idx < n_windows:
-        # log events if they pass our threshold criterion
-        if metric[win_idx] >= det_th:
-            event_start = win_idx * step_size
-
-            # group events together if they occur in
-            # contiguous windows
-            # TODO: We could factor this out into an independent step,
-            #  but that will just add comp time
-            while win_idx < n_windows and \
-                    metric[win_idx] >= det_th:
-                win_idx += 1
-            event_stop = (win_idx * step_size) + win_size
-
-            if event_stop > n_times:
-                event_stop = n_times
-
-            # TODO: Optional feature calculations
-
-            # Write into output
-            output.append((event_start, event_stop))
-            win_idx += 1
-        else:
-            win_idx += 1
+    # compare all channels against their own threshold in one pass
+    above_th = metric >= det_th
+    output = [_group_windows(ch_above_th, step_size, win_size, n_times)
+              for ch_above_th in np.atleast_2d(above_th)]
+    if as_tuples:
+        output = [list(zip(event_starts.tolist(), event_stops.tolist()))
+                  for event_starts, event_stops in output]
 
+    if metric.ndim == 1:
+        return output[0]
     return output
 
 
-def _get_threshold_std(signal, threshold):
+def _group_windows(above_th, step_size, win_size, n_times):
+    """Group contiguous supra-threshold windows into events.
+
+    Parameters
+    ----------
+    above_th : np.ndarray of bool
+        Whether each window of a channel passes the threshold.
+    step_size : int
+        The step size between windows in samples.
+    win_size : int
+        The window size in samples.
+    n_times : int
+        The number of samples in the signal.
+
+    Returns
+    -------
+    event_starts : np.ndarray of int
+        The start sample of each event.
+    event_stops : np.ndarray of int
+        The stop sample of each event.
+    """
+    if has_numba:
+        return _group_windows_jit(above_th, step_size, win_size, n_times)
+
+    # the edges of runs of contiguous windows are where the
+    # thresholded windows change value
+    edges = np.diff(np.concatenate(([0], above_th.view(np.int8), [0])))
+    first_wins = np.flatnonzero(edges == 1)
+    # first window after each run
+    end_wins = np.flatnonzero(edges == -1)
+
+    event_starts = first_wins * step_size
+    event_stops = np.minimum(end_wins * step_size + win_size, n_times)
+    return event_starts, event_stops
+
+
+@jit()
+def _group_windows_jit(above_th, step_size, win_size, n_times):
+    """Group the windows of :func:`_group_windows` in one pass."""
+    n_windows = len(above_th)
+    event_starts = np.empty(n_windows // 2 + 1, dtype=np.int64)
+    event_stops = np.empty(n_windows // 2 + 1, dtype=np.int64)
+    n_events = 0
+    in_event = False
+    for win_idx in range(n_windows + 1):
+        is_above = win_idx < n_windows and above_th[win_idx]
+        if is_above and not in_event:
+            event_starts[n_events] = win_idx * step_size
+            in_event = True
+        elif not is_above and in_event:
+            event_stops[n_events] = min(win_idx * step_size + win_size,
+                                        n_times)
+            n_events += 1
+            in_event = False
+    return event_starts[:n_events].copy(), event_stops[:n_events].copy()
+
+
+def _get_threshold_std(signal, threshold, baseline_win=None,
+                       baseline_mode='segmented'):
     """
     Calculate threshold by Standard Deviations above the mean.
 
     Parameters
     ----------
     signal: numpy array
-        1D signal for threshold determination
+        1D signal for threshold determination, or 2D array of
+        (n_chs, n_windows) to compute one threshold per channel.
     threshold: int
         Number of standard deviations to consider.
+    baseline_win : int | None
+        If not None, the number of values of the baseline of each value,
+        which gets its own threshold. See
+        :func:`_compute_baseline_moments`.
+    baseline_mode : str
+        How the baseline of each value is chosen, ``'segmented'``
+        (default) or ``'rolling'``.
 
     Returns
     -------
-    ths_value: float
-        Value of the threshold
+    ths_value: float | np.ndarray
+        Value of the threshold, or array of thresholds per channel. If
+        ``baseline_win`` is not None, an array of thresholds of the same
+        shape as ``signal``.
 
     """
-    ths_value = np.mean(signal) + threshold * np.std(signal)
+    if baseline_win is not None:
+        mean, var = _compute_baseline_moments(signal, baseline_win,
+                                              baseline_mode)
+        return mean + threshold * np.sqrt(var)
+
+    # accumulate in double precision, also for single precision signals
+    ths_value = np.mean(signal, axis=-1, dtype=np.float64) + \
+        threshold * np.std(signal, axis=-1, dtype=np.float64)
     return ths_value
 
 
+def _compute_baseline_moments(signal, baseline_win, baseline_mode):
+    """Compute the mean and variance of the baseline of each value.
+
+    The sums over each baseline are differences of cumulative sums, so
+    the cost is linear in the number of values, whatever the length of
+    the baseline.
+
+    Parameters
+    ----------
+    signal : np.ndarray
+        The values, of which baselines are taken over the last axis.
+    baseline_win : int
+        The number of values in each baseline.
+    baseline_mode : str
+        ``'segmented'`` to use the consecutive segment of
+        ``baseline_win`` values containing each value, or ``'rolling'``
+        to use the ``baseline_win`` values centered on each value.
+        Baselines are truncated at the ends of the signal.
+
+    Returns
+    -------
+    mean : np.ndarray
+        The mean of the baseline of each value, of the shape of
+        ``signal``.
+    var : np.ndarray
+        The variance of the baseline of each value, of the shape of
+        ``signal``.
+    """
+    if baseline_mode not in ACCEPTED_BASELINE_MODES:
+        raise ValueError(f'Baseline mode {baseline_mode} is not '
+                         f'supported. Please use one of '
+                         f'{ACCEPTED_BASELINE_MODES}.')
+    baseline_win = max(int(baseline_win), 1)
+    n_values = signal.shape[-1]
+
+    # remove the mean of each channel to limit round-off in the
+    # cumulative sums of squares
+    offset = np.mean(signal, axis=-1, keepdims=True, dtype=np.float64)
+    centered = signal - offset
+    cum_sum = np.zeros(signal.shape[:-1] + (n_values + 1,))
+    np.cumsum(centered, axis=-1, out=cum_sum[..., 1:])
+    cum_sum_sq = np.zeros_like(cum_sum)
+    np.cumsum(np.square(centered), axis=-1, out=cum_sum_sq[..., 1:])
+
+    inds = np.arange(n_values)
+    if baseline_mode == 'segmented':
+        starts = inds - inds % baseline_win
+    else:
+        starts = inds - baseline_win // 2
+    stops = np.minimum(starts + baseline_win, n_values)
+    starts = np.maximum(starts, 0)
+    n_baseline = stops - starts
+
+    mean = (cum_sum[..., stops] - cum_sum[..., starts]) / n_baseline
+    var = (cum_sum_sq[..., stops] - cum_sum_sq[..., starts]) / n_baseline
+    var = np.maximum(var - np.square(mean), 0)
+    return mean + offset, var
+
+
+def _update_baseline(weight, mean, m2, values, decay=1.):
+    """Merge a block of values into running weighted mean and variance.
+
+    Uses the parallel form of Welford's algorithm [1] to combine the
+    running moments of each channel with the moments of the new values.
+    With ``decay < 1``, the weight of each value is multiplied by
+    ``decay`` for every later value, i.e. exponential forgetting.
+
+    Parameters
+    ----------
+    weight : np.ndarray, shape (n_chs,)
+        The running sum of weights.
+    mean : np.ndarray, shape (n_chs,)
+        The running weighted mean.
+    m2 : np.ndarray, shape (n_chs,)
+        The running weighted sum of squared deviations from the mean.
+    values : np.ndarray, shape (n_chs, n_values)
+        The new values, in order of time.
+    decay : float
+        The decay of the weights per value. Default is 1, no forgetting.
+
+    Returns
+    -------
+    weight, mean, m2 : np.ndarray, shape (n_chs,)
+        The updated running moments. The weighted variance is
+        ``m2 / weight``.
+
+    References
+    ----------
+    .. [1] T. F. Chan, G. H. Golub, and R. J. LeVeque, "Updating formulae
+           and a pairwise algorithm for computing sample variances,"
+           Technical Report STAN-CS-79-773, Stanford University, 1979.
+    """
+    n_values = values.shape[-1]
+    if n_values == 0:
+        return weight, mean, m2
+
+    # forget the running moments for the duration of the new values
+    old_decay = decay ** n_values
+    weight = weight * old_decay
+    m2 = m2 * old_decay
+
+    value_weights = decay ** np.arange(n_values - 1, -1, -1)
+    block_weight = value_weights.sum()
+    block_mean = values @ value_weights / block_weight
+    block_m2 = np.square(values - block_mean[:, np.newaxis]) @ value_weights
+
+    new_weight = weight + block_weight
+    delta = block_mean - mean
+    mean = mean + delta * block_weight / new_weight
+    m2 = m2 + block_m2 + np.square(delta) * weight * block_weight / new_weight
+    return new_weight, mean, m2
+
+
 def merge_contiguous_freq_bands(detections):
     """Merge detected events in contiguous freq bands and time windows.
 
@@ -453,6 +1041,8 @@ def merge_contiguous_freq_bands(detections):
     """
     from mne_hfo.posthoc import _check_detection_overlap
     outlines = []
+    if len(detections) == 0:
+        return [], [], []
     for detection in detections[0]:
         band_idx = detection[0]
         # If first freq band, always unique so append
@@ -68,6 +68,8 @@ if __name__ == "__main__":
               'full': [
                   'joblib >= 1.0.0',
                   'matplotlib',
+                  'numba',
+                  'pyarrow',
               ]
           },
           classifiers=[
@@ -87,6 +89,11 @@ if __name__ == "__main__":
           ],
           platforms='any',
           packages=find_packages(),
+          entry_points={
+              'console_scripts': [
+                  'mne-hfo = mne_hfo.commands:main',
+              ],
+          },
           project_urls={
               'Documentation': URL,
               'Bug Reports': 'https://github.com/mne-tools/mne-hfo/issues',